@@ -0,0 +1,378 @@
+"""
+Agent Common
+AI Agent Development Framework v3.7
+
+Support code shared by the AI agents: config loading with JSON snapshots,
+stage timing and a background subprocess executor. Kept free of heavy
+imports (asyncio and subprocess are imported where used), since every
+agent loads it at startup.
+"""
+
+import hashlib
+import heapq
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    import subprocess
+
+logger = logging.getLogger(__name__)
+
+# JSON snapshots of parsed config files, so unchanged YAML is not re-parsed
+CONFIG_SNAPSHOT_DIR = ".ai-agent-cache/config-snapshots"
+
+# Files modified this close to when they were fingerprinted (hashed, snapshotted)
+# may change again within the same mtime tick, so a stat match alone is not
+# trusted for them
+RACY_WINDOW_NS = 2 * 10 ** 9
+
+
+def load_config_document(config_path: str, snapshot_dir: str = CONFIG_SNAPSHOT_DIR) -> Any:
+    """Return the parsed YAML document at config_path, reusing a JSON snapshot when the file is unchanged"""
+    snapshot_path = os.path.join(
+        snapshot_dir, hashlib.sha256(os.path.abspath(config_path).encode('utf-8')).hexdigest()[:16] + ".json"
+    )
+    stat = os.stat(config_path)
+    # A matching mtime and size skips reading the file, a matching content hash skips parsing it
+    try:
+        with open(snapshot_path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        snapshot = {}
+    
+    if (snapshot.get("mtime_ns") == stat.st_mtime_ns and snapshot.get("size") == stat.st_size and
+            snapshot.get("snapshot_at_ns", 0) - stat.st_mtime_ns > RACY_WINDOW_NS):
+        return snapshot["document"]
+    
+    with open(config_path, 'rb') as f:
+        raw_config = f.read()
+    digest = hashlib.sha256(raw_config).hexdigest()
+    if snapshot.get("sha256") == digest:
+        document = snapshot["document"]
+    else:
+        import yaml
+        document = yaml.safe_load(raw_config)
+        # Documents that do not survive a JSON round trip are parsed on every call
+        try:
+            if json.loads(json.dumps(document)) != document:
+                return document
+        except (TypeError, ValueError):
+            return document
+    
+    snapshot = {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "sha256": digest,
+        "snapshot_at_ns": time.time_ns(),
+        "document": document
+    }
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        temp_path = f"{snapshot_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump(snapshot, f, separators=(",", ":"))
+        os.replace(temp_path, snapshot_path)
+    except OSError as e:
+        logger.debug(f"Could not write config snapshot {snapshot_path}: {e}")
+    return document
+
+
+class PerformanceRecorder:
+    """Wall time, CPU time and call counts per stage, plus the slowest items of each kind"""
+    
+    def __init__(self, slowest: int = 10):
+        self.slowest = slowest
+        self.reset()
+    
+    def reset(self) -> None:
+        """Forget everything recorded so far"""
+        # stage -> [calls, wall seconds, cpu seconds]
+        self.stages = {}
+        # kind -> {item: wall seconds}
+        self.items = {}
+    
+    @contextmanager
+    def stage(self, name: str, item: Optional[Tuple[str, str]] = None):
+        """Time the enclosed block as one call of stage name, and as (kind, item) if given"""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall_seconds = time.perf_counter() - wall_start
+            self.add(name, wall_seconds, time.process_time() - cpu_start)
+            if item:
+                self.add_item(item[0], item[1], wall_seconds)
+    
+    def add(self, name: str, wall_seconds: float, cpu_seconds: float, calls: int = 1) -> None:
+        """Record calls of stage name taking the given total times"""
+        totals = self.stages.get(name)
+        if totals is None:
+            self.stages[name] = [calls, wall_seconds, cpu_seconds]
+        else:
+            totals[0] += calls
+            totals[1] += wall_seconds
+            totals[2] += cpu_seconds
+    
+    def add_item(self, kind: str, item: str, seconds: float) -> None:
+        """Add seconds to the time of item (a file, pattern, ...)"""
+        items = self.items.setdefault(kind, {})
+        items[item] = items.get(item, 0.0) + seconds
+        # Pruned to the slowest once the table outgrows the limit
+        if len(items) > max(64, 4 * self.slowest):
+            self.items[kind] = dict(heapq.nlargest(self.slowest, items.items(), key=lambda entry: entry[1]))
+    
+    def drain(self) -> Dict[str, Any]:
+        """Return and reset everything recorded (used to ship worker timings to the parent)"""
+        counters = {"stages": self.stages, "items": self.items}
+        self.reset()
+        return counters
+    
+    def merge(self, counters: Dict[str, Any]) -> None:
+        """Add timings drained from a worker process"""
+        for name, (calls, wall_seconds, cpu_seconds) in counters["stages"].items():
+            self.add(name, wall_seconds, cpu_seconds, calls)
+        for kind, items in counters["items"].items():
+            for item, seconds in items.items():
+                self.add_item(kind, item, seconds)
+    
+    def report(self) -> Dict[str, Any]:
+        """Summarize as the "performance" section of agent output, slowest stages first"""
+        report = {
+            "stages": {
+                name: {"calls": calls, "wall_seconds": round(wall_seconds, 6), "cpu_seconds": round(cpu_seconds, 6)}
+                for name, (calls, wall_seconds, cpu_seconds) in sorted(
+                    self.stages.items(), key=lambda entry: entry[1][1], reverse=True
+                )
+            }
+        }
+        for kind, items in sorted(self.items.items()):
+            report[f"slowest_{kind}s"] = [
+                {kind: item, "seconds": round(seconds, 6)}
+                for item, seconds in heapq.nlargest(self.slowest, items.items(), key=lambda entry: entry[1])
+            ]
+        return report
+    
+    def write_openmetrics(self, path: str, namespace: str) -> None:
+        """Write the timings as an OpenMetrics text file, e.g. for a node exporter textfile collector"""
+        def label(value: str) -> str:
+            return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        
+        lines = []
+        for metric, position, unit in (("stage_calls", 0, None),
+                                       ("stage_wall_seconds", 1, "seconds"),
+                                       ("stage_cpu_seconds", 2, "seconds")):
+            lines.append(f"# TYPE {namespace}_{metric} counter")
+            if unit:
+                lines.append(f"# UNIT {namespace}_{metric} {unit}")
+            for name, totals in self.stages.items():
+                lines.append(f'{namespace}_{metric}_total{{stage="{label(name)}"}} {totals[position]}')
+        for kind, items in sorted(self.items.items()):
+            metric = f"{namespace}_slowest_{kind}_seconds"
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"# UNIT {metric} seconds")
+            for item, seconds in heapq.nlargest(self.slowest, items.items(), key=lambda entry: entry[1]):
+                lines.append(f'{metric}{{{kind}="{label(item)}"}} {seconds}')
+        lines.append("# EOF")
+        
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        # Replaced atomically so a scrape never sees a partial write
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w') as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
+
+
+class SubprocessDeadlineExceeded(Exception):
+    """A subprocess was killed, or never started, because the run deadline passed"""
+
+
+class SubprocessExecutor:
+    """Runs subprocesses on an asyncio event loop in a background thread"""
+    
+    def __init__(self, max_concurrency: int = 4, tool_limits: Optional[Dict[str, int]] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.tool_limits = tool_limits or {}
+        # A time.monotonic() value; processes still running then are killed and later ones not started
+        self.deadline: Optional[float] = None
+        self._init_runtime()
+    
+    def _init_runtime(self) -> None:
+        self._loop = None
+        self._thread = None
+        # Semaphores belong to the loop and are created in it; None keys the global limit
+        self._semaphores = {}
+        self._spawn_order = None
+        self._tasks = set()
+        self._timings = {}
+        self._lock = threading.Lock()
+        # Held while spawning, and by forking callers, so no forked child inherits a pipe mid-spawn
+        self._spawn_lock = threading.Lock()
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # The agent is shipped to worker processes, which never run tools; the loop stays behind
+        state = self.__dict__.copy()
+        for name in ("_loop", "_thread", "_semaphores", "_spawn_order", "_tasks", "_timings", "_lock", "_spawn_lock"):
+            del state[name]
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self._init_runtime()
+    
+    def _event_loop(self):
+        """The executor's event loop, started on first use"""
+        with self._lock:
+            if self._loop is None:
+                import asyncio
+                
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="subprocess-executor", daemon=True)
+                self._thread.start()
+            return self._loop
+    
+    def submit(self, tool: str, command: List[str], timeout: Optional[float] = None):
+        """Start command (queued behind the concurrency limits); returns a Future of its CompletedProcess"""
+        import asyncio
+        
+        # Cancelling the future kills the process, or drops it if not yet started
+        return asyncio.run_coroutine_threadsafe(self._run(tool, command, timeout), self._event_loop())
+    
+    def run(self, tool: str, command: List[str], timeout: Optional[float] = None) -> "subprocess.CompletedProcess":
+        """Run command to completion, like subprocess.run(command, capture_output=True, text=True)"""
+        return self.submit(tool, command, timeout).result()
+    
+    @contextmanager
+    def forking(self):
+        """Hold off process spawns while the caller forks (e.g. starts a process pool)"""
+        with self._spawn_lock:
+            yield
+    
+    def cancel_all(self) -> None:
+        """Kill every running process and drop the queued ones"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._cancel_tasks)
+    
+    def close(self) -> None:
+        """Cancel outstanding work and stop the event loop"""
+        if self._loop is None:
+            return
+        import asyncio
+        
+        self.cancel_all()
+        # Let the cancelled tasks kill and reap their processes before stopping
+        asyncio.run_coroutine_threadsafe(self._stop_when_idle(), self._loop)
+        self._thread.join(timeout=5)
+        if not self._thread.is_alive():
+            self._loop.close()
+        self._loop = None
+        self._thread = None
+    
+    def drain_timings(self) -> Dict[str, Tuple[int, float]]:
+        """Return and reset {tool: (processes, wall seconds)} for processes finished so far"""
+        with self._lock:
+            timings, self._timings = self._timings, {}
+        return timings
+    
+    def record_timings(self, recorder: PerformanceRecorder, prefix: str) -> None:
+        """Drain finished processes' wall times into recorder as "<prefix>:<tool>" stages"""
+        # CPU time of the processes themselves is not counted; they are children
+        for tool, (processes, wall_seconds) in self.drain_timings().items():
+            recorder.add(f"{prefix}:{tool}", wall_seconds, 0.0, processes)
+    
+    def _cancel_tasks(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+    
+    async def _stop_when_idle(self) -> None:
+        import asyncio
+        
+        while self._tasks:
+            await asyncio.sleep(0.01)
+        asyncio.get_running_loop().stop()
+    
+    def _semaphore(self, key: Optional[str], limit: int):
+        import asyncio
+        
+        if key not in self._semaphores:
+            self._semaphores[key] = asyncio.Semaphore(max(1, limit))
+        return self._semaphores[key]
+    
+    async def _run(self, tool: str, command: List[str], timeout: Optional[float]) -> "subprocess.CompletedProcess":
+        import asyncio
+        
+        task = asyncio.current_task()
+        self._tasks.add(task)
+        try:
+            # The tool's own slot first, so batches queued behind it do not hold global slots
+            async with self._semaphore(tool, self.tool_limits.get(tool, self.max_concurrency)):
+                async with self._semaphore(None, self.max_concurrency):
+                    return await self._run_process(tool, command, timeout)
+        finally:
+            self._tasks.discard(task)
+    
+    async def _run_process(self, tool: str, command: List[str],
+                           timeout: Optional[float]) -> "subprocess.CompletedProcess":
+        import asyncio
+        import subprocess
+        
+        limit, deadline_bound = timeout, False
+        if self.deadline is not None:
+            remaining = self.deadline - time.monotonic()
+            if remaining <= 0:
+                raise SubprocessDeadlineExceeded(f"{tool} not started: the run deadline has passed")
+            if timeout is None or remaining < timeout:
+                limit, deadline_bound = remaining, True
+        
+        if self._spawn_order is None:
+            self._spawn_order = asyncio.Lock()
+        start = time.perf_counter()
+        # One spawn at a time, so holding the thread lock across the await cannot block the loop on itself
+        async with self._spawn_order:
+            with self._spawn_lock:
+                process = await asyncio.create_subprocess_exec(
+                    *command, stdin=asyncio.subprocess.DEVNULL,
+                    stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+                    # Its own process group, so a kill reaches the tool's worker processes too
+                    start_new_session=True
+                )
+        try:
+            stdout, stderr = await asyncio.wait_for(process.communicate(), limit)
+        except asyncio.TimeoutError:
+            await self._kill(process)
+            if deadline_bound:
+                raise SubprocessDeadlineExceeded(f"{tool} killed at the run deadline")
+            raise subprocess.TimeoutExpired(command, timeout)
+        except asyncio.CancelledError:
+            await self._kill(process)
+            raise
+        finally:
+            self._record(tool, time.perf_counter() - start)
+        
+        return subprocess.CompletedProcess(
+            command, process.returncode,
+            stdout.decode(errors="replace"), stderr.decode(errors="replace")
+        )
+    
+    @staticmethod
+    async def _kill(process) -> None:
+        import signal
+        
+        if process.returncode is None:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        await process.wait()
+    
+    def _record(self, tool: str, seconds: float) -> None:
+        with self._lock:
+            processes, wall_seconds = self._timings.get(tool, (0, 0.0))
+            self._timings[tool] = (processes + 1, wall_seconds + seconds)
@@ -0,0 +1,202 @@
+"""
+Analysis Cache
+AI Agent Development Framework v3.7
+
+Caches of the code quality agent's per-file analysis results: persistent,
+keyed by content, and in memory for the resident daemon.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from agent_common import RACY_WINDOW_NS
+from finding_store import FindingStore
+from source_file import SourceFile
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisCache:
+    """Persistent content-addressed cache of per-file analysis results with LRU eviction"""
+    
+    def __init__(self, path: str, max_size_mb: float = 256):
+        self.path = path
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._conn = None
+        self._conn_pid = None
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # SQLite connections cannot cross process boundaries; workers reconnect lazily
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_conn_pid"] = None
+        return state
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open (or reopen after fork) the cache database"""
+        if self._conn is None or self._conn_pid != os.getpid():
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_results_last_used ON results (last_used)")
+            self._conn = conn
+            self._conn_pid = os.getpid()
+        return self._conn
+    
+    def get(self, key: str, count: bool = True) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss; count=False keeps it out of the hit/miss stats"""
+        try:
+            conn = self._connect()
+            row = conn.execute("SELECT value FROM results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                try:
+                    value = FindingStore.restore_compact(json.loads(row[0]))
+                except (ValueError, KeyError, TypeError, IndexError, AttributeError) as e:
+                    # A corrupt or incompatible entry is a miss, and is dropped so it is recomputed
+                    logger.warning(f"Dropping undecodable analysis cache entry: {e!r}")
+                    conn.execute("DELETE FROM results WHERE key = ?", (key,))
+                else:
+                    conn.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+                    self.hits += count
+                    return value
+        except sqlite3.Error as e:
+            logger.warning(f"Analysis cache lookup failed: {e}")
+        
+        self.misses += count
+        return None
+    
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a result under key"""
+        payload = json.dumps(value, default=FindingStore.compact_json_default)
+        try:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO results (key, value, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, payload, len(payload), time.time())
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"Analysis cache write failed: {e}")
+    
+    def evict(self) -> None:
+        """Drop least recently used entries until the cache fits its size bound"""
+        try:
+            conn = self._connect()
+            total_size = conn.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+            if total_size <= self.max_size_bytes:
+                return
+            
+            stale_keys = []
+            for key, size in conn.execute("SELECT key, size FROM results ORDER BY last_used ASC"):
+                if total_size <= self.max_size_bytes:
+                    break
+                stale_keys.append((key,))
+                total_size -= size
+            
+            conn.executemany("DELETE FROM results WHERE key = ?", stale_keys)
+            self.evictions += len(stale_keys)
+            logger.debug(f"Evicted {len(stale_keys)} analysis cache entries")
+        except sqlite3.Error as e:
+            logger.warning(f"Analysis cache eviction failed: {e}")
+    
+    def reset_stats(self) -> None:
+        """Reset hit/miss/eviction counters"""
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def drain_counters(self) -> Dict[str, int]:
+        """Return and reset hit/miss counters (used to ship worker counts to the parent)"""
+        counters = {"hits": self.hits, "misses": self.misses}
+        self.hits = 0
+        self.misses = 0
+        return counters
+    
+    def merge_counters(self, counters: Dict[str, int]) -> None:
+        """Add counters drained from a worker process"""
+        self.hits += counters.get("hits", 0)
+        self.misses += counters.get("misses", 0)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Summarize cache effectiveness for the analysis report"""
+        lookups = self.hits + self.misses
+        stats = {
+            "enabled": True,
+            "path": self.path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": 0,
+            "size_bytes": 0
+        }
+        try:
+            entries, size = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results"
+            ).fetchone()
+            stats["entries"] = entries
+            stats["size_bytes"] = size
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read analysis cache statistics: {e}")
+        return stats
+
+
+class WarmResultCache:
+    """In-memory per-path analysis results for a long-running agent, revalidated by stat, then content hash"""
+    
+    def __init__(self):
+        # normpath -> (mtime_ns, size, sha256 digest, fingerprinted_at_ns, analysis)
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+    
+    def lookup(self, file_path: str) -> Tuple[Optional[Dict[str, Any]], Optional[Tuple]]:
+        """Return (cached analysis or None, fingerprint to store a fresh result under)"""
+        try:
+            stat = os.stat(file_path)
+            entry = self.entries.get(os.path.normpath(file_path))
+            if (entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size and
+                    entry[3] - stat.st_mtime_ns > RACY_WINDOW_NS):
+                self.hits += 1
+                return entry[4], entry[:4]
+            
+            with SourceFile(file_path) as source:
+                digest = hashlib.sha256(source.data).digest()
+        except OSError:
+            self.misses += 1
+            return None, None
+        
+        fingerprint = (stat.st_mtime_ns, stat.st_size, digest, time.time_ns())
+        if entry is not None and entry[2] == digest:
+            self.store(file_path, fingerprint, entry[4])
+            self.hits += 1
+            return entry[4], fingerprint
+        
+        self.misses += 1
+        return None, fingerprint
+    
+    def store(self, file_path: str, fingerprint: Tuple, analysis: Dict[str, Any]) -> None:
+        """Remember the analysis of file_path as of fingerprint"""
+        self.entries[os.path.normpath(file_path)] = fingerprint + (analysis,)
+    
+    def reset_stats(self) -> None:
+        """Reset hit/miss counters"""
+        self.hits = 0
+        self.misses = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Summarize warm cache effectiveness for the analysis report"""
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
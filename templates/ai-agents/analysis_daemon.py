@@ -0,0 +1,165 @@
+"""
+Analysis Daemon
+AI Agent Development Framework v3.7
+
+Resident code quality service on a Unix socket: one agent stays warm between
+requests from pre-commit hooks, editors and code-quality-client.py.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from analysis_cache import WarmResultCache
+from finding_store import report_json_default
+
+logger = logging.getLogger(__name__)
+
+# Unix socket of the resident analysis daemon (--daemon, code-quality-client.py)
+DEFAULT_DAEMON_SOCKET = ".ai-agent-cache/code-quality.sock"
+
+
+class AnalysisDaemon:
+    """Resident analysis service on a Unix socket, rebuilding its agent when the config file changes"""
+    
+    def __init__(self, agent_class: Callable[..., Any], format_results: Callable[[Dict[str, Any], str], str],
+                 config_path: Optional[str], configure: Optional[Callable[[Any], None]] = None, jobs: int = 1,
+                 project_context: str = ""):
+        self.agent_class = agent_class
+        self.format_results = format_results
+        self.project_context = project_context
+        self.config_path = config_path
+        self.configure = configure
+        self.jobs = jobs
+        self.agent = None
+        self.config_mtime = None
+        self.loaded_at = None
+        self.requests_served = 0
+        self.stopping = False
+        self._reload_if_changed()
+    
+    def _reload_if_changed(self) -> None:
+        """(Re)build the agent when the config file changed; keep the old one if the new config fails"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime if self.config_path else None
+        except OSError:
+            mtime = None
+        if self.agent is not None and mtime == self.config_mtime:
+            return
+        
+        try:
+            agent = self.agent_class(config_path=self.config_path)
+            if self.configure:
+                self.configure(agent)
+            agent.warm_cache = WarmResultCache()
+        except Exception as e:
+            if self.agent is None:
+                raise
+            logger.error(f"Config reload failed, keeping the previous configuration: {e}")
+            self.config_mtime = mtime
+            return
+        
+        if self.agent is not None:
+            logger.info(f"Reloaded configuration from {self.config_path}")
+            self.agent.subprocesses.close()
+        self.agent = agent
+        self.config_mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+    
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """Answer one JSON request line: {"op": "analyze", "files": [...]}, {"op": "status"} or {"op": "shutdown"}"""
+        self._reload_if_changed()
+        self.requests_served += 1
+        op = request.get("op", "analyze")
+        try:
+            if op == "analyze":
+                self.agent.performance.reset()
+                # "deadline_seconds" overrides external_tools.deadline_seconds for this request
+                self.agent.start_run_deadline(request.get("deadline_seconds"))
+                analysis_results = self.agent.analyze_files(
+                    request["files"], request.get("project_context") or self.project_context, jobs=self.jobs
+                )
+                # Clients print the rendered report; the full results are sent only on request
+                response = {"output": self.format_results(analysis_results, request.get("format", "json"))}
+                if request.get("include_results"):
+                    response["results"] = analysis_results
+                return response
+            if op == "status":
+                return {
+                    "status": "ok",
+                    "framework_version": self.agent.framework_version,
+                    "config_path": self.config_path,
+                    "config_loaded_at": self.loaded_at,
+                    "requests_served": self.requests_served,
+                    "warm_cache": self.agent.warm_cache.stats()
+                }
+            if op == "shutdown":
+                self.stopping = True
+                return {"status": "stopping"}
+        except (KeyError, TypeError, ValueError) as e:
+            return {"error": f"Invalid request: {e!r}"}
+        except Exception as e:
+            logger.error(f"Daemon request failed: {e}")
+            return {"error": str(e)}
+        
+        return {"error": f"Unknown op: {op}"}
+    
+    def serve(self, socket_path: str = DEFAULT_DAEMON_SOCKET) -> None:
+        """Serve requests until interrupted or asked to shut down"""
+        import socketserver
+        
+        daemon = self
+        
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                try:
+                    request = json.loads(self.rfile.readline())
+                except ValueError as e:
+                    response = {"error": f"Invalid JSON request: {e}"}
+                else:
+                    response = daemon.handle(request)
+                self.wfile.write(json.dumps(response, default=report_json_default).encode() + b"\n")
+        
+        socket_dir = os.path.dirname(socket_path)
+        if socket_dir:
+            os.makedirs(socket_dir, exist_ok=True)
+        if os.path.exists(socket_path):
+            # Only a stale socket left by a daemon that died is replaced
+            if self._socket_answers(socket_path):
+                raise RuntimeError(f"A code quality daemon is already listening on unix:{socket_path}")
+            os.unlink(socket_path)
+        server = socketserver.UnixStreamServer(socket_path, Handler, bind_and_activate=False)
+        try:
+            # Owner-only before listening: any client can read files as this user or stop the daemon
+            server.server_bind()
+            os.chmod(socket_path, 0o600)
+            server.server_activate()
+        except BaseException:
+            server.server_close()
+            raise
+        logger.info(f"Code quality daemon listening on unix:{socket_path}")
+        
+        try:
+            while not self.stopping:
+                server.handle_request()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+    
+    @staticmethod
+    def _socket_answers(socket_path: str) -> bool:
+        """Whether something accepts connections on the Unix socket at socket_path"""
+        import socket
+        
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            probe.settimeout(1.0)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                return False
+        return True
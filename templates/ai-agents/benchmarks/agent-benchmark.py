@@ -0,0 +1,435 @@
+#!/usr/bin/env python3
+"""
+Agent Benchmark Suite
+AI Agent Development Framework v3.7
+
+Generates a synthetic repository with controllable file counts, file sizes,
+languages, pathological long lines, git history and deployment history, then
+measures the agents on it. Each case runs in its own process so the peak RSS
+it reports is its own. Results are written as a JSON baseline that a later
+run can be compared against with --compare.
+"""
+
+import argparse
+import importlib.util
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENTS_DIR = os.path.dirname(BENCHMARK_DIR)
+MANIFEST_NAME = "benchmark-manifest.json"
+
+# Case name -> (agent, what its throughput counts)
+CASES = {
+    "analyze_files": ("code-quality", "files"),
+    "analyze_files_cached": ("code-quality", "files"),
+    "duplicate_detection": ("code-quality", "files"),
+    "analyze_changes": ("deployment-strategy", "files"),
+    "predict_deployment_strategy": ("deployment-strategy", "decisions"),
+    "history_import": ("deployment-strategy", "records"),
+    "history_lookup": ("deployment-strategy", "lookups")
+}
+
+ENVIRONMENTS = ["dev", "staging", "prod"]
+STRATEGIES = ["rolling", "canary", "blue-green"]
+COMPONENTS = ["application", "infrastructure", "database", "dependencies", "configuration"]
+RISK_FACTORS = ["infrastructure_change", "database_migration", "dependency_update", "security_patch"]
+
+# Per-language source blocks, repeated to reach the requested file size; each
+# carries a branch, a security pattern and a performance pattern
+SOURCE_BLOCKS = {
+    "py": (
+        'def handler_{n}(items, user_id):\n'
+        '    """Handle request {n}"""\n'
+        '    if user_id > {n}:\n'
+        '        password = "secret{n}"\n'
+        '        return execute("SELECT * FROM t WHERE id = %s" % user_id)\n'
+        '    for i in range(len(items)):\n'
+        '        items[i] = items[i] * {n}\n'
+        '    return items\n'
+        '\n'
+    ),
+    "js": (
+        'function handler{n}(items, userId) {{\n'
+        '  if (userId > {n}) {{\n'
+        '    element.innerHTML = items[0];\n'
+        '  }}\n'
+        '  for (let i = 0; i < items.length; i++) {{\n'
+        '    items[i] = items[i] * {n};\n'
+        '  }}\n'
+        '  return items;\n'
+        '}}\n'
+        '\n'
+    ),
+    "go": (
+        'func Handler{n}(items []int, userID int) []int {{\n'
+        '\tif userID > {n} {{\n'
+        '\t\tapi_key = "key{n}"\n'
+        '\t}}\n'
+        '\tfor i := 0; i < len(items); i++ {{\n'
+        '\t\titems[i] = items[i] * {n}\n'
+        '\t}}\n'
+        '\treturn items\n'
+        '}}\n'
+        '\n'
+    )
+}
+SOURCE_HEADERS = {
+    "py": '"""Synthetic module"""\nimport os\n\n',
+    "js": '"use strict";\n\n',
+    "go": 'package synthetic\n\n'
+}
+# Long lines that start like a loop header but never close it, the worst case
+# for the backtracking ".*" performance patterns
+LONG_LINE_PREFIXES = {"py": "# for item in ", "js": "// for item in ", "go": "// for item in "}
+
+
+def generate_source(language: str, lines: int, long_line_length: int, rng: random.Random) -> str:
+    """Source text of about lines lines, with one pathological line when long_line_length > 0"""
+    parts = [SOURCE_HEADERS[language]]
+    line_count = parts[0].count('\n')
+    block_number = 0
+    while line_count < lines:
+        block = SOURCE_BLOCKS[language].format(n=block_number)
+        parts.append(block)
+        line_count += block.count('\n')
+        block_number += 1
+    if long_line_length:
+        filler = "in items " * (long_line_length // 9 + 1)
+        parts.insert(rng.randint(1, len(parts)), LONG_LINE_PREFIXES[language] + filler[:long_line_length] + "\n")
+    return "".join(parts)
+
+
+def run_git(repo: str, *git_args: str) -> str:
+    """Run a git command in repo with a fixed identity; returns stdout"""
+    environment = dict(
+        os.environ,
+        GIT_AUTHOR_NAME="Benchmark", GIT_AUTHOR_EMAIL="benchmark@example.com",
+        GIT_COMMITTER_NAME="Benchmark", GIT_COMMITTER_EMAIL="benchmark@example.com"
+    )
+    result = subprocess.run(["git", *git_args], cwd=repo, env=environment,
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+
+def generate_deployment_history(count: int, rng: random.Random) -> List[Dict[str, Any]]:
+    """Deployment records shaped like those record_outcome writes"""
+    start = datetime(2024, 1, 1)
+    records = []
+    for index in range(count):
+        components = rng.sample(COMPONENTS, rng.randint(1, 3))
+        risk_factors = rng.sample(RISK_FACTORS, rng.randint(0, 2))
+        category_counts = {component: rng.randint(1, 20) for component in components}
+        records.append({
+            "timestamp": (start + timedelta(minutes=17 * index)).isoformat(),
+            "environment": rng.choice(ENVIRONMENTS),
+            "strategy": rng.choice(STRATEGIES),
+            "success": rng.random() < 0.85,
+            "risk_score": round(rng.uniform(0.5, 25.0), 2),
+            "category_counts": category_counts,
+            "magnitude_multiplier": rng.choice([1.0, 1.0, 1.2, 1.5]),
+            "decision_factors": {
+                "affected_components": components,
+                "risk_factors": risk_factors,
+                "files_changed": sum(category_counts.values()),
+                "lines_changed": rng.randint(5, 5000)
+            }
+        })
+    return records
+
+
+def generate_repository(root: str, files: int = 200, lines_per_file: int = 200,
+                        languages: Optional[List[str]] = None, long_line_ratio: float = 0.02,
+                        long_line_length: int = 2000, commits: int = 10, deployments: int = 20000,
+                        seed: int = 1) -> Dict[str, Any]:
+    """Write a synthetic repository under root and return its manifest"""
+    languages = languages or ["py", "js", "go"]
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+    
+    source_files = []
+    total_bytes = 0
+    for index in range(files):
+        language = languages[index % len(languages)]
+        rel_path = os.path.join("src", f"pkg{index % 10}", f"module{index}.{language}")
+        long_line = long_line_length if rng.random() < long_line_ratio else 0
+        content = generate_source(language, lines_per_file, long_line, rng)
+        os.makedirs(os.path.join(root, os.path.dirname(rel_path)), exist_ok=True)
+        with open(os.path.join(root, rel_path), 'w') as f:
+            f.write(content)
+        source_files.append(rel_path)
+        total_bytes += len(content.encode('utf-8'))
+    
+    history_path = "deployment-history.json"
+    with open(os.path.join(root, history_path), 'w') as f:
+        json.dump(generate_deployment_history(deployments, rng), f)
+    
+    if commits > 0:
+        run_git(root, "init", "-q")
+        run_git(root, "add", "-A")
+        run_git(root, "commit", "-q", "-m", "Initial synthetic tree")
+        # Each further commit extends a tenth of the files
+        for commit in range(1, commits):
+            for rel_path in rng.sample(source_files, max(1, files // 10)):
+                language = rel_path.rsplit('.', 1)[1]
+                with open(os.path.join(root, rel_path), 'a') as f:
+                    f.write(SOURCE_BLOCKS[language].format(n=1000 + commit))
+            run_git(root, "commit", "-q", "-am", f"Synthetic change {commit}")
+    
+    manifest = {
+        "parameters": {
+            "files": files,
+            "lines_per_file": lines_per_file,
+            "languages": languages,
+            "long_line_ratio": long_line_ratio,
+            "long_line_length": long_line_length,
+            "commits": commits,
+            "deployments": deployments,
+            "seed": seed
+        },
+        "source_files": source_files,
+        "source_bytes": total_bytes,
+        "history_path": history_path,
+        "history_bytes": os.path.getsize(os.path.join(root, history_path))
+    }
+    with open(os.path.join(root, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def load_agent_module(name: str):
+    """Import templates/ai-agents/<name>-agent.py as a module"""
+    # The agents import their shared support module from their own directory
+    if AGENTS_DIR not in sys.path:
+        sys.path.insert(0, AGENTS_DIR)
+    path = os.path.join(AGENTS_DIR, f"{name}-agent.py")
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_') + "_agent", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process so far"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def timed(operation: Callable[[], Any], min_seconds: float = 0.5) -> Dict[str, Any]:
+    """Run operation until min_seconds have passed; returns the iteration count and seconds per iteration"""
+    iterations = 0
+    start_time = time.perf_counter()
+    while True:
+        operation()
+        iterations += 1
+        elapsed = time.perf_counter() - start_time
+        if elapsed >= min_seconds:
+            return {"iterations": iterations, "seconds": elapsed / iterations}
+
+
+def run_case(name: str, root: str, jobs: int) -> Dict[str, Any]:
+    """Measure one case against the repository at root (called in a child process)"""
+    with open(os.path.join(root, MANIFEST_NAME), 'r') as f:
+        manifest = json.load(f)
+    os.chdir(root)
+    scratch = tempfile.mkdtemp(prefix="agent-benchmark-")
+    
+    try:
+        if CASES[name][0] == "code-quality":
+            module = load_agent_module("code-quality")
+            agent = module.CodeQualityAgent()
+            # External tool timings depend on what is installed, not on the agent
+            agent.config["external_tools"]["enabled"] = False
+            files = manifest["source_files"]
+            agent.duplicate_index = module.DuplicateIndex(os.path.join(scratch, "fingerprints.db"))
+            if name == "duplicate_detection":
+                # A fresh index per iteration: fingerprint every file, then look all of them up
+                index_paths = (os.path.join(scratch, f"fingerprints-{i}.db") for i in itertools.count())
+                result = timed(lambda: module.DuplicateIndex(next(index_paths)).find_duplicates(files))
+            else:
+                if name == "analyze_files":
+                    agent.result_cache = None
+                else:
+                    agent.result_cache = module.AnalysisCache(os.path.join(scratch, "results.db"))
+                    agent.analyze_files(files, jobs=jobs)
+                result = timed(lambda: agent.analyze_files(files, jobs=jobs))
+            units = len(files)
+            result["mb_per_second"] = round(manifest["source_bytes"] / 1e6 / result["seconds"], 3)
+        else:
+            module = load_agent_module("deployment-strategy")
+            agent = module.DeploymentStrategyAgent()
+            agent.history_store = module.DeploymentHistoryStore(
+                os.path.join(scratch, "history.db"), agent.config["history_store"]["counter_half_life_days"]
+            )
+            if name == "history_import":
+                result = timed(lambda: agent.history_store.import_json(manifest["history_path"], force=True))
+                units = manifest["parameters"]["deployments"]
+                result["mb_per_second"] = round(manifest["history_bytes"] / 1e6 / result["seconds"], 3)
+            elif name == "analyze_changes":
+                diff_range = f"HEAD~{max(1, manifest['parameters']['commits'] - 1)}"
+                files = manifest["source_files"]
+                result = timed(lambda: agent.analyze_changes(files, diff_range=diff_range))
+                units = len(files)
+            else:
+                agent.history_store.import_json(manifest["history_path"], force=True)
+                change_analysis = agent.analyze_changes(manifest["source_files"][:20], diff_stats={})
+                if name == "predict_deployment_strategy":
+                    result = timed(lambda: [
+                        agent.predict_deployment_strategy(change_analysis, environment)
+                        for environment in ENVIRONMENTS
+                    ])
+                    units = len(ENVIRONMENTS)
+                else:
+                    result = timed(lambda: [
+                        agent.history_store.strategy_performance(environment, [factor])
+                        for environment in ENVIRONMENTS for factor in RISK_FACTORS
+                    ])
+                    units = len(ENVIRONMENTS) * len(RISK_FACTORS)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    
+    result["throughput"] = round(units / result["seconds"], 2)
+    result["unit"] = f"{CASES[name][1]}/s"
+    result["seconds"] = round(result["seconds"], 6)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def compare_results(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[str]:
+    """Describe each case whose throughput fell, or peak RSS grew, by more than tolerance"""
+    if baseline.get("parameters") != current.get("parameters"):
+        print("⚠️  Baseline was recorded with different generator parameters")
+    
+    regressions = []
+    print(f"{'case':30} {'baseline':>14} {'current':>14} {'change':>8} {'rss MB':>16}")
+    for name, result in current["cases"].items():
+        previous = baseline.get("cases", {}).get(name)
+        if not previous:
+            continue
+        change = result["throughput"] / previous["throughput"] - 1 if previous["throughput"] else 0.0
+        rss = f"{previous.get('peak_rss_mb')} -> {result.get('peak_rss_mb')}"
+        print(f"{name:30} {previous['throughput']:>14.1f} {result['throughput']:>14.1f} {change:>+8.1%} {rss:>16}")
+        if change < -tolerance:
+            regressions.append(f"{name}: throughput {change:+.1%} ({result['unit']})")
+        if previous.get("peak_rss_mb") and result.get("peak_rss_mb"):
+            growth = result["peak_rss_mb"] / previous["peak_rss_mb"] - 1
+            if growth > tolerance:
+                regressions.append(f"{name}: peak RSS {growth:+.1%}")
+    return regressions
+
+
+def main():
+    """Main entry point for the agent benchmark suite"""
+    parser = argparse.ArgumentParser(description="Agent benchmark suite")
+    parser.add_argument("--repo", help="Directory for the synthetic repository (default: a temporary directory); "
+                                       "an existing one with a manifest is reused")
+    parser.add_argument("--generate-only", action="store_true", help="Generate the repository and exit")
+    parser.add_argument("--files", type=int, default=200, help="Number of source files")
+    parser.add_argument("--lines-per-file", type=int, default=200, help="Approximate lines per source file")
+    parser.add_argument("--languages", default="py,js,go", help="Comma-separated languages (py, js, go)")
+    parser.add_argument("--long-line-ratio", type=float, default=0.02,
+                       help="Fraction of files with one pathological long line")
+    parser.add_argument("--long-line-length", type=int, default=2000, help="Length of pathological lines")
+    parser.add_argument("--commits", type=int, default=10, help="Commits of git history (0 for no git repository)")
+    parser.add_argument("--deployments", type=int, default=20000, help="Deployment history records")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed for the generator")
+    parser.add_argument("--cases", help=f"Comma-separated cases to run (default: all of {', '.join(CASES)})")
+    parser.add_argument("--jobs", type=int, default=1, help="Worker processes for analyze_files cases")
+    parser.add_argument("--output", help="Path to save the results as a JSON baseline")
+    parser.add_argument("--compare", help="Baseline JSON to compare against; exits non-zero on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                       help="Allowed relative throughput drop or peak RSS growth for --compare")
+    parser.add_argument("--run-case", help=argparse.SUPPRESS)
+    
+    args = parser.parse_args()
+    
+    if args.run_case:
+        print(json.dumps(run_case(args.run_case, args.repo, args.jobs)))
+        return 0
+    
+    cases = [c.strip() for c in args.cases.split(',')] if args.cases else list(CASES)
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+    
+    root = args.repo or tempfile.mkdtemp(prefix="synthetic-repo-")
+    try:
+        manifest_path = os.path.join(root, MANIFEST_NAME)
+        if os.path.exists(manifest_path):
+            with open(manifest_path, 'r') as f:
+                manifest = json.load(f)
+            print(f"📁 Reusing synthetic repository at {root}")
+        else:
+            start_time = time.time()
+            manifest = generate_repository(
+                root, args.files, args.lines_per_file,
+                [language.strip() for language in args.languages.split(',') if language.strip()],
+                args.long_line_ratio, args.long_line_length, args.commits, args.deployments, args.seed
+            )
+            print(f"📁 Generated {len(manifest['source_files'])} files "
+                  f"({manifest['source_bytes'] / 1e6:.1f} MB) in {time.time() - start_time:.1f}s at {root}")
+        if args.generate_only:
+            return 0
+        
+        report = {
+            "created_at": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "jobs": args.jobs,
+            "parameters": manifest["parameters"],
+            "cases": {}
+        }
+        for case in cases:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--run-case", case, "--repo", root, "--jobs", str(args.jobs)],
+                capture_output=True, text=True
+            )
+            if result.returncode != 0:
+                print(f"❌ {case} failed:\n{result.stderr[-2000:]}")
+                return 1
+            report["cases"][case] = json.loads(result.stdout.strip().splitlines()[-1])
+            case_result = report["cases"][case]
+            print(f"⏱️  {case}: {case_result['throughput']:.1f} {case_result['unit']}"
+                  + (f", {case_result['mb_per_second']} MB/s" if "mb_per_second" in case_result else "")
+                  + f", peak RSS {case_result['peak_rss_mb']} MB")
+    finally:
+        if not args.repo:
+            shutil.rmtree(root, ignore_errors=True)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results saved to {args.output}")
+    
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.tolerance)
+        if regressions:
+            print("Performance regressions:")
+            for regression in regressions:
+                print(f"   - {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Agent Startup Benchmark
+AI Agent Development Framework v3.7
+
+Runs each scenario in startup-budget.json under `python -X importtime` and
+checks it against its budget: the import time and wall-clock time it adds
+over a bare interpreter, and modules that must stay off its startup path.
+Exits non-zero when any budget is exceeded.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+AGENTS_DIR = os.path.dirname(BENCHMARK_DIR)
+DEFAULT_BUDGET_PATH = os.path.join(BENCHMARK_DIR, "startup-budget.json")
+
+
+def run_with_importtime(arguments: List[str]) -> Tuple[float, Dict[str, int]]:
+    """Run python -X importtime with arguments; returns (wall seconds, {module: self microseconds})"""
+    start_time = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + arguments,
+        cwd=AGENTS_DIR, capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start_time
+    if result.returncode != 0:
+        raise RuntimeError(f"{' '.join(arguments)} exited with {result.returncode}: {result.stderr[-500:]}")
+    
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    imports = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) == 3 and fields[0].strip().isdigit():
+            imports[fields[2].strip()] = int(fields[0])
+    return elapsed, imports
+
+
+def measure(arguments: List[str], runs: int, baseline_modules: Dict[str, int]) -> Dict[str, Any]:
+    """Median wall and import time of arguments, counting only imports a bare interpreter does not make"""
+    wall_times = []
+    import_times = []
+    modules = set()
+    for _ in range(runs):
+        elapsed, imports = run_with_importtime(arguments)
+        added = {name: micros for name, micros in imports.items() if name not in baseline_modules}
+        wall_times.append(elapsed)
+        import_times.append(sum(added.values()) / 1000)
+        modules.update(added)
+    return {
+        "wall_ms": statistics.median(wall_times) * 1000,
+        "import_ms": statistics.median(import_times),
+        "modules": sorted(modules)
+    }
+
+
+def main():
+    """Main entry point for the startup benchmark"""
+    parser = argparse.ArgumentParser(description="Agent startup benchmark")
+    parser.add_argument("--budget", default=DEFAULT_BUDGET_PATH, help="Path to the startup budget JSON file")
+    parser.add_argument("--runs", type=int, help="Runs per scenario (default: from the budget file)")
+    parser.add_argument("--output", help="Path to save the benchmark report JSON")
+    
+    args = parser.parse_args()
+    
+    with open(args.budget, 'r') as f:
+        budget = json.load(f)
+    runs = args.runs or budget.get("runs", 5)
+    
+    interpreter = measure(["-c", "pass"], runs, {})
+    _, baseline_modules = run_with_importtime(["-c", "pass"])
+    print(f"⏱️  Bare interpreter: {interpreter['wall_ms']:.1f} ms")
+    
+    report = {"interpreter_wall_ms": round(interpreter["wall_ms"], 1), "runs": runs, "scenarios": []}
+    failures = []
+    for scenario in budget["scenarios"]:
+        result = measure(scenario["arguments"], runs, baseline_modules)
+        overhead_ms = result["wall_ms"] - interpreter["wall_ms"]
+        forbidden = [
+            module for module in scenario.get("forbidden_modules", [])
+            if module in result["modules"]
+        ]
+        
+        problems = []
+        if result["import_ms"] > scenario["max_import_ms"]:
+            problems.append(f"imports take {result['import_ms']:.1f} ms (budget {scenario['max_import_ms']} ms)")
+        if overhead_ms > scenario["max_overhead_ms"]:
+            problems.append(f"adds {overhead_ms:.1f} ms over the interpreter (budget {scenario['max_overhead_ms']} ms)")
+        if forbidden:
+            problems.append(f"imports {', '.join(forbidden)} at startup")
+        failures.extend(f"{scenario['name']}: {problem}" for problem in problems)
+        
+        report["scenarios"].append({
+            "name": scenario["name"],
+            "import_ms": round(result["import_ms"], 1),
+            "overhead_ms": round(overhead_ms, 1),
+            "wall_ms": round(result["wall_ms"], 1),
+            "modules_imported": len(result["modules"]),
+            "forbidden_imported": forbidden,
+            "within_budget": not problems
+        })
+        status = "✅" if not problems else "❌"
+        print(f"{status} {scenario['name']}: imports {result['import_ms']:.1f} ms, "
+              f"+{overhead_ms:.1f} ms over the interpreter, {len(result['modules'])} modules")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    
+    if failures:
+        print("Startup budget exceeded:")
+        for failure in failures:
+            print(f"   - {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -15,26 +15,334 @@ import logging
 import os
 import ast
 import re
-from typing import Dict, List, Any, Optional, Union
+import bisect
+import fnmatch
+import hashlib
+import itertools
+import mmap
+import sqlite3
+import time
+from collections import deque
+from typing import Dict, List, Any, Callable, Iterable, Iterator, Optional, Tuple, Union
 from pathlib import Path
 from datetime import datetime
-import yaml
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+from agent_common import (
+    PerformanceRecorder, SubprocessDeadlineExceeded, SubprocessExecutor, load_config_document
 )
+from analysis_cache import AnalysisCache, WarmResultCache
+from analysis_daemon import DEFAULT_DAEMON_SOCKET, AnalysisDaemon
+from duplicate_index import DuplicateIndex
+from finding_store import FindingStore, report_json_default
+from pattern_scanner import LineIndex, PatternScanner
+from source_file import SourceFile
+
+# yaml, concurrent.futures and socketserver are imported where used, keeping
+# them off the startup path of runs that never need them
 logger = logging.getLogger(__name__)
 
+# Bump whenever per-file analysis output changes so stale cache entries are ignored
+ANALYSIS_CACHE_VERSION = 5
+
+# Default discovery globs for --analyze-all
+DEFAULT_SOURCE_GLOBS = ["*.py", "*.js", "*.ts", "*.go", "*.java", "*.cpp", "*.rs"]
+DEFAULT_EXCLUDE_GLOBS = [".git", "node_modules", "venv", ".venv", "__pycache__", ".tox", "vendor"]
+
+DEFAULT_PROJECT_CONTEXT = "AI Agent Development Framework v3.7 project"
+
+# New-side line range of a unified diff hunk header
+DIFF_HUNK_PATTERN = re.compile(r'^@@ -\d+(?:,\d+)? \+(?P<start>\d+)(?:,(?P<count>\d+))? @@')
+
+# Last character of a line ending in whitespace (str.rstrip's notion of it), for
+# str content and for the bytes of plain files (SourceFile.is_plain)
+TRAILING_WHITESPACE = re.compile(r'[^\S\n]$', re.MULTILINE)
+TRAILING_WHITESPACE_BYTES = re.compile(rb'[^\S\n]$', re.MULTILINE)
+
+# Output line formats of the batched external tools
+FLAKE8_LINE_PATTERN = re.compile(r'^(?P<path>.+?):(?P<line>\d+):(?P<column>\d+): (?P<code>[A-Z]+\d+) (?P<text>.*)$')
+MYPY_LINE_PATTERN = re.compile(
+    r'^(?P<path>.+?):(?P<line>\d+):(?:(?P<column>\d+):)? (?P<level>error|warning|note): '
+    r'(?P<text>.*?)(?:  \[(?P<code>[\w-]+)\])?$'
+)
+
+
+class ExternalToolResults:
+    """Per-file external tool output from batches still running in a SubprocessExecutor"""
+    
+    def __init__(self, file_paths: List[str], recorder: PerformanceRecorder):
+        self.results = {
+            file_path: {"external_tool_results": {}, "findings": []}
+            for file_path in file_paths
+        }
+        self.recorder = recorder
+        # (tool, file paths, future, parse_output), None once collected
+        self.batches = []
+        # normalized path -> indices of its batches, in submission order so findings stay in tool order
+        self.pending = {}
+        self.unavailable = set()
+    
+    def add_batch(self, tool: str, file_paths: List[str], future, parse_output) -> None:
+        """Register a submitted batch whose output parse_output splits into (path, line, finding)"""
+        for file_path in file_paths:
+            self.pending.setdefault(file_path, []).append(len(self.batches))
+        self.batches.append((tool, file_paths, future, parse_output))
+    
+    def get(self, file_path: str) -> Optional[Dict[str, Any]]:
+        """The tool results for a normalized path, waiting for its batches if needed"""
+        # Only this file's batches are awaited, so analysis of the first files overlaps
+        # with the tools' work on the rest; each collected batch fills all of its files
+        for index in self.pending.pop(file_path, ()):
+            self._collect(index)
+        return self.results.get(file_path)
+    
+    def close(self) -> None:
+        """Cancel batches nobody asked for, killing their processes"""
+        for batch in self.batches:
+            if batch is not None:
+                batch[2].cancel()
+        self.batches = []
+        self.pending = {}
+    
+    def _collect(self, index: int) -> None:
+        batch = self.batches[index]
+        if batch is None:
+            return
+        self.batches[index] = None
+        tool, file_paths, future, parse_output = batch
+        try:
+            with self.recorder.stage("external_tool_wait"):
+                result = future.result()
+        except FileNotFoundError:
+            if tool not in self.unavailable:
+                self.unavailable.add(tool)
+                logger.debug(f"{tool} not available")
+            return
+        except subprocess.TimeoutExpired:
+            logger.warning(f"{tool} timed out on a batch of {len(file_paths)} files")
+            return
+        except SubprocessDeadlineExceeded:
+            logger.warning(f"{tool} skipped a batch of {len(file_paths)} files: run deadline reached")
+            return
+        
+        for file_path, line, finding in parse_output(result.stdout):
+            file_result = self.results.get(os.path.normpath(file_path))
+            if file_result is None:
+                continue
+            raw_output = file_result["external_tool_results"].get(tool, "")
+            file_result["external_tool_results"][tool] = raw_output + line + "\n"
+            if finding:
+                file_result["findings"].append(finding)
+
+
+class PythonMetricsVisitor(ast.NodeVisitor):
+    """Collects every Python quality metric in a single AST traversal"""
+    
+    def __init__(self):
+        self.functions = []
+        self.classes = []
+        self.has_try = False
+        self._function_stack = []
+    
+    def _visit_function(self, node: Union[ast.FunctionDef, ast.AsyncFunctionDef]) -> None:
+        function_info = {
+            "name": node.name,
+            "line": node.lineno,
+            "length": node.end_lineno - node.lineno if hasattr(node, 'end_lineno') else 0,
+            "has_docstring": bool(ast.get_docstring(node)),
+            "has_annotations": bool(node.returns or any(arg.annotation for arg in node.args.args)),
+            "parameters": len(node.args.args),
+            "complexity": 1  # Base complexity
+        }
+        self.functions.append(function_info)
+        
+        self._function_stack.append(function_info)
+        self.generic_visit(node)
+        self._function_stack.pop()
+        
+        # Nested decision points also count towards the enclosing function, as a walk of its subtree would
+        if self._function_stack:
+            self._function_stack[-1]["complexity"] += function_info["complexity"] - 1
+    
+    visit_FunctionDef = _visit_function
+    visit_AsyncFunctionDef = _visit_function
+    
+    def visit_ClassDef(self, node: ast.ClassDef) -> None:
+        self.classes.append({
+            "name": node.name,
+            "line": node.lineno,
+            "length": node.end_lineno - node.lineno if hasattr(node, 'end_lineno') else 0,
+            "has_docstring": bool(ast.get_docstring(node))
+        })
+        self.generic_visit(node)
+    
+    def _add_complexity(self, amount: int) -> None:
+        if self._function_stack:
+            self._function_stack[-1]["complexity"] += amount
+    
+    def _visit_branch(self, node: ast.AST) -> None:
+        self._add_complexity(1)
+        self.generic_visit(node)
+    
+    visit_If = _visit_branch
+    visit_While = _visit_branch
+    visit_For = _visit_branch
+    visit_AsyncFor = _visit_branch
+    visit_ExceptHandler = _visit_branch
+    
+    def visit_BoolOp(self, node: ast.BoolOp) -> None:
+        self._add_complexity(len(node.values) - 1)
+        self.generic_visit(node)
+    
+    def visit_Try(self, node: ast.Try) -> None:
+        self.has_try = True
+        self.generic_visit(node)
+    
+    visit_TryStar = visit_Try
+
+
+class AnalysisAggregator:
+    """Running aggregates behind the report summary, so per-file results need not be retained"""
+    
+    SEVERITY_WEIGHTS = {"critical": 4, "high": 3, "medium": 2, "low": 1}
+    
+    def __init__(self, keep_violations: bool = True):
+        self.keep_violations = keep_violations
+        self.total_score = 0
+        self.scored_files = 0
+        self.total_findings = 0
+        self.findings_by_severity = {"critical": 0, "high": 0, "medium": 0, "low": 0}
+        self.findings_by_type = {}
+        self.total_files = 0
+        self.security_issues = 0
+        self.critical_security_issues = 0
+        self.framework_violations = 0
+    
+    def add(self, file_analysis: Dict[str, Any], replaces: Optional[Dict[str, Any]] = None) -> None:
+        """Fold one file analysis into the running aggregates, taking over the counts of replaces if given"""
+        # A file analyzed twice counts once, as in file_analyses
+        if replaces is None:
+            self.total_files += 1
+        else:
+            self._count_issues(replaces, -1)
+        self._count_issues(file_analysis, 1)
+        
+        if file_analysis["quality_score"] > 0:
+            self.total_score += file_analysis["quality_score"]
+            self.scored_files += 1
+        
+        for severity, finding_type in file_analysis["findings"].fields("severity", "type"):
+            self.total_findings += 1
+            if severity in self.findings_by_severity:
+                self.findings_by_severity[severity] += 1
+            
+            finding_type = finding_type or "unknown"
+            if finding_type not in self.findings_by_type:
+                self.findings_by_type[finding_type] = {"count": 0, "priority_score": 0}
+            self.findings_by_type[finding_type]["count"] += 1
+            self.findings_by_type[finding_type]["priority_score"] += self.SEVERITY_WEIGHTS.get(severity or "low", 1)
+        
+    def _count_issues(self, file_analysis: Dict[str, Any], sign: int) -> None:
+        """Add (sign 1) or take back (sign -1) a file's security and framework issue counts"""
+        security_issues = file_analysis["security_issues"]
+        self.security_issues += sign * len(security_issues)
+        self.critical_security_issues += sign * sum(
+            1 for (severity,) in security_issues.fields("severity") if severity in ["critical", "high"]
+        )
+        self.framework_violations += sign * sum(
+            1 for (finding_type,) in file_analysis["findings"].fields("type") if finding_type == "framework_compliance"
+        )
+    
+    @property
+    def overall_score(self) -> float:
+        if self.scored_files > 0:
+            return min(100, self.total_score / self.scored_files)
+        return 0
+
+
+class GitignoreRules:
+    """Minimal .gitignore matcher used when discovery walks the tree without git"""
+    
+    def __init__(self, base_dir: str, lines: List[str]):
+        self.base_dir = base_dir
+        self.rules = []
+        for line in lines:
+            line = line.rstrip()
+            if not line or line.startswith('#'):
+                continue
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            dir_only = line.endswith('/')
+            line = line.rstrip('/')
+            # A slash anywhere but the end anchors the pattern to the .gitignore's directory
+            anchored = '/' in line
+            self.rules.append((self._translate(line.lstrip('/')), negate, dir_only, anchored))
+    
+    @staticmethod
+    def _translate(pattern: str) -> "re.Pattern":
+        """Translate a gitignore glob to a regex; only ** crosses directory boundaries"""
+        regex = ""
+        i = 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                regex += '(?:.*/)?'
+                i += 3
+            elif pattern.startswith('**', i):
+                regex += '.*'
+                i += 2
+            elif pattern[i] == '*':
+                regex += '[^/]*'
+                i += 1
+            elif pattern[i] == '?':
+                regex += '[^/]'
+                i += 1
+            elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+                end = pattern.index(']', i + 1)
+                regex += '[' + pattern[i + 1:end].replace('!', '^', 1) + ']'
+                i = end + 1
+            else:
+                regex += re.escape(pattern[i])
+                i += 1
+        return re.compile(regex + r'\Z')
+    
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True if ignored, False if re-included, None if no rule applies"""
+        local_path = rel_path[len(self.base_dir) + 1:] if self.base_dir else rel_path
+        result = None
+        for regex, negate, dir_only, anchored in self.rules:
+            if dir_only and not is_dir:
+                continue
+            target = local_path if anchored else local_path.rsplit('/', 1)[-1]
+            if regex.match(target):
+                result = not negate
+        return result
+
+
 class CodeQualityAgent:
     """AI agent for comprehensive code quality analysis"""
     
+    # Files per worker task once the input outgrows up-front chunk sizing
+    ANALYSIS_CHUNK_FILES = 16
+    
     def __init__(self, config_path: Optional[str] = None):
         self.config = self._load_config(config_path)
         self.framework_version = "v3.7"
         self.output_path = self.config.get("output_path", "ai-analysis-results.json")
         self.quality_standards = self._load_quality_standards()
+        self.performance = PerformanceRecorder(self.config.get("performance", {}).get("slowest", 10))
+        tool_config = self.config.get("external_tools", {})
+        self.subprocesses = SubprocessExecutor(tool_config.get("max_concurrency", 4),
+                                               tool_config.get("tool_concurrency"))
+        self.result_cache = self._init_result_cache()
+        self.duplicate_index = self._init_duplicate_index()
+        # Set by the analysis daemon to keep results in memory between requests
+        self.warm_cache: Optional[WarmResultCache] = None
+        self._config_fingerprint = self._compute_config_fingerprint()
+        pattern_limits = self.config.get("pattern_limits")
+        self.security_scanner = PatternScanner(self.config["security_patterns"], recorder=self.performance,
+                                               limits=pattern_limits)
+        self.performance_scanner = PatternScanner(self.config["performance_patterns"], recorder=self.performance,
+                                                  limits=pattern_limits)
         
     def _load_config(self, config_path: Optional[str]) -> Dict[str, Any]:
         """Load configuration from file or use defaults"""
@@ -63,16 +371,105 @@ class CodeQualityAgent:
                 "inefficient_loops": [r"for.*in.*len\(", r"while.*len\(.*\)"],
                 "n_plus_one": [r"for.*\.get\(", r"for.*\.filter\("],
                 "large_data_structures": [r"list\(\[.*\]\*\d{4,}", r"dict\(\{.*\}\*\d{4,}"]
+            },
+            # Guards against patterns that backtrack super-linearly (see PatternScanner)
+            "pattern_limits": {
+                "reject_exponential": True,
+                "time_budget_ms": 250,
+                "max_line_length": 4096
+            },
+            "discovery": {
+                "include": list(DEFAULT_SOURCE_GLOBS),
+                "exclude": list(DEFAULT_EXCLUDE_GLOBS),
+                "use_git": True,
+                "respect_gitignore": True
+            },
+            # Tools run in the background while files are analyzed. One mypy at a
+            # time, as concurrent runs contend for its cache; deadline_seconds
+            # caps the whole run, killing tools still running when it passes
+            "external_tools": {
+                "enabled": True,
+                "batch_size": 200,
+                "timeout_per_file": 30,
+                "max_concurrency": 4,
+                "tool_concurrency": {"mypy": 1},
+                "deadline_seconds": None
+            },
+            "result_cache": {
+                "enabled": True,
+                "path": ".ai-agent-cache/code-quality-results.db",
+                "max_size_mb": 256
+            },
+            # Files over max_file_size_mb, or with a NUL byte in their first
+            # binary_sniff_bytes, are reported as skipped instead of analyzed;
+            # external tools and duplicate detection run per window_files files
+            "ingestion": {
+                "max_file_size_mb": 10,
+                "binary_sniff_bytes": 8192,
+                "window_files": 1000
+            },
+            # Cross-file duplicates of at least quality_thresholds.duplicate_threshold lines
+            "duplicate_detection": {
+                "enabled": True,
+                "path": ".ai-agent-cache/code-quality-fingerprints.db",
+                "max_occurrences": 50
+            },
+            # Length of the slowest files/patterns lists in the performance report
+            "performance": {
+                "slowest": 10
             }
         }
         
         if config_path and os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                default_config.update(config)
+            config = load_config_document(config_path)
+            default_config.update(config)
         
         return default_config
     
+    def _init_result_cache(self) -> Optional[AnalysisCache]:
+        """Create the persistent result cache if enabled in config"""
+        cache_config = self.config.get("result_cache", {})
+        if not cache_config.get("enabled", True):
+            return None
+        return AnalysisCache(
+            cache_config.get("path", ".ai-agent-cache/code-quality-results.db"),
+            cache_config.get("max_size_mb", 256)
+        )
+    
+    def _init_duplicate_index(self) -> Optional[DuplicateIndex]:
+        """Create the persistent fingerprint index if duplicate detection is enabled in config"""
+        duplicate_config = self.config.get("duplicate_detection", {})
+        if not duplicate_config.get("enabled", True):
+            return None
+        ingestion_config = self.config.get("ingestion", {})
+        return DuplicateIndex(
+            duplicate_config.get("path", ".ai-agent-cache/code-quality-fingerprints.db"),
+            self.config["quality_thresholds"].get("duplicate_threshold", 6),
+            duplicate_config.get("max_occurrences", 50),
+            ingestion_config.get("max_file_size_mb", 10) * 1024 * 1024,
+            ingestion_config.get("binary_sniff_bytes", 8192)
+        )
+    
+    def _compute_config_fingerprint(self) -> str:
+        """Fingerprint the config that influences per-file results"""
+        effective_config = {
+            "quality_thresholds": self.config["quality_thresholds"],
+            "security_patterns": self.config["security_patterns"],
+            "performance_patterns": self.config["performance_patterns"],
+            "pattern_limits": self.config.get("pattern_limits"),
+            "framework_version": self.framework_version,
+            "cache_version": ANALYSIS_CACHE_VERSION
+        }
+        serialized = json.dumps(effective_config, sort_keys=True)
+        return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    
+    def _result_cache_key(self, raw_content: Union[bytes, mmap.mmap], file_path: str) -> str:
+        """Cache key from file content, file type and effective config"""
+        digest = hashlib.sha256(raw_content)
+        digest.update(Path(file_path).suffix.lower().encode('utf-8'))
+        digest.update(self._config_fingerprint.encode('utf-8'))
+        return digest.hexdigest()
+    
     def _load_quality_standards(self) -> Dict[str, Any]:
         """Load Framework v3.7 quality standards"""
         return {
@@ -98,92 +495,433 @@ class CodeQualityAgent:
             }
         }
     
-    def analyze_files(self, file_paths: List[str], project_context: str = "") -> Dict[str, Any]:
+    def discover_source_files(self, root: str = ".") -> Iterator[str]:
+        """Lazily yield source files under root matching the discovery include/exclude globs"""
+        discovery = self.config.get("discovery", {})
+        include = discovery.get("include", DEFAULT_SOURCE_GLOBS)
+        exclude = discovery.get("exclude", DEFAULT_EXCLUDE_GLOBS)
+        
+        # One `git ls-files` in a work tree; otherwise a scandir walk that prunes excluded directories
+        if discovery.get("use_git", True) and self._is_git_work_tree(root):
+            candidates = self._iter_git_files(root)
+        else:
+            candidates = self._walk_files(root, exclude, discovery.get("respect_gitignore", True))
+        
+        for rel_path in candidates:
+            if not any(fnmatch.fnmatch(os.path.basename(rel_path), pattern) for pattern in include):
+                continue
+            if self._is_excluded(rel_path, exclude):
+                continue
+            yield rel_path if root in ("", ".") else os.path.join(root, rel_path)
+    
+    def _is_excluded(self, rel_path: str, exclude: List[str]) -> bool:
+        """Check a path and each of its components against the exclude globs"""
+        for pattern in exclude:
+            if fnmatch.fnmatch(rel_path, pattern):
+                return True
+            if any(fnmatch.fnmatch(part, pattern) for part in rel_path.split('/')):
+                return True
+        return False
+    
+    def _is_git_work_tree(self, root: str) -> bool:
+        """Check whether root is inside a git work tree"""
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--is-inside-work-tree'],
+                cwd=root or ".", capture_output=True, text=True, timeout=10
+            )
+            return result.returncode == 0 and result.stdout.strip() == "true"
+        except (subprocess.TimeoutExpired, FileNotFoundError):
+            return False
+    
+    def _iter_git_files(self, root: str) -> Iterator[str]:
+        """Stream tracked and untracked, non-ignored paths from git ls-files"""
+        process = subprocess.Popen(
+            ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard'],
+            cwd=root or ".", stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        pending = b""
+        try:
+            for chunk in iter(lambda: process.stdout.read(65536), b""):
+                pending += chunk
+                *paths, pending = pending.split(b"\0")
+                for path in paths:
+                    yield os.fsdecode(path)
+        finally:
+            process.stdout.close()
+            process.wait()
+    
+    def _walk_files(self, root: str, exclude: List[str], respect_gitignore: bool) -> Iterator[str]:
+        """Walk the tree once with scandir, pruning excluded and ignored directories"""
+        stack = [("", [])]
+        while stack:
+            rel_dir, ignore_chain = stack.pop()
+            abs_dir = os.path.join(root or ".", rel_dir)
+            
+            if respect_gitignore:
+                gitignore_path = os.path.join(abs_dir, ".gitignore")
+                if os.path.isfile(gitignore_path):
+                    try:
+                        with open(gitignore_path, 'r', encoding='utf-8', errors='replace') as f:
+                            ignore_chain = ignore_chain + [GitignoreRules(rel_dir, f.read().splitlines())]
+                    except OSError as e:
+                        logger.debug(f"Could not read {gitignore_path}: {e}")
+            
+            try:
+                with os.scandir(abs_dir) as it:
+                    entries = sorted(it, key=lambda entry: entry.name)
+            except OSError as e:
+                logger.debug(f"Could not list {abs_dir}: {e}")
+                continue
+            
+            subdirs = []
+            for entry in entries:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if is_dir and self._is_excluded(rel_path, exclude):
+                    continue
+                
+                # Deeper .gitignore files override shallower ones
+                ignored = False
+                for rules in ignore_chain:
+                    verdict = rules.match(rel_path, is_dir)
+                    if verdict is not None:
+                        ignored = verdict
+                if ignored:
+                    continue
+                
+                if is_dir:
+                    subdirs.append((rel_path, ignore_chain))
+                elif entry.is_file():
+                    yield rel_path
+            
+            # Reversed so the stack visits subdirectories in name order
+            stack.extend(reversed(subdirs))
+    
+    def analyze_files(self, file_paths: Iterable[str], project_context: str = "", jobs: int = 1,
+                      file_callback: Optional[Callable[[Dict[str, Any]], None]] = None,
+                      changed_lines: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> Dict[str, Any]:
         """Analyze multiple files for code quality"""
-        logger.info(f"Analyzing {len(file_paths)} files for code quality")
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        # Missing paths are dropped as the input is consumed, so discovery streams into analysis
+        found = {"files": 0}
+        existing_files = self._iter_existing_files(file_paths, found)
         
         analysis_results = {
             "overall_score": 0,
             "framework_compliance": {},
             "security_rating": "unknown",
-            "findings": [],
+            "findings": FindingStore(),
             "recommendations": [],
             "file_analyses": {},
             "summary": {},
             "timestamp": datetime.now().isoformat(),
             "framework_version": self.framework_version
         }
+        # Analyses handed to file_callback are not retained; only the summary sections are returned
+        if file_callback:
+            for retained_section in ("findings", "recommendations", "file_analyses"):
+                del analysis_results[retained_section]
         
-        total_score = 0
-        total_files = 0
+        aggregator = AnalysisAggregator(keep_violations=file_callback is None)
         
-        # Analyze each file
-        for file_path in file_paths:
-            if os.path.exists(file_path):
-                file_analysis = self._analyze_single_file(file_path)
-                analysis_results["file_analyses"][file_path] = file_analysis
-                
-                if file_analysis["quality_score"] > 0:
-                    total_score += file_analysis["quality_score"]
-                    total_files += 1
+        if self.result_cache:
+            self.result_cache.reset_stats()
+        
+        # (file path, warm analysis or None, fingerprint or None) per existing file; files unchanged
+        # since their last full analysis are served from warm_cache and skip the external tools
+        if self.warm_cache is not None and changed_lines is None:
+            self.warm_cache.reset_stats()
+            entries = ((file_path,) + self.warm_cache.lookup(file_path) for file_path in existing_files)
+        else:
+            entries = ((file_path, None, None) for file_path in existing_files)
+        
+        # Batch stages run per window of files, so the input is never held whole
+        open_tool_results = []
+        windows, fresh_windows = itertools.tee(self._iter_batch_windows(entries, changed_lines, open_tool_results))
+        fresh_inputs = (
+            file_path for window, _, _ in fresh_windows
+            for file_path, file_analysis, _ in window if file_analysis is None
+        )
+        try:
+            # Analyze each file (results arrive in input order, serial or parallel)
+            fresh_analyses = self._iter_file_analyses(fresh_inputs, jobs, changed_lines)
+            for window, tool_results, duplicate_findings in windows:
+                for file_path, file_analysis, fingerprint in window:
+                    if file_analysis is None:
+                        _, file_analysis = next(fresh_analyses)
+                        self._merge_external_tool_results(file_analysis, tool_results.get(os.path.normpath(file_path)))
+                        self._merge_duplicate_findings(file_analysis, duplicate_findings.get(os.path.normpath(file_path)))
+                        if fingerprint is not None and not self._pattern_scan_overran(file_analysis):
+                            self.warm_cache.store(file_path, fingerprint, file_analysis)
+                    
+                    if file_callback:
+                        aggregator.add(file_analysis)
+                        file_callback(file_analysis)
+                        continue
+                    
+                    aggregator.add(file_analysis, analysis_results["file_analyses"].get(file_path))
+                    analysis_results["file_analyses"][file_path] = file_analysis
                     
-                # Collect findings and recommendations
-                analysis_results["findings"].extend(file_analysis["findings"])
-                analysis_results["recommendations"].extend(file_analysis["recommendations"])
+                    # Collect findings and recommendations
+                    analysis_results["findings"].extend(file_analysis["findings"])
+                    analysis_results["recommendations"].extend(file_analysis["recommendations"])
+                tool_results.close()
+                open_tool_results.remove(tool_results)
+            fresh_analyses.close()
+        finally:
+            # Tools left running (the loop failed) are killed, not orphaned
+            for tool_results in open_tool_results:
+                tool_results.close()
+            self.subprocesses.record_timings(self.performance, "external_tool")
+        logger.info(f"Analyzed {found['files']} files for code quality")
         
         # Calculate overall metrics
-        if total_files > 0:
-            analysis_results["overall_score"] = min(100, total_score / total_files)
+        analysis_results["overall_score"] = aggregator.overall_score
         
-        analysis_results["security_rating"] = self._calculate_security_rating(analysis_results)
-        analysis_results["framework_compliance"] = self._assess_framework_compliance(analysis_results)
-        analysis_results["summary"] = self._generate_summary(analysis_results)
+        analysis_results["security_rating"] = self._calculate_security_rating(aggregator)
+        analysis_results["framework_compliance"] = self._assess_framework_compliance(analysis_results, aggregator)
+        analysis_results["summary"] = self._generate_summary(analysis_results, aggregator)
         
         # Add AI-powered insights
-        analysis_results["ai_insights"] = self._generate_ai_insights(analysis_results, project_context)
+        analysis_results["ai_insights"] = self._generate_ai_insights(analysis_results, aggregator, project_context)
+        
+        # Report what the result cache saved on this run
+        if self.result_cache:
+            self.result_cache.evict()
+            analysis_results["cache"] = self.result_cache.stats()
+        else:
+            analysis_results["cache"] = {"enabled": False}
+        if self.warm_cache is not None:
+            analysis_results["warm_cache"] = self.warm_cache.stats()
+        if self.duplicate_index is not None:
+            analysis_results["duplicate_index"] = self.duplicate_index.stats()
+        
+        # Stage timings since the agent was created or its recorder reset, worker processes included
+        self.performance.add("analyze_files", time.perf_counter() - wall_start, time.process_time() - cpu_start)
+        analysis_results["performance"] = self.performance.report()
         
         return analysis_results
     
-    def _analyze_single_file(self, file_path: str) -> Dict[str, Any]:
-        """Analyze a single file comprehensively"""
+    def analyze_files_streaming(self, file_paths: Iterable[str], project_context: str = "", jobs: int = 1,
+                                changed_lines: Optional[Dict[str, List[Tuple[int, int]]]] = None) -> Dict[str, Any]:
+        """Analyze files, streaming one JSONL record per file to output_path plus a final summary record"""
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        
+        with open(self.output_path, 'w') as f:
+            def write_file_record(file_analysis: Dict[str, Any]) -> None:
+                f.write(json.dumps({"record_type": "file", **file_analysis}, default=report_json_default) + "\n")
+            
+            analysis_results = self.analyze_files(
+                file_paths, project_context, jobs,
+                file_callback=write_file_record, changed_lines=changed_lines
+            )
+            f.write(json.dumps({"record_type": "summary", **analysis_results}, default=report_json_default) + "\n")
+        
+        logger.info(f"Analysis results streamed to {self.output_path}")
+        return analysis_results
+    
+    def _iter_batch_windows(self, entries: Iterator[Tuple], changed_lines: Optional[Dict[str, List[Tuple[int, int]]]],
+                            opened: List[ExternalToolResults]) -> Iterator[Tuple]:
+        """Yield (entries, external tool results, duplicate findings) per window of ingestion.window_files entries"""
+        window_files = max(1, self.config.get("ingestion", {}).get("window_files", 1000))
+        # Each window's tools start before the previous window is handed out, so they run while it
+        # is analyzed; results go into opened for the caller to close. On a cold fingerprint index
+        # a copy in an earlier window is reported only on the later file
+        prepared = None
+        while True:
+            window = list(itertools.islice(entries, window_files))
+            if window:
+                pending_files = [file_path for file_path, file_analysis, _ in window if file_analysis is None]
+                # Each external tool runs once per batch of the window's Python files, in the background
+                tool_results = self._run_python_external_tools(pending_files)
+                opened.append(tool_results)
+                # Fingerprint changed files and look them up in the repository index
+                current = (window, tool_results, self._detect_duplicates(pending_files, changed_lines))
+            if prepared is not None:
+                yield prepared
+            if not window:
+                return
+            prepared = current
+    
+    def _iter_existing_files(self, file_paths: Iterable[str], found: Dict[str, int]) -> Iterator[str]:
+        """Yield the paths that exist, counting them in found["files"]"""
+        for file_path in file_paths:
+            if os.path.exists(file_path):
+                found["files"] += 1
+                yield file_path
+    
+    def _iter_file_analyses(self, file_paths: Iterable[str], jobs: int,
+                            changed_lines: Optional[Dict[str, List[Tuple[int, int]]]] = None):
+        """Yield (file_path, analysis) pairs in input order, fanning out to worker processes when jobs > 1"""
+        # file_paths is consumed lazily; workers are kept a bounded number of chunks ahead
+        tasks = (
+            (file_path, changed_lines.get(os.path.normpath(file_path)) if changed_lines is not None else None)
+            for file_path in file_paths
+        )
+        # Inputs shorter than this are sized up front, as for executor.map
+        head = list(itertools.islice(tasks, jobs * 4 * self.ANALYSIS_CHUNK_FILES)) if jobs > 1 else []
+        tasks = itertools.chain(head, tasks)
+        if len(head) < jobs * 4 * self.ANALYSIS_CHUNK_FILES:
+            workers = min(jobs, len(head))
+            chunksize = max(1, len(head) // (workers * 4)) if workers else 1
+        else:
+            workers = jobs
+            chunksize = self.ANALYSIS_CHUNK_FILES
+        if workers <= 1:
+            for file_path, line_ranges in tasks:
+                yield file_path, self._analyze_single_file(file_path, line_ranges)
+            return
+        
+        from concurrent.futures import ProcessPoolExecutor
+        
+        try:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_analysis_worker,
+                initargs=(self,)
+            )
+        except (OSError, NotImplementedError) as e:
+            logger.warning(f"Process pool unavailable ({e}), falling back to serial analysis")
+            for file_path, line_ranges in tasks:
+                yield file_path, self._analyze_single_file(file_path, line_ranges)
+            return
+        
+        logger.info(f"Analyzing files with {workers} worker processes")
+        
+        # Chunks are collected in submission order, so merged output matches a serial run
+        chunks = iter(lambda: list(itertools.islice(tasks, chunksize)), [])
+        in_flight = deque()
+        
+        def submit_next() -> None:
+            chunk = next(chunks, None)
+            if chunk is not None:
+                in_flight.append((chunk, executor.submit(_analyze_files_in_worker, chunk)))
+        
+        with executor:
+            # Hold off tool spawns while the workers fork, which happens on the first submission
+            with self.subprocesses.forking():
+                for _ in range(workers * 2):
+                    submit_next()
+            while in_flight:
+                chunk, future = in_flight.popleft()
+                results = future.result()
+                submit_next()
+                for (file_path, _), (file_analysis, counters) in zip(chunk, results):
+                    self._merge_worker_counters(counters)
+                    yield file_path, file_analysis
+    
+    def _drain_worker_counters(self) -> Dict[str, Any]:
+        """Collect and reset per-process counters so a worker can report them with its result"""
+        counters = {"performance": self.performance.drain()}
+        if self.result_cache:
+            counters["cache"] = self.result_cache.drain_counters()
+        return counters
+    
+    def _merge_worker_counters(self, counters: Dict[str, Any]) -> None:
+        """Fold counters reported by a worker process into this agent"""
+        self.performance.merge(counters["performance"])
+        if self.result_cache and "cache" in counters:
+            self.result_cache.merge_counters(counters["cache"])
+    
+    def _analyze_single_file(self, file_path: str,
+                             line_ranges: Optional[List[Tuple[int, int]]] = None) -> Dict[str, Any]:
+        """Analyze a single file comprehensively, limiting style and pattern scans to line_ranges if given"""
+        # line_ranges are inclusive 1-based diff hunks; language analysis still covers the whole
+        # file and is cached per content, so repeated runs over one diff reuse it
+        with self.performance.stage("analyze_file", ("file", file_path)):
+            return self._run_file_analysis(file_path, line_ranges)
+    
+    def _run_file_analysis(self, file_path: str, line_ranges: Optional[List[Tuple[int, int]]]) -> Dict[str, Any]:
+        """Body of _analyze_single_file, timed as a whole by the caller"""
         logger.debug(f"Analyzing file: {file_path}")
         
         file_analysis = {
             "file_path": file_path,
             "quality_score": 0,
-            "findings": [],
+            "findings": FindingStore(),
             "recommendations": [],
             "metrics": {},
-            "security_issues": [],
-            "performance_issues": [],
-            "style_issues": [],
+            "security_issues": FindingStore(),
+            "performance_issues": FindingStore(),
+            "style_issues": FindingStore(),
             "complexity_metrics": {}
         }
+        if line_ranges is not None:
+            file_analysis["analyzed_line_ranges"] = line_ranges
         
+        source = None
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-                
-            # Determine file type and run appropriate analysis
-            file_extension = Path(file_path).suffix.lower()
+            with self.performance.stage("file_read"):
+                source = SourceFile(file_path)
+            skip_finding = self._ingestion_skip_finding(source)
+            if skip_finding is not None:
+                file_analysis["findings"].append(skip_finding)
+                file_analysis["quality_score"] = self._calculate_file_score(file_analysis)
+                return file_analysis
             
-            if file_extension == '.py':
-                file_analysis.update(self._analyze_python_file(file_path, content))
-            elif file_extension in ['.js', '.ts']:
-                file_analysis.update(self._analyze_javascript_file(file_path, content))
-            elif file_extension in ['.go']:
-                file_analysis.update(self._analyze_go_file(file_path, content))
+            # Unchanged content under an unchanged config yields the same result
+            cache_key = None
+            if self.result_cache:
+                with self.performance.stage("result_cache"):
+                    cache_key = self._result_cache_key(source.data, file_path)
+                    cached_analysis = self.result_cache.get(cache_key)
+                if cached_analysis is not None:
+                    cached_analysis["file_path"] = file_path
+                    if line_ranges is not None:
+                        self._limit_to_line_ranges(cached_analysis, line_ranges)
+                    return cached_analysis
+            
+            # Whole-file language analysis; diff mode caches it on its own since
+            # the hunk-limited scans below are specific to one diff. Like every
+            # result cache entry it is keyed on the current content: the base
+            # revision's metrics describe other code (at other line numbers), so
+            # they are reused only where the content still matches, i.e. through
+            # the full result looked up above. It is a second lookup for the same
+            # file, so it stays out of the per-file hit rate
+            language_key = f"{cache_key}:language" if cache_key and line_ranges is not None else None
+            language_analysis = self.result_cache.get(language_key, count=False) if language_key else None
+            if language_analysis is None:
+                with self.performance.stage("language_analysis"):
+                    language_analysis = self._analyze_language(file_path, source.text())
+                if language_key:
+                    self.result_cache.put(language_key, language_analysis)
+            file_analysis.update(language_analysis)
+            file_analysis["findings"] = FindingStore(file_analysis["findings"])
+            
+            # Common analyses for all file types, run on the mapped bytes of plain
+            # files so they need no decoded copy
+            if source.is_plain() and self.security_scanner.supports_bytes and self.performance_scanner.supports_bytes:
+                content = source.data
             else:
-                file_analysis.update(self._analyze_generic_file(file_path, content))
-                
-            # Common analyses for all file types
-            file_analysis["security_issues"].extend(self._check_security_patterns(content))
-            file_analysis["performance_issues"].extend(self._check_performance_patterns(content))
-            file_analysis["style_issues"].extend(self._check_style_issues(content, file_path))
+                content = source.text()
+            line_index = LineIndex(content)
+            spans = None
+            if line_ranges is not None:
+                spans = [line_index.span_of_lines(start, end) for start, end in line_ranges]
+            with self.performance.stage("security_scan"):
+                file_analysis["security_issues"].extend(self._check_security_patterns(content, line_index, spans))
+            with self.performance.stage("performance_scan"):
+                file_analysis["performance_issues"].extend(
+                    self._check_performance_patterns(content, line_index, spans)
+                )
+            with self.performance.stage("style_scan"):
+                file_analysis["style_issues"].extend(
+                    self._check_style_issues(content, file_path, line_ranges, line_index)
+                )
+            # Cut-short scans are general findings, scored by severity rather than as vulnerabilities
+            for scanner in (self.security_scanner, self.performance_scanner):
+                file_analysis["findings"].extend(self._pattern_overrun_findings(scanner))
             
             # Calculate overall file score
             file_analysis["quality_score"] = self._calculate_file_score(file_analysis)
             
+            if cache_key and line_ranges is None and not self._pattern_scan_overran(file_analysis):
+                self.result_cache.put(cache_key, file_analysis)
+            
         except Exception as e:
             logger.error(f"Error analyzing file {file_path}: {e}")
             file_analysis["findings"].append({
@@ -192,9 +930,118 @@ class CodeQualityAgent:
                 "message": f"Failed to analyze file: {e}",
                 "line": 0
             })
+        finally:
+            if source is not None:
+                source.close()
         
         return file_analysis
     
+    def _ingestion_skip_finding(self, source: SourceFile) -> Optional[Dict[str, Any]]:
+        """A finding explaining why a file is not analyzed (too large or binary), or None"""
+        ingestion_config = self.config.get("ingestion", {})
+        max_bytes = ingestion_config.get("max_file_size_mb", 10) * 1024 * 1024
+        if source.size > max_bytes:
+            return {
+                "type": "skipped_large_file",
+                "severity": "low",
+                "message": f"File not analyzed: {source.size} bytes exceeds the {max_bytes} byte limit",
+                "line": 0,
+                "suggestion": "Exclude generated files from analysis or raise ingestion.max_file_size_mb"
+            }
+        if source.looks_binary(ingestion_config.get("binary_sniff_bytes", 8192)):
+            return {
+                "type": "skipped_binary_file",
+                "severity": "low",
+                "message": "File not analyzed: content looks binary",
+                "line": 0,
+                "suggestion": "Exclude binary files from analysis"
+            }
+        return None
+    
+    def _is_ingestible(self, file_path: str) -> bool:
+        """Whether file_path is analyzed rather than skipped as too large or binary"""
+        try:
+            with SourceFile(file_path) as source:
+                return self._ingestion_skip_finding(source) is None
+        except OSError:
+            # Left to the analysis proper to report
+            return True
+    
+    def _analyze_language(self, file_path: str, content: str) -> Dict[str, Any]:
+        """Run the language-specific analysis for a file's type"""
+        file_extension = Path(file_path).suffix.lower()
+        
+        if file_extension == '.py':
+            return self._analyze_python_file(file_path, content)
+        elif file_extension in ['.js', '.ts']:
+            return self._analyze_javascript_file(file_path, content)
+        elif file_extension in ['.go']:
+            return self._analyze_go_file(file_path, content)
+        else:
+            return self._analyze_generic_file(file_path, content)
+    
+    def _limit_to_line_ranges(self, file_analysis: Dict[str, Any], line_ranges: List[Tuple[int, int]]) -> None:
+        """Keep only scan issues inside the given line ranges and rescore"""
+        range_starts = [start for start, _ in line_ranges]
+        
+        def in_ranges(line: int) -> bool:
+            index = bisect.bisect_right(range_starts, line) - 1
+            return index >= 0 and line <= line_ranges[index][1]
+        
+        for issue_key in ("security_issues", "performance_issues", "style_issues"):
+            file_analysis[issue_key] = FindingStore(
+                issue for issue in file_analysis[issue_key] if in_ranges(issue.get("line", 0))
+            )
+        file_analysis["analyzed_line_ranges"] = line_ranges
+        file_analysis["quality_score"] = self._calculate_file_score(file_analysis)
+    
+    def collect_changed_line_ranges(self, base_ref: str,
+                                    file_paths: Optional[List[str]] = None) -> Dict[str, List[Tuple[int, int]]]:
+        """Map each changed file to the line ranges added or modified since base_ref"""
+        # Against the merge base of base_ref and HEAD, covering committed and uncommitted
+        # changes; deleted files are left out
+        with self.performance.stage("git_diff"):
+            merge_base = self.subprocesses.run('git', ['git', 'merge-base', base_ref, 'HEAD'], timeout=30)
+        base = merge_base.stdout.strip() if merge_base.returncode == 0 else base_ref
+        
+        command = ['git', 'diff', '--relative', '--no-prefix', '--no-color', '--no-ext-diff',
+                   '--diff-filter=d', '-U0', base]
+        if file_paths:
+            command += ['--'] + list(file_paths)
+        with self.performance.stage("git_diff"):
+            result = self.subprocesses.run('git', command, timeout=120)
+        if result.returncode != 0:
+            raise RuntimeError(f"git diff against {base_ref} failed: {result.stderr.strip()}")
+        
+        changed_lines = {}
+        current_file = None
+        for line in result.stdout.splitlines():
+            if line.startswith('+++ '):
+                current_file = line[4:].strip('"')
+                current_file = None if current_file == '/dev/null' else os.path.normpath(current_file)
+                if current_file:
+                    changed_lines.setdefault(current_file, [])
+                continue
+            
+            hunk = DIFF_HUNK_PATTERN.match(line)
+            if hunk and current_file:
+                start = int(hunk.group("start"))
+                count = int(hunk.group("count")) if hunk.group("count") is not None else 1
+                if count > 0:
+                    changed_lines[current_file].append((start, start + count - 1))
+        
+        # Hunks come sorted and disjoint from git; merge touching ones
+        for file_path, ranges in changed_lines.items():
+            merged = []
+            for start, end in sorted(ranges):
+                if merged and start <= merged[-1][1] + 1:
+                    merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+                else:
+                    merged.append((start, end))
+            changed_lines[file_path] = merged
+        
+        return changed_lines
+    
     def _analyze_python_file(self, file_path: str, content: str) -> Dict[str, Any]:
         """Analyze Python file using AST and static analysis"""
         analysis = {
@@ -206,16 +1053,20 @@ class CodeQualityAgent:
         
         try:
             # Parse AST
-            tree = ast.parse(content)
+            with self.performance.stage("ast_parse"):
+                tree = ast.parse(content)
+            
+            # Gather all metrics in one traversal
+            visitor = PythonMetricsVisitor()
+            visitor.visit(tree)
             
             # Analyze AST
-            analysis.update(self._analyze_python_ast(tree, content))
+            analysis.update(self._analyze_python_ast(visitor, content))
             
             # Check for framework compliance
-            analysis["findings"].extend(self._check_python_framework_compliance(tree, content))
+            analysis["findings"].extend(self._check_python_framework_compliance(visitor, content))
             
-            # Run external tools if available
-            analysis.update(self._run_python_external_tools(file_path))
+            # External tools (flake8, mypy) run once per batch in analyze_files
             
         except SyntaxError as e:
             analysis["findings"].append({
@@ -228,95 +1079,82 @@ class CodeQualityAgent:
         
         return analysis
     
-    def _analyze_python_ast(self, tree: ast.AST, content: str) -> Dict[str, Any]:
-        """Analyze Python AST for quality metrics"""
+    def _analyze_python_ast(self, visitor: PythonMetricsVisitor, content: str) -> Dict[str, Any]:
+        """Analyze Python AST metrics for quality findings"""
         analysis = {
             "findings": [],
             "recommendations": [],
             "metrics": {
-                "functions": 0,
-                "classes": 0,
-                "lines_of_code": len(content.split('\n')),
+                "functions": len(visitor.functions),
+                "classes": len(visitor.classes),
+                "lines_of_code": content.count('\n') + 1,
                 "complexity": 0
             },
             "complexity_metrics": {}
         }
+        thresholds = self.config["quality_thresholds"]
         
-        for node in ast.walk(tree):
-            # Count functions and classes
-            if isinstance(node, ast.FunctionDef):
-                analysis["metrics"]["functions"] += 1
-                func_analysis = self._analyze_function_complexity(node)
-                analysis["complexity_metrics"][f"function_{node.name}"] = func_analysis
-                
-                # Check function length
-                func_length = node.end_lineno - node.lineno if hasattr(node, 'end_lineno') else 0
-                if func_length > self.config["quality_thresholds"]["function_length_threshold"]:
-                    analysis["findings"].append({
-                        "type": "function_too_long",
-                        "severity": "medium",
-                        "message": f"Function '{node.name}' is too long ({func_length} lines)",
-                        "line": node.lineno,
-                        "suggestion": "Consider breaking this function into smaller functions"
-                    })
-                
-                # Check for docstring
-                if not ast.get_docstring(node):
-                    analysis["findings"].append({
-                        "type": "missing_docstring",
-                        "severity": "low",
-                        "message": f"Function '{node.name}' missing docstring",
-                        "line": node.lineno,
-                        "suggestion": "Add docstring to document function purpose and parameters"
-                    })
+        for function_info in visitor.functions:
+            analysis["complexity_metrics"][f"function_{function_info['name']}"] = (
+                self._analyze_function_complexity(function_info)
+            )
             
-            elif isinstance(node, ast.ClassDef):
-                analysis["metrics"]["classes"] += 1
-                
-                # Check class length
-                class_length = node.end_lineno - node.lineno if hasattr(node, 'end_lineno') else 0
-                if class_length > self.config["quality_thresholds"]["class_length_threshold"]:
-                    analysis["findings"].append({
-                        "type": "class_too_long",
-                        "severity": "medium",
-                        "message": f"Class '{node.name}' is too long ({class_length} lines)",
-                        "line": node.lineno,
-                        "suggestion": "Consider using composition or breaking into smaller classes"
-                    })
-                
-                # Check for docstring
-                if not ast.get_docstring(node):
-                    analysis["findings"].append({
-                        "type": "missing_docstring",
-                        "severity": "low",
-                        "message": f"Class '{node.name}' missing docstring",
-                        "line": node.lineno,
-                        "suggestion": "Add docstring to document class purpose and usage"
-                    })
+            # Check function length
+            if function_info["length"] > thresholds["function_length_threshold"]:
+                analysis["findings"].append({
+                    "type": "function_too_long",
+                    "severity": "medium",
+                    "message": f"Function '{function_info['name']}' is too long ({function_info['length']} lines)",
+                    "line": function_info["line"],
+                    "suggestion": "Consider breaking this function into smaller functions"
+                })
+            
+            # Check for docstring
+            if not function_info["has_docstring"]:
+                analysis["findings"].append({
+                    "type": "missing_docstring",
+                    "severity": "low",
+                    "message": f"Function '{function_info['name']}' missing docstring",
+                    "line": function_info["line"],
+                    "suggestion": "Add docstring to document function purpose and parameters"
+                })
+        
+        for class_info in visitor.classes:
+            # Check class length
+            if class_info["length"] > thresholds["class_length_threshold"]:
+                analysis["findings"].append({
+                    "type": "class_too_long",
+                    "severity": "medium",
+                    "message": f"Class '{class_info['name']}' is too long ({class_info['length']} lines)",
+                    "line": class_info["line"],
+                    "suggestion": "Consider using composition or breaking into smaller classes"
+                })
+            
+            # Check for docstring
+            if not class_info["has_docstring"]:
+                analysis["findings"].append({
+                    "type": "missing_docstring",
+                    "severity": "low",
+                    "message": f"Class '{class_info['name']}' missing docstring",
+                    "line": class_info["line"],
+                    "suggestion": "Add docstring to document class purpose and usage"
+                })
         
         return analysis
     
-    def _analyze_function_complexity(self, func_node: ast.FunctionDef) -> Dict[str, Any]:
-        """Calculate cyclomatic complexity for a function"""
-        complexity = 1  # Base complexity
-        
-        for node in ast.walk(func_node):
-            if isinstance(node, (ast.If, ast.While, ast.For, ast.AsyncFor)):
-                complexity += 1
-            elif isinstance(node, ast.ExceptHandler):
-                complexity += 1
-            elif isinstance(node, ast.BoolOp):
-                complexity += len(node.values) - 1
-        
+    def _analyze_function_complexity(self, function_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Summarize cyclomatic complexity for a function"""
+        complexity = function_info["complexity"]
         return {
             "cyclomatic_complexity": complexity,
-            "name": func_node.name,
-            "line": func_node.lineno,
-            "parameters": len(func_node.args.args),
+            "name": function_info["name"],
+            "line": function_info["line"],
+            "parameters": function_info["parameters"],
             "is_complex": complexity > self.config["quality_thresholds"]["complexity_threshold"]
         }
     
-    def _check_python_framework_compliance(self, tree: ast.AST, content: str) -> List[Dict[str, Any]]:
+    def _check_python_framework_compliance(self, visitor: PythonMetricsVisitor,
+                                           content: str) -> List[Dict[str, Any]]:
         """Check Python code for Framework v3.7 compliance"""
         compliance_issues = []
         
@@ -332,8 +1170,7 @@ class CodeQualityAgent:
             })
         
         # Check for error handling patterns
-        has_error_handling = any(isinstance(node, ast.Try) for node in ast.walk(tree))
-        if not has_error_handling and any(isinstance(node, ast.FunctionDef) for node in ast.walk(tree)):
+        if not visitor.has_try and visitor.functions:
             compliance_issues.append({
                 "type": "framework_compliance",
                 "severity": "medium",
@@ -343,11 +1180,10 @@ class CodeQualityAgent:
             })
         
         # Check for type annotations (Python 3.5+)
-        functions_without_annotations = []
-        for node in ast.walk(tree):
-            if isinstance(node, ast.FunctionDef):
-                if not node.returns and not any(arg.annotation for arg in node.args.args):
-                    functions_without_annotations.append(node.name)
+        functions_without_annotations = [
+            function_info["name"] for function_info in visitor.functions
+            if not function_info["has_annotations"]
+        ]
         
         if functions_without_annotations:
             compliance_issues.append({
@@ -360,40 +1196,168 @@ class CodeQualityAgent:
         
         return compliance_issues
     
-    def _run_python_external_tools(self, file_path: str) -> Dict[str, Any]:
-        """Run external Python quality tools if available"""
-        analysis = {
-            "external_tool_results": {},
-            "findings": [],
-            "recommendations": []
-        }
-        
-        # Try to run flake8 for style checking
-        try:
-            result = subprocess.run([
-                'flake8', '--select=E,W,F', '--format=json', file_path
-            ], capture_output=True, text=True, timeout=30)
-            
-            if result.returncode == 0 or result.stdout:
-                analysis["external_tool_results"]["flake8"] = result.stdout
-                # Parse flake8 results if needed
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            logger.debug("flake8 not available or timed out")
-        
-        # Try to run mypy for type checking
+    def _run_python_external_tools(self, file_paths: List[str]) -> ExternalToolResults:
+        """Start external Python quality tools once per batch of files; results split per file as they are read"""
+        tool_config = self.config.get("external_tools", {})
+        python_files = list(dict.fromkeys(
+            os.path.normpath(file_path) for file_path in file_paths
+            if Path(file_path).suffix.lower() == '.py' and self._is_ingestible(file_path)
+        ))
+        if not tool_config.get("enabled", True):
+            python_files = []
+        tool_results = ExternalToolResults(python_files, self.performance)
+        if not python_files:
+            return tool_results
+        
+        # flake8 for style checking
+        self._run_external_tool_batches(
+            "flake8", ['flake8', '--select=E,W,F', '--format=default'],
+            python_files, self._parse_flake8_output, tool_results
+        )
+        
+        # mypy for type checking (one process reuses its type cache across the whole batch)
+        self._run_external_tool_batches(
+            "mypy", ['mypy', '--show-error-codes', '--show-column-numbers', '--no-error-summary',
+                     '--no-color-output', '--hide-error-context'],
+            python_files, self._parse_mypy_output, tool_results
+        )
+        
+        return tool_results
+    
+    def _run_external_tool_batches(self, tool: str, command: List[str], file_paths: List[str],
+                                   parse_output, tool_results: ExternalToolResults) -> None:
+        """Submit a tool over chunks of files, each with a per-batch timeout budget"""
+        tool_config = self.config.get("external_tools", {})
+        batch_size = max(1, tool_config.get("batch_size", 200))
+        timeout_per_file = tool_config.get("timeout_per_file", 30)
+        
+        for start in range(0, len(file_paths), batch_size):
+            batch = file_paths[start:start + batch_size]
+            future = self.subprocesses.submit(tool, command + batch, timeout=timeout_per_file * len(batch))
+            tool_results.add_batch(tool, batch, future, parse_output)
+    
+    def start_run_deadline(self, seconds: Optional[float] = None) -> None:
+        """Start the clock on a run deadline of seconds (external_tools.deadline_seconds by default)"""
+        if seconds is None:
+            seconds = self.config.get("external_tools", {}).get("deadline_seconds")
+        self.subprocesses.deadline = time.monotonic() + seconds if seconds else None
+    
+    def _parse_flake8_output(self, output: str):
+        """Yield (file_path, raw_line, finding) for each flake8 violation"""
+        for line in output.splitlines():
+            match = FLAKE8_LINE_PATTERN.match(line)
+            if not match:
+                continue
+            code = match.group("code")
+            if code.startswith('F') or code.startswith('E9'):
+                severity = "medium"
+            else:
+                severity = "low"
+            yield match.group("path"), line, {
+                "type": "lint_issue",
+                "tool": "flake8",
+                "rule": code,
+                "severity": severity,
+                "message": f"{code} {match.group('text')}",
+                "line": int(match.group("line")),
+                "column": int(match.group("column"))
+            }
+    
+    def _parse_mypy_output(self, output: str):
+        """Yield (file_path, raw_line, finding) for each mypy message; notes carry no finding"""
+        for line in output.splitlines():
+            match = MYPY_LINE_PATTERN.match(line)
+            if not match:
+                continue
+            finding = None
+            if match.group("level") != "note":
+                finding = {
+                    "type": "type_error",
+                    "tool": "mypy",
+                    "rule": match.group("code") or "mypy",
+                    "severity": "medium",
+                    "message": match.group("text"),
+                    "line": int(match.group("line")),
+                    "column": int(match.group("column") or 0)
+                }
+            yield match.group("path"), line, finding
+    
+    def _merge_external_tool_results(self, file_analysis: Dict[str, Any],
+                                     tool_result: Optional[Dict[str, Any]]) -> None:
+        """Attach batched tool output to a file analysis and rescore it"""
+        if not tool_result:
+            return
+        file_analysis["external_tool_results"] = tool_result["external_tool_results"]
+        if tool_result["findings"]:
+            file_analysis["findings"].extend(tool_result["findings"])
+            file_analysis["quality_score"] = self._calculate_file_score(file_analysis)
+    
+    def _detect_duplicates(self, file_paths: List[str],
+                           changed_lines: Optional[Dict[str, List[Tuple[int, int]]]] = None
+                           ) -> Dict[str, List[Dict[str, Any]]]:
+        """Duplicate-code findings per normalized path, limited to changed_lines' hunks if given"""
+        if self.duplicate_index is None or not file_paths:
+            return {}
+        
+        # The index is keyed by cwd-relative paths so relative and absolute spellings agree
+        index_paths = {os.path.relpath(file_path): os.path.normpath(file_path) for file_path in file_paths}
         try:
-            result = subprocess.run([
-                'mypy', '--show-error-codes', '--json-report', '/tmp/mypy_report', file_path
-            ], capture_output=True, text=True, timeout=30)
+            with self.performance.stage("duplicate_detection"):
+                duplicates = self.duplicate_index.find_duplicates(list(index_paths))
+        except sqlite3.Error as e:
+            logger.warning(f"Duplicate detection failed: {e}")
+            return {}
+        
+        findings = {}
+        for index_path, regions in duplicates.items():
+            file_path = index_paths[index_path]
+            line_ranges = changed_lines.get(file_path) if changed_lines is not None else None
+            # Overlapping regions (one block copied to several places) make a single finding
+            blocks = []
+            for region in regions:
+                copy = {
+                    "file_path": region["other_file"],
+                    "start_line": region["other_start_line"],
+                    "end_line": region["other_end_line"]
+                }
+                if blocks and region["start_line"] <= blocks[-1]["end_line"]:
+                    blocks[-1]["end_line"] = max(blocks[-1]["end_line"], region["end_line"])
+                    blocks[-1]["copies"].append(copy)
+                else:
+                    blocks.append({
+                        "start_line": region["start_line"],
+                        "end_line": region["end_line"],
+                        "copies": [copy]
+                    })
             
-            if result.returncode == 0 or result.stderr:
-                analysis["external_tool_results"]["mypy"] = result.stderr
-                
-        except (subprocess.TimeoutExpired, FileNotFoundError):
-            logger.debug("mypy not available or timed out")
-        
-        return analysis
+            for block in blocks:
+                start, end, copies = block["start_line"], block["end_line"], block["copies"]
+                if line_ranges is not None and not any(
+                        range_start <= end and start <= range_end for range_start, range_end in line_ranges):
+                    continue
+                first_copy = f"{copies[0]['file_path']}:{copies[0]['start_line']}-{copies[0]['end_line']}"
+                message = f"Lines {start}-{end} duplicate {first_copy}"
+                if len(copies) > 1:
+                    message += f" and {len(copies) - 1} other location(s)"
+                findings.setdefault(file_path, []).append({
+                    "type": "duplicate_code",
+                    "severity": "medium",
+                    "message": message,
+                    "file_path": file_path,
+                    "line": start,
+                    "end_line": end,
+                    "duplicates": copies,
+                    "suggestion": "Extract the duplicated code into a shared function or module"
+                })
+        return findings
+    
+    def _merge_duplicate_findings(self, file_analysis: Dict[str, Any],
+                                  findings: Optional[List[Dict[str, Any]]]) -> None:
+        """Attach duplicate-code findings to a file analysis and rescore it"""
+        if not findings:
+            return
+        file_analysis["findings"].extend(findings)
+        file_analysis["quality_score"] = self._calculate_file_score(file_analysis)
     
     def _analyze_javascript_file(self, file_path: str, content: str) -> Dict[str, Any]:
         """Analyze JavaScript/TypeScript file"""
@@ -403,14 +1367,16 @@ class CodeQualityAgent:
             "metrics": {
                 "functions": len(re.findall(r'function\s+\w+|const\s+\w+\s*=\s*\(.*\)\s*=>', content)),
                 "classes": len(re.findall(r'class\s+\w+', content)),
-                "lines_of_code": len(content.split('\n'))
+                "lines_of_code": content.count('\n') + 1
             }
         }
         
+        line_index = LineIndex(content)
+        
         # Check for console.log statements (should use proper logging)
         console_logs = re.finditer(r'console\.log', content)
         for match in console_logs:
-            line_num = content[:match.start()].count('\n') + 1
+            line_num = line_index.line_of(match.start())
             analysis["findings"].append({
                 "type": "improper_logging",
                 "severity": "low",
@@ -422,7 +1388,7 @@ class CodeQualityAgent:
         # Check for var usage (prefer let/const)
         var_usage = re.finditer(r'\bvar\s+', content)
         for match in var_usage:
-            line_num = content[:match.start()].count('\n') + 1
+            line_num = line_index.line_of(match.start())
             analysis["findings"].append({
                 "type": "outdated_syntax",
                 "severity": "low",
@@ -441,7 +1407,7 @@ class CodeQualityAgent:
             "metrics": {
                 "functions": len(re.findall(r'func\s+\w+', content)),
                 "structs": len(re.findall(r'type\s+\w+\s+struct', content)),
-                "lines_of_code": len(content.split('\n'))
+                "lines_of_code": content.count('\n') + 1
             }
         }
         
@@ -466,7 +1432,7 @@ class CodeQualityAgent:
             "findings": [],
             "recommendations": [],
             "metrics": {
-                "lines_of_code": len(content.split('\n')),
+                "lines_of_code": content.count('\n') + 1,
                 "file_size": len(content)
             }
         }
@@ -483,77 +1449,103 @@ class CodeQualityAgent:
         
         return analysis
     
-    def _check_security_patterns(self, content: str) -> List[Dict[str, Any]]:
+    def _check_security_patterns(self, content: Union[str, bytes], line_index: Optional[LineIndex] = None,
+                                 spans: Optional[List[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
         """Check for security vulnerability patterns"""
         security_issues = []
+        line_index = line_index or LineIndex(content)
         
-        for vulnerability_type, patterns in self.config["security_patterns"].items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    line_num = content[:match.start()].count('\n') + 1
-                    security_issues.append({
-                        "type": "security_vulnerability",
-                        "vulnerability_type": vulnerability_type,
-                        "severity": "high",
-                        "message": f"Potential {vulnerability_type.replace('_', ' ')} vulnerability detected",
-                        "line": line_num,
-                        "pattern": pattern,
-                        "suggestion": self._get_security_suggestion(vulnerability_type)
-                    })
+        for vulnerability_type, pattern, line_num in self.security_scanner.scan(content, line_index, spans):
+            security_issues.append({
+                "type": "security_vulnerability",
+                "vulnerability_type": vulnerability_type,
+                "severity": "high",
+                "message": f"Potential {vulnerability_type.replace('_', ' ')} vulnerability detected",
+                "line": line_num,
+                "pattern": pattern,
+                "suggestion": self._get_security_suggestion(vulnerability_type)
+            })
         
         return security_issues
     
-    def _check_performance_patterns(self, content: str) -> List[Dict[str, Any]]:
+    def _check_performance_patterns(self, content: Union[str, bytes], line_index: Optional[LineIndex] = None,
+                                    spans: Optional[List[Tuple[int, int]]] = None) -> List[Dict[str, Any]]:
         """Check for performance anti-patterns"""
         performance_issues = []
+        line_index = line_index or LineIndex(content)
         
-        for issue_type, patterns in self.config["performance_patterns"].items():
-            for pattern in patterns:
-                matches = re.finditer(pattern, content, re.IGNORECASE)
-                for match in matches:
-                    line_num = content[:match.start()].count('\n') + 1
-                    performance_issues.append({
-                        "type": "performance_issue",
-                        "issue_type": issue_type,
-                        "severity": "medium",
-                        "message": f"Potential {issue_type.replace('_', ' ')} detected",
-                        "line": line_num,
-                        "pattern": pattern,
-                        "suggestion": self._get_performance_suggestion(issue_type)
-                    })
+        for issue_type, pattern, line_num in self.performance_scanner.scan(content, line_index, spans):
+            performance_issues.append({
+                "type": "performance_issue",
+                "issue_type": issue_type,
+                "severity": "medium",
+                "message": f"Potential {issue_type.replace('_', ' ')} detected",
+                "line": line_num,
+                "pattern": pattern,
+                "suggestion": self._get_performance_suggestion(issue_type)
+            })
         
         return performance_issues
     
-    def _check_style_issues(self, content: str, file_path: str) -> List[Dict[str, Any]]:
-        """Check for code style issues"""
-        style_issues = []
-        
-        lines = content.split('\n')
-        for line_num, line in enumerate(lines, 1):
-            # Check line length
-            if len(line) > self.config["quality_thresholds"]["line_length_threshold"]:
-                style_issues.append({
+    @staticmethod
+    def _pattern_scan_overran(file_analysis: Dict[str, Any]) -> bool:
+        """Whether a pattern scan was cut short; such results are not cached, as it may finish next time"""
+        return any(issue_type == "pattern_budget_exceeded" for (issue_type,) in file_analysis["findings"].fields("type"))
+    
+    def _pattern_overrun_findings(self, scanner: PatternScanner) -> List[Dict[str, Any]]:
+        """Report patterns whose last scan by scanner ran out of time budget, so results may be incomplete"""
+        return [{
+            "type": "pattern_budget_exceeded",
+            "pattern_type": name,
+            "severity": "low",
+            "message": f"Pattern scan for {name.replace('_', ' ')} exceeded its time budget; matches may be missing",
+            "line": 1,
+            "pattern": pattern,
+            "suggestion": "Simplify the pattern or raise pattern_limits.time_budget_ms"
+        } for name, pattern in scanner.overruns]
+    
+    def _check_style_issues(self, content: Union[str, bytes], file_path: str,
+                            line_ranges: Optional[List[Tuple[int, int]]] = None,
+                            line_index: Optional[LineIndex] = None) -> List[Dict[str, Any]]:
+        """Check for code style issues, optionally only within the given line ranges"""
+        # content may also be the bytes of a plain file (SourceFile.is_plain); regexes find
+        # the offending lines, so clean lines are never copied out
+        line_index = line_index or LineIndex(content)
+        long_line = rf'^[^\n]{{{self.config["quality_thresholds"]["line_length_threshold"] + 1},}}'
+        binary = not isinstance(content, str)
+        long_line = re.compile(long_line.encode() if binary else long_line, re.MULTILINE)
+        trailing_whitespace = TRAILING_WHITESPACE_BYTES if binary else TRAILING_WHITESPACE
+        if line_ranges is None:
+            spans = [(0, len(content))]
+        else:
+            spans = [line_index.span_of_lines(start, end) for start, end in line_ranges]
+        
+        # (line, check order, issue), sorted so each line reports length before whitespace
+        found = []
+        for start, end in spans:
+            for match in long_line.finditer(content, start, end):
+                line_num = line_index.line_of(match.start())
+                found.append((line_num, 0, {
                     "type": "style_issue",
                     "style_type": "line_too_long",
                     "severity": "low",
-                    "message": f"Line too long ({len(line)} characters)",
+                    "message": f"Line too long ({match.end() - match.start()} characters)",
                     "line": line_num,
                     "suggestion": "Break long lines for better readability"
-                })
-            
-            # Check for trailing whitespace
-            if line.rstrip() != line:
-                style_issues.append({
+                }))
+            for match in trailing_whitespace.finditer(content, start, end):
+                line_num = line_index.line_of(match.start())
+                found.append((line_num, 1, {
                     "type": "style_issue",
                     "style_type": "trailing_whitespace",
                     "severity": "low",
                     "message": "Trailing whitespace detected",
                     "line": line_num,
                     "suggestion": "Remove trailing whitespace"
-                })
+                }))
+        found.sort(key=lambda item: item[:2])
         
-        return style_issues
+        return [issue for _, _, issue in found]
     
     def _get_security_suggestion(self, vulnerability_type: str) -> str:
         """Get security remediation suggestions"""
@@ -579,8 +1571,8 @@ class CodeQualityAgent:
         base_score = 100.0
         
         # Deduct points for issues
-        for finding in file_analysis["findings"]:
-            severity = finding.get("severity", "low")
+        for (severity,) in file_analysis["findings"].fields("severity"):
+            severity = severity or "low"
             if severity == "critical":
                 base_score -= 20
             elif severity == "high":
@@ -590,32 +1582,17 @@ class CodeQualityAgent:
             elif severity == "low":
                 base_score -= 1
         
-        # Deduct points for security issues
-        for issue in file_analysis["security_issues"]:
-            base_score -= 15  # Security issues are serious
-        
-        # Deduct points for performance issues
-        for issue in file_analysis["performance_issues"]:
-            base_score -= 5
-        
-        # Deduct points for style issues
-        for issue in file_analysis["style_issues"]:
-            base_score -= 1
+        # Deduct points for security (serious), performance and style issues
+        base_score -= 15 * len(file_analysis["security_issues"])
+        base_score -= 5 * len(file_analysis["performance_issues"])
+        base_score -= len(file_analysis["style_issues"])
         
         return max(0, base_score)
     
-    def _calculate_security_rating(self, analysis_results: Dict[str, Any]) -> str:
+    def _calculate_security_rating(self, aggregator: AnalysisAggregator) -> str:
         """Calculate overall security rating"""
-        total_security_issues = 0
-        critical_security_issues = 0
-        
-        for file_analysis in analysis_results["file_analyses"].values():
-            security_issues = file_analysis.get("security_issues", [])
-            total_security_issues += len(security_issues)
-            
-            for issue in security_issues:
-                if issue.get("severity") in ["critical", "high"]:
-                    critical_security_issues += 1
+        total_security_issues = aggregator.security_issues
+        critical_security_issues = aggregator.critical_security_issues
         
         if critical_security_issues > 0:
             return "critical"
@@ -626,7 +1603,8 @@ class CodeQualityAgent:
         else:
             return "low"
     
-    def _assess_framework_compliance(self, analysis_results: Dict[str, Any]) -> Dict[str, Any]:
+    def _assess_framework_compliance(self, analysis_results: Dict[str, Any],
+                                     aggregator: AnalysisAggregator) -> Dict[str, Any]:
         """Assess compliance with Framework v3.7 standards"""
         compliance = {
             "overall_score": 0,
@@ -635,43 +1613,38 @@ class CodeQualityAgent:
         }
         
         # Count framework compliance issues
-        framework_issues = []
-        for file_analysis in analysis_results["file_analyses"].values():
-            for finding in file_analysis.get("findings", []):
-                if finding.get("type") == "framework_compliance":
-                    framework_issues.append(finding)
+        compliance_violations = aggregator.framework_violations
         
         # Calculate compliance score
-        total_files = len(analysis_results["file_analyses"])
-        if total_files > 0:
-            compliance_violations = len(framework_issues)
+        if aggregator.total_files > 0:
             compliance["overall_score"] = max(0, 100 - (compliance_violations * 10))
         
-        compliance["violations"] = framework_issues
+        if aggregator.keep_violations:
+            compliance["violations"] = [
+                violation for file_analysis in analysis_results["file_analyses"].values()
+                for violation in file_analysis["findings"].where("type", "framework_compliance")
+            ]
+        else:
+            # Streamed per-file records already carry each violation
+            del compliance["violations"]
+            compliance["violation_count"] = compliance_violations
         return compliance
     
-    def _generate_summary(self, analysis_results: Dict[str, Any]) -> Dict[str, Any]:
+    def _generate_summary(self, analysis_results: Dict[str, Any], aggregator: AnalysisAggregator) -> Dict[str, Any]:
         """Generate analysis summary"""
-        total_findings = len(analysis_results["findings"])
-        total_files = len(analysis_results["file_analyses"])
-        
         summary = {
-            "total_files_analyzed": total_files,
-            "total_findings": total_findings,
+            "total_files_analyzed": aggregator.total_files,
+            "total_findings": aggregator.total_findings,
             "average_quality_score": analysis_results["overall_score"],
             "security_rating": analysis_results["security_rating"],
             "framework_compliance_score": analysis_results["framework_compliance"]["overall_score"],
-            "findings_by_severity": {
-                "critical": len([f for f in analysis_results["findings"] if f.get("severity") == "critical"]),
-                "high": len([f for f in analysis_results["findings"] if f.get("severity") == "high"]),
-                "medium": len([f for f in analysis_results["findings"] if f.get("severity") == "medium"]),
-                "low": len([f for f in analysis_results["findings"] if f.get("severity") == "low"])
-            }
+            "findings_by_severity": dict(aggregator.findings_by_severity)
         }
         
         return summary
     
-    def _generate_ai_insights(self, analysis_results: Dict[str, Any], project_context: str) -> Dict[str, Any]:
+    def _generate_ai_insights(self, analysis_results: Dict[str, Any], aggregator: AnalysisAggregator,
+                              project_context: str) -> Dict[str, Any]:
         """Generate AI-powered insights and recommendations"""
         insights = {
             "code_patterns": [],
@@ -680,33 +1653,23 @@ class CodeQualityAgent:
             "maintenance_recommendations": []
         }
         
-        # Analyze patterns in findings
-        findings_by_type = {}
-        for finding in analysis_results["findings"]:
-            finding_type = finding.get("type", "unknown")
-            if finding_type not in findings_by_type:
-                findings_by_type[finding_type] = []
-            findings_by_type[finding_type].append(finding)
-        
-        # Generate insights based on patterns
-        for finding_type, findings in findings_by_type.items():
-            if len(findings) > 2:  # Pattern threshold
+        # Generate insights based on patterns in findings
+        for finding_type, type_totals in aggregator.findings_by_type.items():
+            if type_totals["count"] > 2:  # Pattern threshold
                 insights["code_patterns"].append({
                     "pattern": finding_type,
-                    "frequency": len(findings),
+                    "frequency": type_totals["count"],
                     "recommendation": f"Consider addressing {finding_type} systematically across the codebase"
                 })
         
         # Prioritize improvements based on severity and frequency
-        severity_weights = {"critical": 4, "high": 3, "medium": 2, "low": 1}
         improvement_priorities = []
         
-        for finding_type, findings in findings_by_type.items():
-            weight = sum(severity_weights.get(f.get("severity", "low"), 1) for f in findings)
+        for finding_type, type_totals in aggregator.findings_by_type.items():
             improvement_priorities.append({
                 "issue_type": finding_type,
-                "priority_score": weight,
-                "count": len(findings)
+                "priority_score": type_totals["priority_score"],
+                "count": type_totals["count"]
             })
         
         improvement_priorities.sort(key=lambda x: x["priority_score"], reverse=True)
@@ -728,10 +1691,12 @@ class CodeQualityAgent:
         """Save analysis results to file"""
         try:
             # Ensure output directory exists
-            os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
+            output_dir = os.path.dirname(self.output_path)
+            if output_dir:
+                os.makedirs(output_dir, exist_ok=True)
             
             with open(self.output_path, 'w') as f:
-                json.dump(analysis_results, f, indent=2)
+                json.dump(analysis_results, f, indent=2, default=report_json_default)
             
             logger.info(f"Analysis results saved to {self.output_path}")
             
@@ -740,16 +1705,95 @@ class CodeQualityAgent:
             raise
 
 
+# Per-process agent used by the analysis worker pool
+_worker_agent: Optional[CodeQualityAgent] = None
+
+
+def _init_analysis_worker(agent: CodeQualityAgent) -> None:
+    """Install the parent's agent in a freshly started worker process"""
+    global _worker_agent
+    _worker_agent = agent
+    # Under fork the worker starts with a copy of the parent's timings
+    _worker_agent.performance.reset()
+
+
+def _analyze_files_in_worker(tasks: List[Tuple[str, Optional[List[Tuple[int, int]]]]]
+                             ) -> List[Tuple[Dict[str, Any], Dict[str, Any]]]:
+    """Analyze a chunk of files inside a worker process, returning each result with its drained counters"""
+    results = []
+    for file_path, line_ranges in tasks:
+        file_analysis = _worker_agent._analyze_single_file(file_path, line_ranges)
+        results.append((file_analysis, _worker_agent._drain_worker_counters()))
+    return results
+
+
+def format_results(analysis_results: Dict[str, Any], output_format: str) -> str:
+    """Render analysis results as GitHub Actions annotations or a summary"""
+    lines = []
+    if output_format == "github-annotations":
+        # Output GitHub Actions annotations format
+        for finding in analysis_results["findings"]:
+            severity_map = {"critical": "error", "high": "error", "medium": "warning", "low": "notice"}
+            annotation_type = severity_map.get(finding.get("severity", "low"), "notice")
+            
+            file_path = finding.get("file_path", "unknown")
+            line = finding.get("line", 1)
+            message = finding.get("message", "Code quality issue")
+            
+            lines.append(f"::{annotation_type} file={file_path},line={line}::{message}")
+    else:
+        # Standard JSON output summary
+        lines.append(f"🤖 Code Quality Analysis Complete:")
+        lines.append(f"   Overall Score: {analysis_results['overall_score']:.1f}/100")
+        lines.append(f"   Security Rating: {analysis_results['security_rating']}")
+        lines.append(f"   Framework Compliance: {analysis_results['framework_compliance']['overall_score']:.1f}%")
+        lines.append(f"   Total Findings: {analysis_results['summary']['total_findings']}")
+        if analysis_results["cache"]["enabled"]:
+            lines.append(f"   Cache: {analysis_results['cache']['hits']} hits, "
+                         f"{analysis_results['cache']['misses']} misses")
+        
+        # Show top priority improvements
+        if analysis_results["ai_insights"]["improvement_priorities"]:
+            lines.append(f"   Top Priorities:")
+            for priority in analysis_results["ai_insights"]["improvement_priorities"][:3]:
+                lines.append(f"   - {priority['issue_type']}: {priority['count']} issues")
+    
+    return "\n".join(lines)
+
+
 def main():
     """Main entry point for the code quality agent"""
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     parser = argparse.ArgumentParser(description="AI Code Quality Agent")
     parser.add_argument("--changed-files", help="Comma-separated list of files to analyze")
     parser.add_argument("--analyze-all", action="store_true", help="Analyze all source files in project")
+    parser.add_argument("--base-ref", help="Git ref to diff against; limits style and pattern scans to changed hunks "
+                                           "(analyzes every changed file when --changed-files is omitted)")
+    parser.add_argument("--include", help="Comma-separated file globs to analyze with --analyze-all")
+    parser.add_argument("--exclude", help="Comma-separated path globs to skip with --analyze-all")
     parser.add_argument("--project-context", help="Project context for AI analysis")
-    parser.add_argument("--output-format", choices=["json", "github-annotations"], default="json",
-                       help="Output format for results")
+    parser.add_argument("--output-format", choices=["json", "jsonl", "github-annotations"], default="json",
+                       help="Output format for results (jsonl streams one record per file to --output)")
     parser.add_argument("--config", help="Path to agent configuration YAML file")
     parser.add_argument("--output", help="Path to save analysis results")
+    parser.add_argument("--jobs", "-j", type=int,
+                       help="Number of worker processes for file analysis (default: CPU count; 1 with --daemon)")
+    parser.add_argument("--cache-path", help="Path to the persistent analysis result cache")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the persistent analysis result cache")
+    parser.add_argument("--metrics-file",
+                       help="Also write stage timings as an OpenMetrics text file (e.g. for a node exporter)")
+    parser.add_argument("--deadline", type=float,
+                       help="Seconds the run may take before external tools still running are killed "
+                            "(default: external_tools.deadline_seconds)")
+    parser.add_argument("--daemon", action="store_true",
+                       help="Run as a resident analysis daemon on --socket, keeping results warm between requests")
+    parser.add_argument("--socket", default=DEFAULT_DAEMON_SOCKET,
+                       help=f"Unix socket of the analysis daemon (default: {DEFAULT_DAEMON_SOCKET})")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
     
     args = parser.parse_args()
@@ -757,70 +1801,79 @@ def main():
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
+    def configure(agent: CodeQualityAgent) -> None:
+        """Apply command-line overrides to a freshly built agent"""
+        if args.output:
+            agent.output_path = args.output
+        if args.no_cache:
+            agent.result_cache = None
+        elif args.cache_path and agent.result_cache:
+            agent.result_cache.path = args.cache_path
+    
     try:
+        if args.daemon:
+            # Small warm requests would spend longer starting a worker pool than analyzing
+            AnalysisDaemon(CodeQualityAgent, format_results, args.config, configure, jobs=args.jobs or 1,
+                           project_context=DEFAULT_PROJECT_CONTEXT).serve(args.socket)
+            return 0
+        
+        jobs = args.jobs or os.cpu_count() or 1
+        
         # Initialize agent
         agent = CodeQualityAgent(config_path=args.config)
-        if args.output:
-            agent.output_path = args.output
+        configure(agent)
+        agent.start_run_deadline(args.deadline)
         
         # Determine files to analyze
-        files_to_analyze = []
-        
-        if args.changed_files:
-            files_to_analyze = [f.strip() for f in args.changed_files.split(',') if f.strip()]
+        discovery = agent.config.setdefault("discovery", {})
+        if args.include:
+            discovery["include"] = [p.strip() for p in args.include.split(',') if p.strip()]
+        if args.exclude:
+            discovery["exclude"] = discovery.get("exclude", DEFAULT_EXCLUDE_GLOBS) + [
+                p.strip() for p in args.exclude.split(',') if p.strip()
+            ]
+        
+        changed_lines = None
+        if args.changed_files or args.base_ref:
+            files_to_analyze = []
+            if args.changed_files:
+                files_to_analyze = [f.strip() for f in args.changed_files.split(',') if f.strip()]
+            if args.base_ref:
+                # Diff-aware mode: scan only the hunks changed since the base ref
+                changed_lines = agent.collect_changed_line_ranges(args.base_ref, files_to_analyze or None)
+                if not files_to_analyze:
+                    files_to_analyze = list(changed_lines)
+            if not files_to_analyze:
+                logger.warning("No files to analyze")
+                return 0
         elif args.analyze_all:
-            # Find all source files
-            source_extensions = ['.py', '.js', '.ts', '.go', '.java', '.cpp', '.rs']
-            for ext in source_extensions:
-                try:
-                    result = subprocess.run([
-                        'find', '.', '-name', f'*{ext}', '-type', 'f'
-                    ], capture_output=True, text=True, timeout=30)
-                    
-                    if result.stdout:
-                        files_to_analyze.extend(result.stdout.strip().split('\n'))
-                except subprocess.TimeoutExpired:
-                    logger.warning(f"Timeout finding {ext} files")
+            # Discover all source files in one pass; paths are consumed lazily
+            files_to_analyze = agent.discover_source_files(".")
         else:
-            logger.error("Must specify either --changed-files or --analyze-all")
+            logger.error("Must specify --changed-files, --base-ref or --analyze-all")
             return 1
         
-        if not files_to_analyze:
-            logger.warning("No files to analyze")
-            return 0
-        
         # Analyze files
-        project_context = args.project_context or "AI Agent Development Framework v3.7 project"
-        analysis_results = agent.analyze_files(files_to_analyze, project_context)
-        
-        # Save results
-        agent.save_results(analysis_results)
-        
-        # Output results based on format
-        if args.output_format == "github-annotations":
-            # Output GitHub Actions annotations format
-            for finding in analysis_results["findings"]:
-                severity_map = {"critical": "error", "high": "error", "medium": "warning", "low": "notice"}
-                annotation_type = severity_map.get(finding.get("severity", "low"), "notice")
-                
-                file_path = finding.get("file_path", "unknown")
-                line = finding.get("line", 1)
-                message = finding.get("message", "Code quality issue")
-                
-                print(f"::{annotation_type} file={file_path},line={line}::{message}")
+        project_context = args.project_context or DEFAULT_PROJECT_CONTEXT
+        if args.output_format == "jsonl":
+            # Stream per-file records; memory stays flat regardless of repository size
+            analysis_results = agent.analyze_files_streaming(
+                files_to_analyze, project_context, jobs=jobs, changed_lines=changed_lines
+            )
         else:
-            # Standard JSON output summary
-            print(f"🤖 Code Quality Analysis Complete:")
-            print(f"   Overall Score: {analysis_results['overall_score']:.1f}/100")
-            print(f"   Security Rating: {analysis_results['security_rating']}")
-            print(f"   Framework Compliance: {analysis_results['framework_compliance']['overall_score']:.1f}%")
-            print(f"   Total Findings: {len(analysis_results['findings'])}")
+            analysis_results = agent.analyze_files(
+                files_to_analyze, project_context, jobs=jobs, changed_lines=changed_lines
+            )
             
-            # Show top priority improvements
-            if analysis_results["ai_insights"]["improvement_priorities"]:
-                print(f"   Top Priorities:")
-                for priority in analysis_results["ai_insights"]["improvement_priorities"][:3]:
-                    print(f"   - {priority['issue_type']}: {priority['count']} issues")
+            # Save results
+            agent.save_results(analysis_results)
+        
+        if args.metrics_file:
+            agent.performance.write_openmetrics(args.metrics_file, "code_quality")
+        
+        report = format_results(analysis_results, args.output_format)
+        if report:
+            print(report)
         
         return 0
         
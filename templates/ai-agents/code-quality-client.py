@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Code Quality Client
+AI Agent Development Framework v3.7
+
+Sends --changed-files to `code-quality-agent.py --daemon` over its Unix
+socket and prints the report it renders. Imports nothing beyond the standard
+library so pre-commit hooks and editors pay only interpreter startup; when
+no daemon is listening, the full agent is run in-process with the same
+arguments instead.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+DEFAULT_DAEMON_SOCKET = ".ai-agent-cache/code-quality.sock"
+AGENT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "code-quality-agent.py")
+
+
+def request_daemon(socket_path: str, request: dict, connect_timeout: float = 1.0) -> dict:
+    """Send one request to a running analysis daemon; raises OSError when none is listening"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(connect_timeout)
+        client.connect(socket_path)
+        client.settimeout(None)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        with client.makefile('rb') as response:
+            line = response.readline()
+    if not line:
+        raise ConnectionError(f"daemon at {socket_path} closed the connection without a response")
+    return json.loads(line)
+
+
+def main():
+    """Main entry point for the code quality client"""
+    parser = argparse.ArgumentParser(description="AI Code Quality Agent daemon client")
+    parser.add_argument("--changed-files", required=True, help="Comma-separated list of files to analyze")
+    parser.add_argument("--output-format", choices=["json", "github-annotations"], default="json",
+                       help="Output format for results")
+    parser.add_argument("--project-context", help="Project context for AI analysis")
+    parser.add_argument("--socket", default=DEFAULT_DAEMON_SOCKET,
+                       help=f"Unix socket of the analysis daemon (default: {DEFAULT_DAEMON_SOCKET})")
+    
+    args = parser.parse_args()
+    
+    # The daemon resolves paths independently of our working directory
+    files_to_analyze = [os.path.abspath(f.strip()) for f in args.changed_files.split(',') if f.strip()]
+    try:
+        response = request_daemon(args.socket, {
+            "op": "analyze",
+            "files": files_to_analyze,
+            "format": args.output_format,
+            "project_context": args.project_context
+        })
+    except OSError as e:
+        print(f"Analysis daemon unavailable ({e}), analyzing in-process", file=sys.stderr)
+        os.execv(sys.executable, [sys.executable, AGENT_PATH] + sys.argv[1:])
+    
+    if "error" in response:
+        print(f"Analysis daemon failed: {response['error']}", file=sys.stderr)
+        return 1
+    
+    if response["output"]:
+        print(response["output"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
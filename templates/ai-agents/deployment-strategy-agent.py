@@ -10,22 +10,107 @@ select the optimal deployment strategy (blue-green, canary, or rolling).
 import json
 import sys
 import argparse
-import subprocess
 import logging
+import re
+import bisect
+import functools
+import time
+from itertools import accumulate
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
-import numpy as np
+from typing import Dict, List, Any, Optional, Set, Tuple, Callable
 from pathlib import Path
 import os
-import yaml
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+from agent_common import PerformanceRecorder, SubprocessExecutor, load_config_document
+from deployment_history import DeploymentHistoryStore
+from risk_model import RiskModel
+from strategy_backtest import run_backtest
+
+# yaml and http.server are imported where used (asyncio and subprocess by the
+# executor), keeping them off the startup path of commands that never need them
+
 logger = logging.getLogger(__name__)
 
+# Minimum (possibly decayed) number of deployments before history adjusts a strategy
+MIN_HISTORY_SAMPLES = 3
+
+DEPLOYMENT_STRATEGIES = ["rolling", "canary", "blue-green"]
+
+
+def timed_stage(name: str):
+    """Decorator timing every call of an agent method as stage name of its performance recorder"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with self.performance.stage(name):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class ChangeClassifier:
+    """Classifies changed paths into change categories with matchers compiled once from config"""
+    
+    def __init__(self, categories: List[Dict[str, Any]], indicator_keywords: Dict[str, List[str]]):
+        self.categories = categories
+        # Suffixes are matched case-sensitively; keyword regexes run once over the lower-cased,
+        # newline-joined path list, and categories earlier in the configuration win
+        self._suffixes = [tuple(category.get("suffixes", [])) for category in categories]
+        self._keyword_patterns = [self._keyword_regex(category.get("keywords", [])) for category in categories]
+        self._indicator_patterns = {
+            indicator: self._keyword_regex(keywords) for indicator, keywords in indicator_keywords.items()
+        }
+    
+    @staticmethod
+    def _keyword_regex(keywords: List[str]) -> Optional["re.Pattern"]:
+        """Compile keywords into one alternation matched against lower-cased paths"""
+        if not keywords:
+            return None
+        return re.compile('|'.join(re.escape(keyword.lower()) for keyword in keywords))
+    
+    @staticmethod
+    def _lines_matching(pattern: "re.Pattern", text: str, line_starts: List[int]) -> Set[int]:
+        """Return the indices of newline-separated lines in text that contain a match"""
+        return {bisect.bisect_right(line_starts, match.start()) - 1 for match in pattern.finditer(text)}
+    
+    def classify(self, paths: List[str]) -> List[Tuple[Optional[int], List[str]]]:
+        """Return (category index or None, risk indicators) for each path, in input order"""
+        # Case folding can change string length; such paths are matched one by one
+        lowered_paths = [path.lower() for path in paths]
+        aligned = [lowered if len(lowered) == len(path) else "" for path, lowered in zip(paths, lowered_paths)]
+        unaligned = [i for i, lowered in enumerate(aligned) if not lowered and paths[i]]
+        lowered_text = '\n'.join(aligned)
+        line_starts = list(accumulate((len(lowered) + 1 for lowered in aligned[:-1]), initial=0))
+        
+        def keyword_lines(pattern: Optional["re.Pattern"]) -> Set[int]:
+            if pattern is None:
+                return set()
+            lines = self._lines_matching(pattern, lowered_text, line_starts)
+            lines.update(i for i in unaligned if pattern.search(lowered_paths[i]))
+            return lines
+        
+        # Set algebra per category; lower-priority categories are assigned first
+        # so that earlier categories overwrite them (first match wins)
+        categories = [None] * len(paths)
+        for index in reversed(range(len(self.categories))):
+            suffixes = self._suffixes[index]
+            suffix_hits = {i for i, path in enumerate(paths) if path.endswith(suffixes)} if suffixes else set()
+            keyword_hits = keyword_lines(self._keyword_patterns[index])
+            if suffixes and self._keyword_patterns[index] and self.categories[index].get("match", "any") == "all":
+                matched = suffix_hits & keyword_hits
+            else:
+                matched = suffix_hits | keyword_hits
+            for i in matched:
+                categories[i] = index
+        
+        indicators = [[] for _ in paths]
+        for indicator, pattern in self._indicator_patterns.items():
+            for i in sorted(keyword_lines(pattern)):
+                indicators[i].append(indicator)
+        
+        return list(zip(categories, indicators))
+
+
 class DeploymentStrategyAgent:
     """AI agent for intelligent deployment strategy selection"""
     
@@ -34,7 +119,20 @@ class DeploymentStrategyAgent:
         self.framework_version = "v3.7"
         self.historical_data_path = self.config.get("historical_data_path", "data/deployment-history.json")
         self.output_path = self.config.get("output_path", "deployment-decision.json")
+        self.history_store = DeploymentHistoryStore(
+            self.config["history_store"]["path"], self.config["history_store"]["counter_half_life_days"]
+        )
+        self._risk_model = None
+        self._risk_model_key = None
+        self.performance = PerformanceRecorder()
+        self.subprocesses = SubprocessExecutor(self.config.get("subprocesses", {}).get("max_concurrency", 4))
+        self.classifier = ChangeClassifier(self.config["change_categories"], self.config["risk_indicator_keywords"])
         
+    def use_history_store(self, path: str) -> None:
+        """Switch to the history store at path, closing the current one"""
+        self.history_store.close()
+        self.history_store = DeploymentHistoryStore(path, self.config["history_store"]["counter_half_life_days"])
+    
     def _load_config(self, config_path: Optional[str]) -> Dict[str, Any]:
         """Load configuration from file or use defaults"""
         default_config = {
@@ -58,18 +156,93 @@ class DeploymentStrategyAgent:
                 "database_migration": "blue-green",
                 "infrastructure_major": "blue-green",
                 "security_patch": "canary"
+            },
+            # Tried in order, first match wins; weight is a strategy_weights key or a number
+            "change_categories": [
+                {
+                    "component": "application",
+                    "change_type": "code",
+                    "suffixes": [".py", ".js", ".go", ".java", ".cpp", ".rs"],
+                    "weight": "code_changes"
+                },
+                {
+                    "component": "infrastructure",
+                    "change_type": "infrastructure",
+                    "risk_factor": "infrastructure_change",
+                    "suffixes": [".tf", ".yaml", ".yml"],
+                    "keywords": ["terraform", "k8s", "kubernetes", "helm"],
+                    "match": "all",
+                    "weight": "infrastructure_changes"
+                },
+                {
+                    "component": "database",
+                    "change_type": "database",
+                    "risk_factor": "database_migration",
+                    "suffixes": [".sql", ".migration"],
+                    "keywords": ["migration"],
+                    "match": "any",
+                    "weight": "database_changes"
+                },
+                {
+                    "component": "dependencies",
+                    "change_type": "dependencies",
+                    "risk_factor": "dependency_change",
+                    "keywords": ["requirements", "package.json", "go.mod", "cargo.toml", "dockerfile"],
+                    "weight": "dependency_changes"
+                },
+                {
+                    "component": "configuration",
+                    "change_type": "configuration",
+                    "risk_factor": "config_change",
+                    "suffixes": [".conf", ".ini", ".env", ".properties"],
+                    "weight": 1.5
+                }
+            ],
+            "risk_indicator_keywords": {
+                "security_related": ["auth", "security", "login", "permission", "admin"],
+                "business_critical": ["payment", "billing", "transaction", "order"]
+            },
+            # The legacy JSON history (historical_data_path) is imported here when it changes
+            "history_store": {
+                "path": "data/deployment-history.db",
+                # Success rates come from each environment's last recent_limit deployments
+                "recent_limit": 20,
+                # Opt-in: read all-time success rates (per risk factor where there are
+                # enough samples) from the store's outcome counters instead
+                "outcome_counters": False,
+                # Half-life weighing recent outcomes more in the counters; None weighs all equally
+                "counter_half_life_days": None
+            },
+            # Learned success model; refitted when the history store changes
+            "risk_model": {
+                "enabled": True,
+                "path": "data/deployment-risk-model.json",
+                "min_samples": 50,
+                "min_success_probability": 0.7,
+                "l2_penalty": 1.0,
+                "max_iterations": 25
+            },
+            # git runs in the background, overlapping with change classification
+            "subprocesses": {
+                "max_concurrency": 4
             }
         }
         
         if config_path and os.path.exists(config_path):
-            with open(config_path, 'r') as f:
-                config = yaml.safe_load(f)
-                # Merge with defaults
-                default_config.update(config)
+            config = load_config_document(config_path)
+            # Sections added after the original format are merged key by key, so a
+            # config that sets only some of their keys keeps the remaining defaults
+            for section in ("history_store", "risk_model", "subprocesses"):
+                if isinstance(config.get(section), dict):
+                    config[section] = {**default_config[section], **config[section]}
+            # Merge with defaults
+            default_config.update(config)
         
         return default_config
     
-    def analyze_changes(self, changed_files: List[str]) -> Dict[str, Any]:
+    @timed_stage("analyze_changes")
+    def analyze_changes(self, changed_files: List[str], diff_range: str = "HEAD~1",
+                        diff_stats: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
         """Analyze code changes to determine deployment risk and strategy"""
         logger.info(f"Analyzing {len(changed_files)} changed files")
         
@@ -78,112 +251,129 @@ class DeploymentStrategyAgent:
             "risk_factors": [],
             "affected_components": [],
             "change_types": [],
-            "file_analysis": []
+            "file_analysis": [],
+            "category_summary": {}
         }
         
         weights = self.config["strategy_weights"]
+        categories = self.config["change_categories"]
+        
+        # Ordered sets keep the output deterministic
+        risk_factors = {}
+        affected_components = {}
+        change_types = {}
+        category_summary = {
+            category["component"]: {"count": 0, "score": 0.0} for category in categories
+        }
+        
+        # One git call provides the line counts for every file and the totals, running while paths are classified;
+        # diff_stats ({path: {"added", "removed"}}) replaces it when passed in
+        pending_stats = self._submit_diff_stats(diff_range) if diff_stats is None else None
         
-        # Analyze each file
-        for file in changed_files:
-            file_analysis = self._analyze_single_file(file)
-            analysis["file_analysis"].append(file_analysis)
+        # Classify all paths in bulk, then accumulate in a single pass
+        classifications = self.classifier.classify(changed_files)
+        if pending_stats is not None:
+            diff_stats = self._collect_diff_stats(diff_range, pending_stats)
+        for file, (category_index, indicators) in zip(changed_files, classifications):
+            analysis["file_analysis"].append(self._analyze_single_file(file, diff_stats, indicators))
+            if category_index is None:
+                continue
             
-            # Application code changes
-            if file.endswith(('.py', '.js', '.go', '.java', '.cpp', '.rs')):
-                analysis["change_score"] += weights["code_changes"]
-                analysis["affected_components"].append("application")
-                analysis["change_types"].append("code")
-                
-            # Infrastructure changes
-            elif file.endswith(('.tf', '.yaml', '.yml')) and any(
-                keyword in file.lower() for keyword in ['terraform', 'k8s', 'kubernetes', 'helm']
-            ):
-                analysis["change_score"] += weights["infrastructure_changes"]
-                analysis["affected_components"].append("infrastructure")
-                analysis["change_types"].append("infrastructure")
-                analysis["risk_factors"].append("infrastructure_change")
-                
-            # Database changes
-            elif file.endswith(('.sql', '.migration')) or 'migration' in file.lower():
-                analysis["change_score"] += weights["database_changes"]
-                analysis["affected_components"].append("database")
-                analysis["change_types"].append("database")
-                analysis["risk_factors"].append("database_migration")
-                
-            # Dependency changes
-            elif any(dep_file in file.lower() for dep_file in [
-                'requirements', 'package.json', 'go.mod', 'cargo.toml', 'dockerfile'
-            ]):
-                analysis["change_score"] += weights["dependency_changes"]
-                analysis["affected_components"].append("dependencies")
-                analysis["change_types"].append("dependencies")
-                analysis["risk_factors"].append("dependency_change")
-                
-            # Configuration changes
-            elif file.endswith(('.conf', '.ini', '.env', '.properties')):
-                analysis["change_score"] += 1.5
-                analysis["affected_components"].append("configuration")
-                analysis["change_types"].append("configuration")
-                analysis["risk_factors"].append("config_change")
+            category = categories[category_index]
+            score = self._resolve_weight(category.get("weight", 0), weights)
+            
+            analysis["change_score"] += score
+            category_summary[category["component"]]["count"] += 1
+            category_summary[category["component"]]["score"] += score
+            affected_components[category["component"]] = None
+            change_types[category.get("change_type", category["component"])] = None
+            if category.get("risk_factor"):
+                risk_factors[category["risk_factor"]] = None
         
         # Analyze change magnitude using git stats
-        analysis.update(self._analyze_change_magnitude())
+        analysis.update(self._analyze_change_magnitude(diff_stats))
         
-        # Deduplicate lists
-        analysis["affected_components"] = list(set(analysis["affected_components"]))
-        analysis["change_types"] = list(set(analysis["change_types"]))
-        analysis["risk_factors"] = list(set(analysis["risk_factors"]))
+        analysis["affected_components"] = list(affected_components)
+        analysis["change_types"] = list(change_types)
+        analysis["risk_factors"] = list(risk_factors)
+        analysis["category_summary"] = category_summary
         
         logger.info(f"Change analysis complete. Risk score: {analysis['change_score']}")
         return analysis
     
-    def _analyze_single_file(self, file_path: str) -> Dict[str, Any]:
+    def _submit_diff_stats(self, diff_range: str = "HEAD~1"):
+        """Start the `git diff --numstat -z` for diff_range; returns a Future for _collect_diff_stats"""
+        return self.subprocesses.submit("git", ["git", "diff", "--numstat", "-z", diff_range], timeout=15)
+    
+    @timed_stage("git_diff")
+    def _collect_diff_stats(self, diff_range: str = "HEAD~1", pending=None) -> Optional[Dict[str, Dict[str, int]]]:
+        """Collect per-file added/removed line counts with a single `git diff --numstat -z`"""
+        # pending is the Future of an earlier _submit_diff_stats(diff_range); without it git runs now
+        try:
+            diff_stats = (pending or self._submit_diff_stats(diff_range)).result()
+        except Exception as e:
+            logger.warning(f"Could not collect git diff statistics: {e}")
+            return None
+        finally:
+            self.subprocesses.record_timings(self.performance, "subprocess")
+        
+        if diff_stats.returncode != 0:
+            logger.warning(f"Could not collect git diff statistics: {diff_stats.stderr.strip()}")
+            return None
+        
+        # Records are "added\tremoved\tpath\0", or "added\tremoved\t\0old\0new\0" for renames;
+        # binary files report "-" for both counts
+        file_stats = {}
+        fields = diff_stats.stdout.split('\0')
+        i = 0
+        while i < len(fields):
+            parts = fields[i].split('\t')
+            i += 1
+            if len(parts) != 3:
+                continue
+            if parts[2]:
+                path = parts[2]
+            else:
+                path = fields[i + 1] if i + 1 < len(fields) else ""
+                i += 2
+            try:
+                added = int(parts[0]) if parts[0] != '-' else 0
+                removed = int(parts[1]) if parts[1] != '-' else 0
+            except ValueError:
+                continue
+            file_stats[os.path.normpath(path)] = {"added": added, "removed": removed}
+        
+        return file_stats
+    
+    def _analyze_single_file(self, file_path: str, diff_stats: Optional[Dict[str, Dict[str, int]]] = None,
+                             path_indicators: Optional[List[str]] = None) -> Dict[str, Any]:
         """Analyze a single file for specific risk patterns"""
         file_analysis = {
             "file": file_path,
             "risk_indicators": [],
             "complexity_score": 0
         }
+        if path_indicators is None:
+            path_indicators = self.classifier.classify([file_path])[0][1]
         
-        try:
-            # Analyze git diff for this specific file
-            diff_result = subprocess.run([
-                "git", "diff", "--stat", "HEAD~1", "--", file_path
-            ], capture_output=True, text=True, timeout=10)
-            
-            if diff_result.stdout:
-                # Extract lines changed
-                for line in diff_result.stdout.split('\n'):
-                    if '|' in line and ('+' in line or '-' in line):
-                        parts = line.split('|')
-                        if len(parts) > 1:
-                            changes_part = parts[1].strip()
-                            change_count = changes_part.count('+') + changes_part.count('-')
-                            file_analysis["complexity_score"] = change_count
-                            
-                            # High complexity indicators
-                            if change_count > 50:
-                                file_analysis["risk_indicators"].append("high_complexity")
-                            elif change_count > 20:
-                                file_analysis["risk_indicators"].append("medium_complexity")
-            
-            # Check for critical file patterns
-            if any(critical in file_path.lower() for critical in [
-                'auth', 'security', 'login', 'permission', 'admin'
-            ]):
-                file_analysis["risk_indicators"].append("security_related")
-            
-            if any(critical in file_path.lower() for critical in [
-                'payment', 'billing', 'transaction', 'order'
-            ]):
-                file_analysis["risk_indicators"].append("business_critical")
-                
-        except Exception as e:
-            logger.warning(f"Could not analyze file {file_path}: {e}")
+        # Exact line counts from the shared numstat table
+        file_stats = diff_stats.get(file_path) or diff_stats.get(os.path.normpath(file_path)) if diff_stats else None
+        if file_stats:
+            change_count = file_stats["added"] + file_stats["removed"]
+            file_analysis["complexity_score"] = change_count
             
+            # High complexity indicators
+            if change_count > 50:
+                file_analysis["risk_indicators"].append("high_complexity")
+            elif change_count > 20:
+                file_analysis["risk_indicators"].append("medium_complexity")
+        
+        # Critical file patterns (security_related, business_critical) from the classifier
+        file_analysis["risk_indicators"].extend(path_indicators)
+        
         return file_analysis
     
-    def _analyze_change_magnitude(self) -> Dict[str, Any]:
+    def _analyze_change_magnitude(self, diff_stats: Optional[Dict[str, Dict[str, int]]] = None) -> Dict[str, Any]:
         """Analyze the magnitude of changes using git statistics"""
         magnitude_analysis = {
             "lines_added": 0,
@@ -192,59 +382,104 @@ class DeploymentStrategyAgent:
             "magnitude_multiplier": 1.0
         }
         
-        try:
-            # Get comprehensive diff statistics
-            diff_stats = subprocess.run([
-                "git", "diff", "--numstat", "HEAD~1"
-            ], capture_output=True, text=True, timeout=15)
-            
-            if diff_stats.stdout:
-                for line in diff_stats.stdout.strip().split('\n'):
-                    if line:
-                        parts = line.split('\t')
-                        if len(parts) >= 2:
-                            try:
-                                added = int(parts[0]) if parts[0] != '-' else 0
-                                removed = int(parts[1]) if parts[1] != '-' else 0
-                                magnitude_analysis["lines_added"] += added
-                                magnitude_analysis["lines_removed"] += removed
-                                magnitude_analysis["files_changed"] += 1
-                            except ValueError:
-                                continue
-                
-                # Calculate magnitude multiplier
-                total_changes = magnitude_analysis["lines_added"] + magnitude_analysis["lines_removed"]
-                if total_changes > 1000:
-                    magnitude_analysis["magnitude_multiplier"] = 2.0
-                elif total_changes > 500:
-                    magnitude_analysis["magnitude_multiplier"] = 1.5
-                elif total_changes > 100:
-                    magnitude_analysis["magnitude_multiplier"] = 1.2
-                    
-        except Exception as e:
-            logger.warning(f"Could not analyze change magnitude: {e}")
+        if not diff_stats:
+            return magnitude_analysis
+        
+        for file_stats in diff_stats.values():
+            magnitude_analysis["lines_added"] += file_stats["added"]
+            magnitude_analysis["lines_removed"] += file_stats["removed"]
+            magnitude_analysis["files_changed"] += 1
+        
+        # Calculate magnitude multiplier
+        total_changes = magnitude_analysis["lines_added"] + magnitude_analysis["lines_removed"]
+        if total_changes > 1000:
+            magnitude_analysis["magnitude_multiplier"] = 2.0
+        elif total_changes > 500:
+            magnitude_analysis["magnitude_multiplier"] = 1.5
+        elif total_changes > 100:
+            magnitude_analysis["magnitude_multiplier"] = 1.2
             
         return magnitude_analysis
     
+    @timed_stage("decide_batch")
+    def decide_batch(self, change_sets: List[Dict[str, Any]], environments: List[str]) -> Dict[str, Any]:
+        """Analyze each change set once and decide a deployment strategy for every environment"""
+        # A change set is {"files": [...]} with an optional "name" and either a "diff_range" (default HEAD~1)
+        # or explicit "line_counts" ({path: {"added", "removed"}}) for hypothetical changes.
+        # Every range's git diff starts up front, running while earlier change sets are analyzed
+        pending_by_range = {}
+        for change_set in change_sets:
+            if "line_counts" not in change_set:
+                diff_range = change_set.get("diff_range", "HEAD~1")
+                if diff_range not in pending_by_range:
+                    pending_by_range[diff_range] = self._submit_diff_stats(diff_range)
+        
+        stats_by_range = {}
+        results = []
+        for index, change_set in enumerate(change_sets):
+            if "line_counts" in change_set:
+                diff_stats = self._line_counts_table(change_set["line_counts"])
+            else:
+                diff_range = change_set.get("diff_range", "HEAD~1")
+                if diff_range not in stats_by_range:
+                    # An empty table marks a failed collection so it is not retried
+                    stats_by_range[diff_range] = (
+                        self._collect_diff_stats(diff_range, pending_by_range[diff_range]) or {}
+                    )
+                diff_stats = stats_by_range[diff_range]
+            
+            change_analysis = self.analyze_changes(change_set["files"], diff_stats=diff_stats)
+            decisions = {}
+            for environment in environments:
+                decision = self.predict_deployment_strategy(change_analysis, environment)
+                # The shared analysis is reported once per change set
+                decision.pop("change_analysis", None)
+                decisions[environment] = decision
+            
+            results.append({
+                "name": change_set.get("name", f"change-set-{index + 1}"),
+                "changed_files": change_set["files"],
+                "change_analysis": change_analysis,
+                "decisions": decisions
+            })
+        
+        return {
+            "framework_version": self.framework_version,
+            "timestamp": datetime.now().isoformat(),
+            "environments": environments,
+            "change_sets": results
+        }
+    
+    @staticmethod
+    def _line_counts_table(line_counts: Dict[str, Dict[str, int]]) -> Dict[str, Dict[str, int]]:
+        """Normalize caller-supplied {path: {"added", "removed"}} into a diff statistics table"""
+        return {
+            os.path.normpath(path): {"added": counts.get("added", 0), "removed": counts.get("removed", 0)}
+            for path, counts in line_counts.items()
+        }
+    
+    @timed_stage("predict_deployment_strategy")
     def predict_deployment_strategy(self, change_analysis: Dict, environment: str, 
                                   historical_data: Optional[List[Dict]] = None) -> Dict[str, Any]:
         """Predict the optimal deployment strategy based on analysis"""
         logger.info(f"Predicting deployment strategy for {environment} environment")
         
-        # Load historical data if not provided
+        # Success rates come from the history store unless history is passed in
         if historical_data is None:
-            historical_data = self._load_historical_data()
+            strategy_performance = self._load_strategy_performance(environment, change_analysis)
+        else:
+            strategy_performance = self._strategy_performance_from_records(historical_data, environment)
         
         # Apply environment risk multiplier
         env_multiplier = self.config["environment_risk_multiplier"].get(environment, 1.0)
-        adjusted_score = change_analysis["change_score"] * env_multiplier * change_analysis.get("magnitude_multiplier", 1.0)
+        adjusted_score = change_analysis["change_score"] * change_analysis.get("magnitude_multiplier", 1.0) * env_multiplier
         
         # Check for forced strategies based on change types
         forced_strategy = self._check_forced_strategies(change_analysis, environment)
         if forced_strategy:
             return self._create_strategy_response(
                 forced_strategy, adjusted_score, change_analysis, 
-                f"Forced strategy due to {forced_strategy} requirements"
+                f"Forced strategy due to {forced_strategy} requirements", environment
             )
         
         # Determine strategy based on risk score and thresholds
@@ -273,11 +508,19 @@ class DeploymentStrategyAgent:
                 strategy = "canary"
         
         # Consider historical success rates
-        strategy = self._adjust_for_historical_performance(
-            strategy, historical_data, environment, change_analysis
-        )
+        strategy = self._adjust_for_historical_performance(strategy, strategy_performance)
+        
+        # Let the learned risk model steer away from strategies it expects to fail
+        success_probabilities = None
+        if historical_data is None and self.config["risk_model"]["enabled"]:
+            success_probabilities = self._predict_success_probabilities(change_analysis, environment, adjusted_score)
+            if success_probabilities:
+                strategy = self._adjust_for_risk_model(strategy, success_probabilities)
         
-        return self._create_strategy_response(strategy, adjusted_score, change_analysis)
+        decision = self._create_strategy_response(strategy, adjusted_score, change_analysis, environment=environment)
+        if success_probabilities:
+            decision["success_probabilities"] = success_probabilities
+        return decision
     
     def _check_forced_strategies(self, change_analysis: Dict, environment: str) -> Optional[str]:
         """Check if any change patterns require a specific strategy"""
@@ -295,22 +538,14 @@ class DeploymentStrategyAgent:
         
         return None
     
-    def _adjust_for_historical_performance(self, strategy: str, historical_data: List[Dict], 
-                                         environment: str, change_analysis: Dict) -> str:
-        """Adjust strategy based on historical deployment performance"""
-        if not historical_data:
-            return strategy
-        
-        # Filter recent deployments for this environment
+    def _strategy_performance_from_records(self, historical_data: List[Dict], environment: str) -> Dict[str, Dict[str, float]]:
+        """Calculate success counts by strategy from raw deployment records"""
+        # Last N deployments for this environment, so other environments cannot crowd it out
         recent_deployments = [
-            d for d in historical_data[-20:]  # Last 20 deployments
+            d for d in historical_data
             if d.get("environment") == environment
-        ]
+        ][-self.config["history_store"]["recent_limit"]:]
         
-        if len(recent_deployments) < 3:
-            return strategy  # Not enough data
-        
-        # Calculate success rates by strategy
         strategy_performance = {}
         for deployment in recent_deployments:
             dep_strategy = deployment.get("strategy", "unknown")
@@ -321,6 +556,42 @@ class DeploymentStrategyAgent:
             if deployment.get("success", False):
                 strategy_performance[dep_strategy]["successes"] += 1
         
+        return strategy_performance
+    
+    @timed_stage("history_load")
+    def _load_strategy_performance(self, environment: str, change_analysis: Dict) -> Dict[str, Dict[str, float]]:
+        """Read success counts by strategy for the environment from the history store"""
+        try:
+            if os.path.exists(self.historical_data_path):
+                with self.performance.stage("history_import"):
+                    self.history_store.import_json(self.historical_data_path)
+            elif not os.path.exists(self.history_store.path):
+                return {}
+            
+            history_config = self.config["history_store"]
+            if not history_config["outcome_counters"]:
+                return self._strategy_performance_from_records(
+                    self.history_store.recent(environment, history_config["recent_limit"]), environment
+                )
+            
+            # All-time counters of the change's risk factors when they hold enough samples,
+            # otherwise the environment-wide ones
+            risk_factors = change_analysis.get("risk_factors", [])
+            if risk_factors:
+                strategy_performance = self.history_store.strategy_performance(environment, risk_factors)
+                if sum(perf["total"] for perf in strategy_performance.values()) >= MIN_HISTORY_SAMPLES:
+                    return strategy_performance
+            return self.history_store.strategy_performance(environment)
+        except Exception as e:
+            logger.warning(f"Could not load historical data: {e}")
+        
+        return {}
+    
+    def _adjust_for_historical_performance(self, strategy: str, strategy_performance: Dict[str, Dict[str, float]]) -> str:
+        """Adjust strategy based on historical deployment performance"""
+        if sum(perf["total"] for perf in strategy_performance.values()) < MIN_HISTORY_SAMPLES:
+            return strategy  # Not enough data
+        
         # If current strategy has low success rate, consider alternatives
         if strategy in strategy_performance:
             success_rate = (strategy_performance[strategy]["successes"] / 
@@ -343,8 +614,99 @@ class DeploymentStrategyAgent:
         
         return strategy
     
+    def _adjust_for_risk_model(self, strategy: str, success_probabilities: Dict[str, float]) -> str:
+        """Switch to the strategy the risk model rates best when the chosen one looks unlikely to succeed"""
+        # Strategies the model does not rate (history can name any strategy) are kept
+        if (strategy not in success_probabilities or
+                success_probabilities[strategy] >= self.config["risk_model"]["min_success_probability"]):
+            return strategy
+        
+        best_strategy = max(success_probabilities, key=success_probabilities.get)
+        if success_probabilities[best_strategy] > success_probabilities[strategy]:
+            logger.info(f"Adjusting strategy from {strategy} to {best_strategy} based on the risk model")
+            return best_strategy
+        return strategy
+    
+    @timed_stage("risk_model")
+    def _predict_success_probabilities(self, change_analysis: Dict, environment: str,
+                                       risk_score: float) -> Optional[Dict[str, float]]:
+        """Estimate the success probability of each strategy for this change, if a model is available"""
+        try:
+            model = self.load_risk_model()
+        except Exception as e:
+            logger.warning(f"Could not load risk model: {e}")
+            return None
+        if model is None:
+            return None
+        
+        files_changed = len(change_analysis.get("file_analysis", []))
+        lines_changed = change_analysis.get("lines_added", 0) + change_analysis.get("lines_removed", 0)
+        components = ','.join(change_analysis["affected_components"])
+        risk_factors = ','.join(change_analysis["risk_factors"])
+        candidates = [
+            (environment, strategy, None, risk_score, files_changed, lines_changed, components, risk_factors)
+            for strategy in DEPLOYMENT_STRATEGIES
+        ]
+        return {
+            strategy: round(float(probability), 4)
+            for strategy, probability in zip(DEPLOYMENT_STRATEGIES, model.predict(candidates))
+        }
+    
+    def load_risk_model(self, retrain: bool = False) -> Optional[RiskModel]:
+        """Return a risk model fitted on the current history, or None without enough history"""
+        if not retrain and not os.path.exists(self.history_store.path) and not os.path.exists(self.historical_data_path):
+            return None
+        if os.path.exists(self.historical_data_path):
+            self.history_store.import_json(self.historical_data_path)
+        
+        settings = self.config["risk_model"]
+        # Cached coefficients are refitted only when the history or the model settings change
+        cache_key = {
+            "history": os.path.abspath(self.history_store.path),
+            "revision": self.history_store.revision(),
+            "min_samples": settings["min_samples"],
+            "l2_penalty": settings["l2_penalty"],
+            "max_iterations": settings["max_iterations"]
+        }
+        if not retrain and self._risk_model_key == cache_key:
+            return self._risk_model
+        
+        model = RiskModel(
+            list(self.config["environment_risk_multiplier"]),
+            DEPLOYMENT_STRATEGIES,
+            [category["component"] for category in self.config["change_categories"]],
+            [category["risk_factor"] for category in self.config["change_categories"] if category.get("risk_factor")]
+        )
+        cached = None
+        if not retrain and os.path.exists(settings["path"]):
+            try:
+                with open(settings["path"], 'r') as f:
+                    cached = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable risk model cache: {e}")
+        
+        if not (cached and cached.get("key") == cache_key and model.load_dict(cached.get("model", {}))):
+            start_time = time.time()
+            rows = self.history_store.model_rows()
+            if model.fit(rows, settings["l2_penalty"], settings["max_iterations"], settings["min_samples"]):
+                logger.info(f"Trained risk model on {len(rows)} deployments in {time.time() - start_time:.2f}s")
+            
+            # Write atomically so concurrent runs never read a partial file
+            model_dir = os.path.dirname(settings["path"])
+            if model_dir:
+                os.makedirs(model_dir, exist_ok=True)
+            temp_path = f"{settings['path']}.{os.getpid()}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump({"key": cache_key, "model": model.to_dict()}, f)
+            os.replace(temp_path, settings["path"])
+        
+        self._risk_model = model if model.coefficients is not None else None
+        self._risk_model_key = cache_key
+        return self._risk_model
+    
     def _create_strategy_response(self, strategy: str, risk_score: float, 
-                                change_analysis: Dict, custom_reasoning: str = None) -> Dict[str, Any]:
+                                change_analysis: Dict, custom_reasoning: str = None,
+                                environment: Optional[str] = None) -> Dict[str, Any]:
         """Create a comprehensive strategy response"""
         
         # Determine risk level
@@ -367,6 +729,7 @@ class DeploymentStrategyAgent:
         
         return {
             "strategy": strategy,
+            "environment": environment,
             "risk_level": risk_level,
             "risk_score": risk_score,
             "confidence": confidence,
@@ -491,16 +854,43 @@ class DeploymentStrategyAgent:
         # Average confidence factors
         return sum(confidence_factors) / len(confidence_factors)
     
-    def _load_historical_data(self) -> List[Dict]:
-        """Load historical deployment data"""
-        try:
-            if os.path.exists(self.historical_data_path):
-                with open(self.historical_data_path, 'r') as f:
-                    return json.load(f)
-        except Exception as e:
-            logger.warning(f"Could not load historical data: {e}")
+    @timed_stage("backtest")
+    def backtest(self, grid: Dict[str, List[Any]]) -> Dict[str, Any]:
+        """Replay the deployment history through the strategy policy for every config in a grid"""
+        return run_backtest(self, grid, DEPLOYMENT_STRATEGIES)
+    
+    @staticmethod
+    def _resolve_weight(weight: Any, strategy_weights: Dict[str, float]) -> float:
+        """Resolve a category weight given as a strategy_weights key or a number"""
+        return strategy_weights.get(weight, 0) if isinstance(weight, str) else weight
+    
+    @timed_stage("record_outcome")
+    def record_outcome(self, decision: Dict[str, Any], success: bool,
+                       environment: Optional[str] = None) -> int:
+        """Append the outcome of a deployment made from a decision to the history store"""
+        record = {
+            "timestamp": datetime.now().isoformat(),
+            "environment": environment or decision.get("environment"),
+            "strategy": decision["strategy"],
+            "success": success,
+            "risk_level": decision.get("risk_level"),
+            "risk_score": decision.get("risk_score"),
+            "decision_timestamp": decision.get("timestamp"),
+            "decision_factors": decision.get("decision_factors", {})
+        }
+        # Per-category counts let backtests re-score the change under other weights
+        change_analysis = decision.get("change_analysis", {})
+        if "category_summary" in change_analysis:
+            record["category_counts"] = {
+                component: summary["count"] for component, summary in change_analysis["category_summary"].items()
+            }
+            record["magnitude_multiplier"] = change_analysis.get("magnitude_multiplier", 1.0)
+        if not record["environment"]:
+            raise ValueError("Deployment outcome has no environment")
         
-        return []
+        row_id = self.history_store.record_outcome(record)
+        logger.info(f"Recorded {'successful' if success else 'failed'} {record['strategy']} deployment to {record['environment']}")
+        return row_id
     
     def save_decision(self, decision: Dict[str, Any]) -> None:
         """Save the deployment decision to file"""
@@ -518,30 +908,303 @@ class DeploymentStrategyAgent:
             raise
 
 
+class DecisionService:
+    """Long-running decision endpoint over HTTP on a TCP port or a Unix socket"""
+    
+    def __init__(self, config_path: Optional[str],
+                 configure: Optional[Callable[["DeploymentStrategyAgent"], None]] = None):
+        self.config_path = config_path
+        self.configure = configure
+        # Kept warm between requests (config, classifier, history store connection, risk model)
+        self.agent = None
+        self.config_mtime = None
+        self.loaded_at = None
+        self.requests_served = 0
+        self._reload_if_changed()
+    
+    def _reload_if_changed(self) -> None:
+        """(Re)build the agent when the config file changed; keep the old one if the new config fails"""
+        try:
+            mtime = os.stat(self.config_path).st_mtime if self.config_path else None
+        except OSError:
+            mtime = None
+        if self.agent is not None and mtime == self.config_mtime:
+            return
+        
+        agent = None
+        try:
+            agent = DeploymentStrategyAgent(config_path=self.config_path)
+            if self.configure:
+                self.configure(agent)
+        except Exception as e:
+            if agent is not None:
+                agent.history_store.close()
+                agent.subprocesses.close()
+            if self.agent is None:
+                raise
+            logger.error(f"Config reload failed, keeping the previous configuration: {e}")
+            self.config_mtime = mtime
+            return
+        
+        if self.agent is not None:
+            self.agent.history_store.close()
+            self.agent.subprocesses.close()
+            logger.info(f"Reloaded configuration from {self.config_path}")
+        self.agent = agent
+        self.config_mtime = mtime
+        self.loaded_at = datetime.now().isoformat()
+    
+    def _diff_stats(self, request: Dict[str, Any]) -> Dict[str, Dict[str, int]]:
+        """Line counts for a request: supplied, from git for a diff_range, or none"""
+        if "line_counts" in request:
+            return self.agent._line_counts_table(request["line_counts"])
+        if "diff_range" in request:
+            return self.agent._collect_diff_stats(request["diff_range"]) or {}
+        # The service's working directory need not be the repository being deployed
+        return {}
+    
+    def handle(self, method: str, path: str, payload: Dict[str, Any]) -> Tuple[int, Dict[str, Any]]:
+        """Dispatch one request; returns (HTTP status, response document)"""
+        self._reload_if_changed()
+        self.requests_served += 1
+        agent = self.agent
+        try:
+            if method == "GET" and path == "/health":
+                return 200, {
+                    "status": "ok",
+                    "framework_version": agent.framework_version,
+                    "config_path": self.config_path,
+                    "config_loaded_at": self.loaded_at,
+                    "requests_served": self.requests_served,
+                    "history_revision": agent.history_store.revision(),
+                    "performance": agent.performance.report()
+                }
+            
+            if method == "POST" and path == "/decide":
+                change_analysis = agent.analyze_changes(payload["changed_files"], diff_stats=self._diff_stats(payload))
+                return 200, agent.predict_deployment_strategy(change_analysis, payload["environment"])
+            
+            if method == "POST" and path == "/batch":
+                change_sets = [
+                    dict(change_set, line_counts=self._diff_stats(change_set))
+                    for change_set in payload["change_sets"]
+                ]
+                return 200, agent.decide_batch(change_sets, payload["environments"])
+            
+            if method == "POST" and path == "/outcome":
+                row_id = agent.record_outcome(payload["decision"], bool(payload["success"]), payload.get("environment"))
+                return 200, {"recorded": row_id}
+        except (KeyError, TypeError, ValueError) as e:
+            return 400, {"error": f"Invalid request: {e!r}"}
+        except Exception as e:
+            logger.error(f"Request {method} {path} failed: {e}")
+            return 500, {"error": str(e)}
+        
+        return 404, {"error": f"Unknown endpoint: {method} {path}"}
+    
+    def serve(self, host: str = "127.0.0.1", port: int = 8080, socket_path: Optional[str] = None) -> None:
+        """Serve requests until interrupted"""
+        import socketserver
+        from http.server import HTTPServer, BaseHTTPRequestHandler
+        
+        service = self
+        
+        # Requests are served one at a time, keeping the SQLite connection on a single thread
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            
+            def do_GET(self):
+                self._respond(*service.handle("GET", self.path, {}))
+            
+            def do_POST(self):
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError as e:
+                    self._respond(400, {"error": f"Invalid JSON body: {e}"})
+                    return
+                self._respond(*service.handle("POST", self.path, payload))
+            
+            def address_string(self):
+                # Unix socket peers have no address
+                return self.client_address[0] if self.client_address else "unix"
+            
+            def log_message(self, format, *args):
+                logger.debug(f"{self.address_string()} {format % args}")
+        
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            server = socketserver.UnixStreamServer(socket_path, Handler)
+            logger.info(f"Deployment decision service listening on unix:{socket_path}")
+        else:
+            server = HTTPServer((host, port), Handler)
+            logger.info(f"Deployment decision service listening on http://{host}:{server.server_address[1]}")
+        
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if socket_path and os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+
 def main():
     """Main entry point for the deployment strategy agent"""
+    # Configure logging
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
     parser = argparse.ArgumentParser(description="AI Deployment Strategy Agent")
-    parser.add_argument("--analyze-changes", required=True, help="Comma-separated list of changed files")
-    parser.add_argument("--environment", required=True, choices=["dev", "staging", "prod"], 
+    parser.add_argument("--analyze-changes", help="Comma-separated list of changed files")
+    parser.add_argument("--environment", choices=["dev", "staging", "prod"], 
                        help="Target deployment environment")
+    parser.add_argument("--environments",
+                       help="Comma-separated environments to decide for in one run (batch mode)")
+    parser.add_argument("--what-if", metavar="CHANGE_SETS_FILE",
+                       help="YAML/JSON list of change sets ({name, files, diff_range | line_counts}) "
+                            "to decide for in one run (batch mode)")
     parser.add_argument("--historical-data", help="Path to historical deployment data JSON file")
+    parser.add_argument("--history-db", help="Path to the SQLite deployment history store")
+    parser.add_argument("--import-history", metavar="JSON_FILE",
+                       help="Import a JSON deployment history file into the history store and exit")
+    parser.add_argument("--record-outcome", metavar="DECISION_JSON",
+                       help="Record the outcome of a deployment made from a saved decision and exit")
+    parser.add_argument("--outcome", choices=["success", "failure"], help="Deployment outcome for --record-outcome")
+    parser.add_argument("--train-risk-model", action="store_true",
+                       help="Fit the risk model on the deployment history and exit")
+    parser.add_argument("--backtest", metavar="GRID_FILE",
+                       help="YAML/JSON mapping of 'section.key' to candidate values; replay history for each combination and exit")
+    parser.add_argument("--backtest-report", default="backtest-report.json", help="Path to save the backtest report JSON")
+    parser.add_argument("--metrics-file",
+                       help="Also write stage timings as an OpenMetrics text file (e.g. for a node exporter)")
+    parser.add_argument("--serve", action="store_true",
+                       help="Run as a resident decision service (HTTP on --host/--port, or --socket)")
+    parser.add_argument("--host", default="127.0.0.1", help="Service bind address for --serve")
+    parser.add_argument("--port", type=int, default=8080, help="Service port for --serve")
+    parser.add_argument("--socket", help="Unix socket path for --serve instead of a TCP port")
     parser.add_argument("--output-decision", help="Path to save deployment decision JSON")
     parser.add_argument("--config", help="Path to agent configuration YAML file")
     parser.add_argument("--framework-version", default="v3.7", help="Framework version")
     parser.add_argument("--verbose", "-v", action="store_true", help="Enable verbose logging")
     
     args = parser.parse_args()
+    if args.record_outcome and not args.outcome:
+        parser.error("--record-outcome requires --outcome")
+    batch_mode = bool(args.environments or args.what_if)
+    if batch_mode:
+        environments = [e.strip() for e in (args.environments or args.environment or "").split(',') if e.strip()]
+        unknown = [e for e in environments if e not in ("dev", "staging", "prod")]
+        if not environments or unknown:
+            parser.error("batch mode needs --environments (or --environment) from dev, staging, prod")
+        if not (args.what_if or args.analyze_changes):
+            parser.error("batch mode needs --what-if or --analyze-changes")
+    elif (not (args.import_history or args.record_outcome or args.train_risk_model or args.backtest or args.serve) and
+            not (args.analyze_changes and args.environment)):
+        parser.error("--analyze-changes and --environment are required unless --import-history, "
+                     "--record-outcome, --train-risk-model, --backtest, --serve or batch mode is given")
     
     if args.verbose:
         logging.getLogger().setLevel(logging.DEBUG)
     
-    try:
-        # Initialize agent
-        agent = DeploymentStrategyAgent(config_path=args.config)
+    def configure(agent: DeploymentStrategyAgent) -> None:
+        """Apply command-line overrides to a freshly built agent"""
         if args.historical_data:
             agent.historical_data_path = args.historical_data
         if args.output_decision:
             agent.output_path = args.output_decision
+        if args.history_db:
+            agent.use_history_store(args.history_db)
+    
+    try:
+        if args.serve:
+            DecisionService(args.config, configure).serve(args.host, args.port, args.socket)
+            return 0
+        
+        # Initialize agent
+        agent = DeploymentStrategyAgent(config_path=args.config)
+        configure(agent)
+        
+        if args.record_outcome:
+            with open(args.record_outcome, 'r') as f:
+                decision = json.load(f)
+            agent.record_outcome(decision, args.outcome == "success", args.environment)
+            print(f"📝 Recorded {args.outcome} for {decision['strategy']} deployment in {agent.history_store.path}")
+            return 0
+        
+        if args.import_history:
+            imported = agent.history_store.import_json(args.import_history, force=True)
+            print(f"📥 Imported {imported} deployment records into {agent.history_store.path}")
+            return 0
+        
+        if args.backtest:
+            import yaml
+            with open(args.backtest, 'r') as f:
+                grid = yaml.safe_load(f) or {}
+            if os.path.exists(agent.historical_data_path):
+                agent.history_store.import_json(agent.historical_data_path)
+            
+            start_time = time.time()
+            report = agent.backtest(grid)
+            report["elapsed_seconds"] = round(time.time() - start_time, 3)
+            report["performance"] = agent.performance.report()
+            if args.metrics_file:
+                agent.performance.write_openmetrics(args.metrics_file, "deployment_strategy")
+            with open(args.backtest_report, 'w') as f:
+                json.dump(report, f, indent=2)
+            
+            print(f"📊 Backtested {report['configs_evaluated']} configs over {report['records']} deployments "
+                  f"in {report['elapsed_seconds']}s")
+            if report["configs"]:
+                best = report["best"]
+                print(f"   Best: {best['overrides']} (match rate {best['match_rate']:.2%}, "
+                      f"failure repeat rate {best['failure_repeat_rate']:.2%})")
+            print(f"   Report: {args.backtest_report}")
+            return 0
+        
+        if args.train_risk_model:
+            model = agent.load_risk_model(retrain=True)
+            if model is None:
+                print("⚠️  Not enough deployment history to train a risk model")
+            else:
+                print(f"🧠 Risk model trained on {model.samples} deployments, saved to {agent.config['risk_model']['path']}")
+            return 0
+        
+        if batch_mode:
+            if args.what_if:
+                import yaml
+                with open(args.what_if, 'r') as f:
+                    change_sets = yaml.safe_load(f) or []
+            else:
+                change_sets = [{
+                    "name": "current",
+                    "files": [f.strip() for f in args.analyze_changes.split(',') if f.strip()]
+                }]
+            
+            batch = agent.decide_batch(change_sets, environments)
+            batch["performance"] = agent.performance.report()
+            agent.save_decision(batch)
+            if args.metrics_file:
+                agent.performance.write_openmetrics(args.metrics_file, "deployment_strategy")
+            
+            print("🤖 AI Deployment Strategy Decisions:")
+            for result in batch["change_sets"]:
+                print(f"   {result['name']} ({len(result['changed_files'])} files, "
+                      f"change score {result['change_analysis']['change_score']}):")
+                for environment, decision in result["decisions"].items():
+                    print(f"   - {environment}: {decision['strategy']} "
+                          f"(risk {decision['risk_level']}, confidence {decision['confidence']:.2f})")
+            return 0
         
         # Parse changed files
         changed_files = [f.strip() for f in args.analyze_changes.split(',') if f.strip()]
@@ -553,7 +1216,10 @@ def main():
         decision = agent.predict_deployment_strategy(change_analysis, args.environment)
         
         # Save decision
+        decision["performance"] = agent.performance.report()
         agent.save_decision(decision)
+        if args.metrics_file:
+            agent.performance.write_openmetrics(args.metrics_file, "deployment_strategy")
         
         # Print summary
         print(f"🤖 AI Deployment Strategy Decision:")
@@ -0,0 +1,333 @@
+"""
+Deployment History
+AI Agent Development Framework v3.7
+
+SQLite-backed deployment history for the deployment strategy agent, with
+decayed per-environment outcome counters kept up to date on every write.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DeploymentHistoryStore:
+    """Deployment history kept in embedded SQLite, indexed for per-environment recency lookups"""
+    
+    # Each row keeps the original JSON record next to the indexed columns; timestamps
+    # are stored in one ISO format so the (environment, timestamp) index sorts by time.
+    # Rows imported from a legacy JSON file are tagged with it as their source, so a
+    # re-import replaces them. Per-(environment, risk factor, strategy) counters are
+    # updated in the same transaction as every write; risk factor "" holds the totals.
+    
+    # Derived from the JSON record; added to (and backfilled in) older stores on open
+    _FEATURE_COLUMNS = (
+        ("risk_score", "REAL"), ("files_changed", "INTEGER"), ("lines_changed", "INTEGER"),
+        ("components", "TEXT"), ("risk_factors", "TEXT"), ("category_counts", "TEXT"),
+        ("magnitude_multiplier", "REAL")
+    )
+    _COLUMNS = ("source, timestamp, environment, strategy, component, success, " +
+                ", ".join(name for name, _ in _FEATURE_COLUMNS) + ", record")
+    _INSERT_SQL = f"INSERT INTO deployments ({_COLUMNS}) VALUES ({', '.join('?' * (len(_FEATURE_COLUMNS) + 7))})"
+    
+    def __init__(self, path: str, half_life_days: Optional[float] = None):
+        self.path = path
+        self.half_life_days = half_life_days
+        self._conn = None
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the history database, creating the schema on first use"""
+        if self._conn is None:
+            store_dir = os.path.dirname(self.path)
+            if store_dir:
+                os.makedirs(store_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS deployments ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT, timestamp TEXT NOT NULL, "
+                "environment TEXT, strategy TEXT, component TEXT, success INTEGER NOT NULL, "
+                "record TEXT NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_deployments_env_time ON deployments (environment, timestamp)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_deployments_strategy_component ON deployments (strategy, component)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS imports ("
+                "source TEXT PRIMARY KEY, mtime REAL NOT NULL, size INTEGER NOT NULL, records INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS outcome_counters ("
+                "environment TEXT NOT NULL, risk_factor TEXT NOT NULL, strategy TEXT NOT NULL, "
+                "successes REAL NOT NULL, total REAL NOT NULL, updated_at REAL NOT NULL, "
+                "PRIMARY KEY (environment, risk_factor, strategy))"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+            # Outcomes must survive a crash once record_outcome returns
+            conn.execute("PRAGMA synchronous=FULL")
+            self._conn = conn
+            
+            # Feature columns missing from older stores are added and backfilled once
+            if self._missing_columns():
+                with self._transaction():
+                    # Re-checked under the write lock in case another process migrated first
+                    for name, kind in self._missing_columns():
+                        conn.execute(f"ALTER TABLE deployments ADD COLUMN {name} {kind}")
+                    assignments = ", ".join(f"{name} = ?" for name, _ in self._FEATURE_COLUMNS)
+                    conn.executemany(
+                        f"UPDATE deployments SET {assignments} WHERE id = ?",
+                        [self._row(json.loads(record), None)[6:-1] + (row_id,)
+                         for row_id, record in conn.execute("SELECT id, record FROM deployments")]
+                    )
+            
+            # Counters decayed with a different half-life are not comparable; rebuild them
+            half_life = json.dumps(self.half_life_days)
+            row = conn.execute("SELECT value FROM meta WHERE key = 'counter_half_life_days'").fetchone()
+            if row is None or row[0] != half_life:
+                with self._transaction():
+                    self._rebuild_counters()
+                    conn.execute(
+                        "INSERT OR REPLACE INTO meta (key, value) VALUES ('counter_half_life_days', ?)",
+                        (half_life,)
+                    )
+        return self._conn
+    
+    def _missing_columns(self) -> List[Tuple[str, str]]:
+        """Return the feature columns the deployments table does not have yet"""
+        columns = {row[1] for row in self._connect().execute("PRAGMA table_info(deployments)")}
+        return [(name, kind) for name, kind in self._FEATURE_COLUMNS if name not in columns]
+    
+    @contextmanager
+    def _transaction(self):
+        """Run a block in a write transaction, taking the write lock up front"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+    
+    @classmethod
+    def _row(cls, record: Dict[str, Any], source: Optional[str]) -> Tuple:
+        """Extract the column values (in _COLUMNS order) from a history record"""
+        factors = record.get("decision_factors") or {}
+        category_counts = record.get("category_counts")
+        components = factors.get("affected_components") or []
+        component = record.get("component")
+        if component is None:
+            component = components[0] if components else None
+        elif not components:
+            components = [component]
+        return (
+            source,
+            cls._sortable_timestamp(record.get("timestamp", "")),
+            record.get("environment"),
+            record.get("strategy"),
+            component,
+            1 if record.get("success", False) else 0,
+            record.get("risk_score"),
+            factors.get("files_changed"),
+            factors.get("lines_changed"),
+            ','.join(components),
+            ','.join(cls._risk_factors(record)[1:]),
+            json.dumps(category_counts, sort_keys=True) if category_counts is not None else None,
+            record.get("magnitude_multiplier"),
+            json.dumps(record)
+        )
+    
+    def import_json(self, json_path: str, force: bool = False) -> int:
+        """Import a legacy JSON history file unless unchanged (or force); returns the records imported"""
+        stat = os.stat(json_path)
+        source = os.path.abspath(json_path)
+        conn = self._connect()
+        
+        previous = conn.execute("SELECT mtime, size FROM imports WHERE source = ?", (source,)).fetchone()
+        if previous is not None and not force and previous == (stat.st_mtime, stat.st_size):
+            return 0
+        
+        with open(json_path, 'r') as f:
+            records = json.load(f)
+        
+        with self._transaction():
+            conn.execute("DELETE FROM deployments WHERE source = ?", (source,))
+            conn.executemany(
+                self._INSERT_SQL, (self._row(record, source) for record in records if isinstance(record, dict))
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO imports (source, mtime, size, records) VALUES (?, ?, ?, ?)",
+                (source, stat.st_mtime, stat.st_size, len(records))
+            )
+            self._rebuild_counters()
+            self._bump_revision()
+        
+        logger.info(f"Imported {len(records)} deployment records from {json_path}")
+        return len(records)
+    
+    def record_outcome(self, record: Dict[str, Any]) -> int:
+        """Append a deployment outcome and update its counters atomically; returns the row id"""
+        record.setdefault("timestamp", datetime.now().isoformat())
+        with self._transaction() as conn:
+            cursor = conn.execute(self._INSERT_SQL, self._row(record, None))
+            for key, (successes, total, updated_at) in self._apply_outcomes(
+                self._load_counters(record.get("environment"), self._risk_factors(record)),
+                [record]
+            ).items():
+                conn.execute(
+                    "INSERT OR REPLACE INTO outcome_counters "
+                    "(environment, risk_factor, strategy, successes, total, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    key + (successes, total, updated_at)
+                )
+            self._bump_revision()
+        return cursor.lastrowid
+    
+    def _bump_revision(self) -> None:
+        """Mark the history as changed (caller holds the transaction)"""
+        self._connect().execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('revision', ?)", (str(self.revision() + 1),)
+        )
+    
+    def revision(self) -> int:
+        """Return a number that changes whenever deployments are added or replaced"""
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'revision'").fetchone()
+        return int(row[0]) if row else 0
+    
+    def model_rows(self) -> List[Tuple]:
+        """Return the risk model's input rows for every deployment, in insertion order"""
+        return self._connect().execute(
+            "SELECT environment, strategy, success, COALESCE(risk_score, 0), COALESCE(files_changed, 0), "
+            "COALESCE(lines_changed, 0), COALESCE(components, ''), COALESCE(risk_factors, '') "
+            "FROM deployments ORDER BY id"
+        ).fetchall()
+    
+    @staticmethod
+    def _risk_factors(record: Dict[str, Any]) -> List[str]:
+        """Return the risk factors a record counts towards, including the "" total"""
+        factors = record.get("risk_factors")
+        if factors is None:
+            factors = record.get("decision_factors", {}).get("risk_factors") or []
+        return [""] + [factor for factor in factors if factor]
+    
+    @staticmethod
+    def _sortable_timestamp(timestamp: Any) -> str:
+        """Normalize an ISO timestamp to local time with microseconds, so text order is time order"""
+        try:
+            parsed = datetime.fromisoformat(str(timestamp))
+        except ValueError:
+            return str(timestamp)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone().replace(tzinfo=None)
+        return parsed.isoformat(timespec="microseconds")
+    
+    @staticmethod
+    def _timestamp_seconds(timestamp: Any, default: float) -> float:
+        """Convert an ISO timestamp to epoch seconds, falling back to default"""
+        try:
+            return datetime.fromisoformat(str(timestamp)).timestamp()
+        except ValueError:
+            return default
+    
+    def _decay(self, age_seconds: float) -> float:
+        """Weight of an observation age_seconds old"""
+        if not self.half_life_days or age_seconds <= 0:
+            return 1.0
+        return 0.5 ** (age_seconds / (self.half_life_days * 86400))
+    
+    def _load_counters(self, environment: Optional[str], risk_factors: List[str]) -> Dict[Tuple, List[float]]:
+        """Fetch the stored counters for an environment and set of risk factors"""
+        placeholders = ','.join('?' * len(risk_factors))
+        rows = self._connect().execute(
+            "SELECT environment, risk_factor, strategy, successes, total, updated_at FROM outcome_counters "
+            f"WHERE environment = ? AND risk_factor IN ({placeholders})",
+            [environment or ""] + risk_factors
+        )
+        return {row[:3]: list(row[3:]) for row in rows}
+    
+    def _apply_outcomes(self, counters: Dict[Tuple, List[float]],
+                        records: Iterable[Dict[str, Any]]) -> Dict[Tuple, List[float]]:
+        """Fold outcome records into [successes, total, updated_at] counters, in any order"""
+        now = time.time()
+        touched = {}
+        for record in records:
+            event_time = self._timestamp_seconds(record.get("timestamp"), now)
+            success = 1.0 if record.get("success", False) else 0.0
+            for factor in self._risk_factors(record):
+                key = (record.get("environment") or "", factor, record.get("strategy") or "unknown")
+                counter = counters.setdefault(key, [0.0, 0.0, event_time])
+                # A newer observation decays the stored counts; an older one is added decayed
+                if event_time >= counter[2]:
+                    weight = self._decay(event_time - counter[2])
+                    counter[0] = counter[0] * weight + success
+                    counter[1] = counter[1] * weight + 1.0
+                    counter[2] = event_time
+                else:
+                    weight = self._decay(counter[2] - event_time)
+                    counter[0] += success * weight
+                    counter[1] += weight
+                touched[key] = counter
+        return touched
+    
+    def _rebuild_counters(self) -> None:
+        """Recompute all counters from the stored deployments (caller holds the transaction)"""
+        conn = self._connect()
+        counters = self._apply_outcomes({}, (
+            {"timestamp": timestamp, "environment": environment, "strategy": strategy,
+             "success": success, "risk_factors": risk_factors.split(',') if risk_factors else []}
+            for timestamp, environment, strategy, success, risk_factors in conn.execute(
+                "SELECT timestamp, environment, strategy, success, risk_factors FROM deployments"
+            )
+        ))
+        conn.execute("DELETE FROM outcome_counters")
+        conn.executemany(
+            "INSERT INTO outcome_counters "
+            "(environment, risk_factor, strategy, successes, total, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key + tuple(counter) for key, counter in counters.items())
+        )
+    
+    def recent(self, environment: str, limit: int) -> List[Dict[str, Any]]:
+        """Return the last limit deployments to environment, oldest first"""
+        rows = self._connect().execute(
+            "SELECT record FROM deployments WHERE environment = ? ORDER BY timestamp DESC, id DESC LIMIT ?",
+            (environment, limit)
+        ).fetchall()
+        return [json.loads(row[0]) for row in reversed(rows)]
+    
+    def strategy_performance(self, environment: str, risk_factors: Optional[List[str]] = None) -> Dict[str, Dict[str, float]]:
+        """Return decayed {strategy: {"successes", "total"}}, summed over risk_factors if given"""
+        factors = [factor for factor in (risk_factors or []) if factor] or [""]
+        now = time.time()
+        performance = {}
+        for (_, _, strategy), (successes, total, updated_at) in self._load_counters(environment, factors).items():
+            weight = self._decay(now - updated_at)
+            entry = performance.setdefault(strategy, {"successes": 0.0, "total": 0.0})
+            entry["successes"] += successes * weight
+            entry["total"] += total * weight
+        return performance
+    
+    def backtest_rows(self) -> List[Tuple]:
+        """Return the fields a policy backtest replays for every deployment, in insertion order"""
+        return self._connect().execute(
+            "SELECT environment, strategy, success, COALESCE(risk_score, 0), COALESCE(components, ''), "
+            "COALESCE(risk_factors, ''), category_counts, magnitude_multiplier FROM deployments ORDER BY id"
+        ).fetchall()
+    
+    def count(self) -> int:
+        """Return the number of stored deployments"""
+        return self._connect().execute("SELECT COUNT(*) FROM deployments").fetchone()[0]
+    
+    def close(self) -> None:
+        """Close the database connection"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,381 @@
+"""
+Duplicate Index
+AI Agent Development Framework v3.7
+
+Persistent fingerprint index behind the code quality agent's cross-file
+duplicate detection.
+"""
+
+import bisect
+import hashlib
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import zlib
+from array import array
+from collections import deque
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from agent_common import RACY_WINDOW_NS
+
+logger = logging.getLogger(__name__)
+
+# Duplicate detection normalizes source bytes before hashing lines: comments and
+# intra-line whitespace are dropped, string literals emptied and digits folded to 0
+HASH_COMMENT_SUFFIXES = {".py", ".rb", ".sh", ".pl", ".r", ".yaml", ".yml", ".toml"}
+STRING_LITERAL = re.compile(rb'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'')
+HASH_COMMENT = re.compile(rb'#[^\n]*')
+C_STYLE_LITERALS = re.compile(
+    rb'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|`(?:\\.|[^`\\])*`|//[^\n]*|/\*.*?\*/', re.S
+)
+NORMALIZE_BYTES = bytes.maketrans(b"123456789", b"000000000")
+INLINE_WHITESPACE = b" \t\r\f\v"
+SIGNIFICANT_LINE = re.compile(rb'\w')
+# Rolling polynomial hash over per-line CRC32s, modulo a Mersenne prime
+FINGERPRINT_BASE = 1000003
+FINGERPRINT_MODULUS = (1 << 61) - 1
+
+
+class DuplicateIndex:
+    """Persistent winnowed fingerprint index for cross-file duplicate detection"""
+    
+    # Bump whenever normalization or hashing changes so stale fingerprints are dropped
+    FORMAT_VERSION = 1
+    
+    def __init__(self, path: str, min_lines: int = 6, max_occurrences: int = 50,
+                 max_bytes: Optional[int] = None, binary_sniff_bytes: int = 8192):
+        self.path = path
+        self.min_lines = max(2, min_lines)
+        # With k + w - 1 == min_lines, every duplicated run of min_lines significant
+        # lines shares at least one winnowed k-gram fingerprint
+        self.kgram_lines = (self.min_lines + 1) // 2
+        self.window = self.min_lines - self.kgram_lines + 1
+        # Fingerprints shared by more locations than this are boilerplate, not copies
+        self.max_occurrences = max_occurrences
+        # Larger files (generated code) and binaries are not indexed, as in SourceFile analysis
+        self.max_bytes = max_bytes
+        self.binary_sniff_bytes = binary_sniff_bytes
+        self.reindexed = 0
+        self._conn = None
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the parent process uses the index, but the agent is shipped to workers
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        return state
+    
+    def _connect(self) -> sqlite3.Connection:
+        """Open the index database, clearing it if it was built with other settings"""
+        if self._conn is None:
+            index_dir = os.path.dirname(self.path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            # line_numbers/line_hashes: significant lines as uint32 arrays, for growing matches
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "id INTEGER PRIMARY KEY, path TEXT NOT NULL UNIQUE, "
+                "mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, "
+                "digest BLOB NOT NULL, indexed_at_ns INTEGER NOT NULL, "
+                "line_numbers BLOB NOT NULL, line_hashes BLOB NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fingerprints ("
+                "hash INTEGER NOT NULL, file_id INTEGER NOT NULL, "
+                "start_line INTEGER NOT NULL, end_line INTEGER NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints (hash)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprints_file ON fingerprints (file_id)")
+            
+            settings = json.dumps([self.FORMAT_VERSION, self.kgram_lines, self.window])
+            row = conn.execute("SELECT value FROM meta WHERE key = 'settings'").fetchone()
+            if row is None or row[0] != settings:
+                conn.execute("DELETE FROM files")
+                conn.execute("DELETE FROM fingerprints")
+                conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('settings', ?)", (settings,))
+            self._conn = conn
+        return self._conn
+    
+    @staticmethod
+    def _normalize(content: bytes, suffix: str) -> bytes:
+        """Drop comments and whitespace, empty string literals and fold digits, keeping line numbers"""
+        if suffix in HASH_COMMENT_SUFFIXES:
+            # Neither pattern spans lines, so constant replacements keep line numbers;
+            # strings go first so a '#' inside one does not start a comment
+            content = HASH_COMMENT.sub(b"", STRING_LITERAL.sub(b'""', content))
+        else:
+            def replace_literal(match: "re.Match") -> bytes:
+                text = match.group()
+                newlines = b"\n" * text.count(b"\n")
+                return b'""' + newlines if text[:1] in b"\"'`" else newlines
+            content = C_STYLE_LITERALS.sub(replace_literal, content)
+        return content.translate(NORMALIZE_BYTES, INLINE_WHITESPACE)
+    
+    def _significant_lines(self, content: bytes, suffix: str) -> Tuple["array", "array"]:
+        """Line numbers and normalized-line hashes of the lines that count towards duplicates"""
+        line_numbers = array('I')
+        line_hashes = array('I')
+        for line_number, line in enumerate(self._normalize(content, suffix).split(b"\n"), 1):
+            # Lines without a word character (blank, lone brackets) do not count
+            if SIGNIFICANT_LINE.search(line):
+                line_numbers.append(line_number)
+                line_hashes.append(zlib.crc32(line))
+        return line_numbers, line_hashes
+    
+    def _winnow(self, line_numbers: "array", line_hashes: "array") -> List[Tuple[int, int, int]]:
+        """Winnowed (hash, first line, last line) k-gram fingerprints of a file's significant lines"""
+        k = self.kgram_lines
+        if len(line_hashes) < k:
+            return []
+        
+        kgram_hashes = []
+        leading_power = pow(FINGERPRINT_BASE, k - 1, FINGERPRINT_MODULUS)
+        rolling = 0
+        for i, line_hash in enumerate(line_hashes):
+            if i >= k:
+                rolling -= line_hashes[i - k] * leading_power
+            rolling = (rolling * FINGERPRINT_BASE + line_hash) % FINGERPRINT_MODULUS
+            if i >= k - 1:
+                kgram_hashes.append(rolling)
+        
+        # Monotonic deque of k-gram positions; its head is the window minimum
+        fingerprints = []
+        window = min(self.window, len(kgram_hashes))
+        candidates = deque()
+        selected = -1
+        for i, kgram_hash in enumerate(kgram_hashes):
+            while candidates and kgram_hashes[candidates[-1]] >= kgram_hash:
+                candidates.pop()
+            candidates.append(i)
+            if candidates[0] <= i - window:
+                candidates.popleft()
+            if i >= window - 1 and candidates[0] != selected:
+                selected = candidates[0]
+                fingerprints.append((kgram_hashes[selected], line_numbers[selected], line_numbers[selected + k - 1]))
+        return fingerprints
+    
+    def update(self, file_paths: List[str]) -> int:
+        """Re-fingerprint (or drop, if unreadable, too large or binary) changed files; returns how many"""
+        conn = self._connect()
+        known = {}
+        for start in range(0, len(file_paths), 500):
+            batch = file_paths[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for row in conn.execute(
+                f"SELECT path, id, mtime_ns, size, digest, indexed_at_ns FROM files WHERE path IN ({placeholders})",
+                batch
+            ):
+                known[row[0]] = row[1:]
+        
+        changed = 0
+        conn.execute("BEGIN")
+        try:
+            for file_path in file_paths:
+                entry = known.get(file_path)
+                content = None
+                try:
+                    stat = os.stat(file_path)
+                    if (entry is not None and entry[1] == stat.st_mtime_ns and entry[2] == stat.st_size and
+                            entry[4] - stat.st_mtime_ns > RACY_WINDOW_NS):
+                        continue
+                    if self.max_bytes is None or stat.st_size <= self.max_bytes:
+                        with open(file_path, 'rb') as f:
+                            content = f.read()
+                except OSError:
+                    pass
+                if content is None or content.find(b"\0", 0, self.binary_sniff_bytes) >= 0:
+                    if entry is not None:
+                        conn.execute("DELETE FROM fingerprints WHERE file_id = ?", (entry[0],))
+                        conn.execute("DELETE FROM files WHERE id = ?", (entry[0],))
+                        changed += 1
+                    continue
+                
+                digest = hashlib.sha256(content).digest()
+                if entry is not None and entry[3] == digest:
+                    # Only touched: refresh the stat so the next run trusts it again
+                    conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ?, indexed_at_ns = ? WHERE id = ?",
+                        (stat.st_mtime_ns, stat.st_size, time.time_ns(), entry[0])
+                    )
+                    continue
+                
+                line_numbers, line_hashes = self._significant_lines(content, Path(file_path).suffix.lower())
+                row = (stat.st_mtime_ns, stat.st_size, digest, time.time_ns(),
+                       line_numbers.tobytes(), line_hashes.tobytes())
+                if entry is None:
+                    file_id = conn.execute(
+                        "INSERT INTO files (mtime_ns, size, digest, indexed_at_ns, line_numbers, line_hashes, path) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?)", row + (file_path,)
+                    ).lastrowid
+                else:
+                    file_id = entry[0]
+                    conn.execute(
+                        "UPDATE files SET mtime_ns = ?, size = ?, digest = ?, indexed_at_ns = ?, "
+                        "line_numbers = ?, line_hashes = ? WHERE id = ?", row + (file_id,)
+                    )
+                    conn.execute("DELETE FROM fingerprints WHERE file_id = ?", (file_id,))
+                conn.executemany(
+                    "INSERT INTO fingerprints (hash, file_id, start_line, end_line) VALUES (?, ?, ?, ?)",
+                    [(h, file_id, first, last) for h, first, last in self._winnow(line_numbers, line_hashes)]
+                )
+                changed += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.reindexed += changed
+        return changed
+    
+    def _shared_fingerprints(self, file_paths: List[str]) -> List[Tuple]:
+        """Rows (file_id, other_file_id, start, end, other_start, other_end) of fingerprints shared with file_paths"""
+        conn = self._connect()
+        # Fingerprints found once, or more than max_occurrences times, never form pairs
+        own = []
+        for start in range(0, len(file_paths), 500):
+            batch = file_paths[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            own.extend(conn.execute(
+                "SELECT f.hash, f.file_id, f.start_line, f.end_line FROM files JOIN fingerprints f "
+                f"ON f.file_id = files.id WHERE files.path IN ({placeholders})",
+                batch
+            ))
+        
+        candidates = list({row[0] for row in own})
+        occurrences = {}
+        for start in range(0, len(candidates), 500):
+            batch = candidates[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            shared_hashes = [row[0] for row in conn.execute(
+                f"SELECT hash FROM fingerprints WHERE hash IN ({placeholders}) "
+                "GROUP BY hash HAVING COUNT(*) BETWEEN 2 AND ?",
+                batch + [self.max_occurrences]
+            )]
+            if not shared_hashes:
+                continue
+            placeholders = ",".join("?" * len(shared_hashes))
+            for kgram_hash, file_id, start_line, end_line in conn.execute(
+                f"SELECT hash, file_id, start_line, end_line FROM fingerprints WHERE hash IN ({placeholders})",
+                shared_hashes
+            ):
+                occurrences.setdefault(kgram_hash, []).append((file_id, start_line, end_line))
+        
+        pairs = []
+        for kgram_hash, file_id, start_line, end_line in own:
+            for other_id, other_start_line, other_end_line in occurrences.get(kgram_hash, ()):
+                if other_id != file_id or other_start_line != start_line:
+                    pairs.append((file_id, other_id, start_line, end_line, other_start_line, other_end_line))
+        pairs.sort()
+        return pairs
+    
+    def _load_files(self, file_ids: Iterable[int]) -> Dict[int, Tuple[str, "array", "array"]]:
+        """(path, line numbers, line hashes) of indexed files by id"""
+        conn = self._connect()
+        file_ids = list(file_ids)
+        files = {}
+        for start in range(0, len(file_ids), 500):
+            batch = file_ids[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            for file_id, path, line_numbers, line_hashes in conn.execute(
+                f"SELECT id, path, line_numbers, line_hashes FROM files WHERE id IN ({placeholders})", batch
+            ):
+                numbers = array('I')
+                numbers.frombytes(line_numbers)
+                hashes = array('I')
+                hashes.frombytes(line_hashes)
+                files[file_id] = (path, numbers, hashes)
+        return files
+    
+    def find_duplicates(self, file_paths: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Index file_paths and return duplicated regions per file, against every indexed file"""
+        file_paths = list(dict.fromkeys(file_paths))
+        self.update(file_paths)
+        shared = self._shared_fingerprints(file_paths)
+        files = self._load_files({row[1] for row in shared} | {row[0] for row in shared})
+        # Matched files outside file_paths are re-checked, so stale entries report nothing
+        others = sorted({files[row[1]][0] for row in shared} - set(file_paths))
+        if others and self.update(others):
+            shared = self._shared_fingerprints(file_paths)
+            files = self._load_files({row[1] for row in shared} | {row[0] for row in shared})
+        
+        # Shared fingerprints are seeds; each is verified and grown over the files' significant lines
+        duplicates = {}
+        for (file_id, other_id), seeds in itertools.groupby(shared, key=lambda row: row[:2]):
+            file_path, numbers, hashes = files[file_id]
+            other_path, other_numbers, other_hashes = files[other_id]
+            # Seeds arrive in line order, so a seed is covered when an earlier region
+            # with the same offset into the other file reaches past it
+            covered_until = {}
+            for _, _, start_line, _, other_start_line, _ in seeds:
+                seed = bisect.bisect_left(numbers, start_line)
+                offset = bisect.bisect_left(other_numbers, other_start_line) - seed
+                if seed <= covered_until.get(offset, -1):
+                    continue
+                match = self._extend_match(hashes, other_hashes, seed, offset)
+                if match is None:
+                    continue
+                start, end = match
+                covered_until[offset] = end
+                if end - start + 1 < self.min_lines:
+                    continue
+                if other_id == file_id and start <= end + offset and start + offset <= end:
+                    continue
+                duplicates.setdefault(file_path, []).append({
+                    "start_line": numbers[start],
+                    "end_line": numbers[end],
+                    "other_file": other_path,
+                    "other_start_line": other_numbers[start + offset],
+                    "other_end_line": other_numbers[end + offset]
+                })
+        for regions in duplicates.values():
+            regions.sort(key=lambda region: (region["start_line"], region["other_file"], region["other_start_line"]))
+        return duplicates
+    
+    def _extend_match(self, hashes: "array", other_hashes: "array",
+                      seed: int, offset: int) -> Optional[Tuple[int, int]]:
+        """(first, last) significant-line indices of a seed k-gram match grown over equal lines, or None"""
+        end = seed + self.kgram_lines - 1
+        if seed + offset < 0 or end >= len(hashes) or end + offset >= len(other_hashes):
+            return None
+        if hashes[seed:end + 1] != other_hashes[seed + offset:end + offset + 1]:
+            return None
+        
+        # Whole chunks are compared as array slices; single lines only at the boundary
+        start = seed
+        limit = min(start, start + offset)
+        while limit > 0:
+            chunk = min(limit, 64)
+            if hashes[start - chunk:start] != other_hashes[start + offset - chunk:start + offset]:
+                while hashes[start - 1] == other_hashes[start + offset - 1]:
+                    start -= 1
+                break
+            start -= chunk
+            limit -= chunk
+        
+        limit = min(len(hashes) - end, len(other_hashes) - end - offset) - 1
+        while limit > 0:
+            chunk = min(limit, 64)
+            if hashes[end + 1:end + 1 + chunk] != other_hashes[end + offset + 1:end + offset + 1 + chunk]:
+                while hashes[end + 1] == other_hashes[end + offset + 1]:
+                    end += 1
+                break
+            end += chunk
+            limit -= chunk
+        return start, end
+    
+    def stats(self) -> Dict[str, Any]:
+        """Summarize the index for the analysis report"""
+        stats = {"path": self.path, "reindexed_files": self.reindexed, "files": 0, "fingerprints": 0}
+        try:
+            conn = self._connect()
+            stats["files"] = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+            stats["fingerprints"] = conn.execute("SELECT COUNT(*) FROM fingerprints").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Could not read duplicate index statistics: {e}")
+        return stats
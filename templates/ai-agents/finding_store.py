@@ -0,0 +1,157 @@
+"""
+Finding Store
+AI Agent Development Framework v3.7
+
+Compact storage for the code quality agent's findings: each finding is kept
+as its line plus an interned template of its other fields, and rebuilt as a
+dict only when read.
+"""
+
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+class FindingStore:
+    """Compact, list-like container of finding dicts, stored as runs of (template, line)"""
+    
+    __slots__ = ("templates", "template_ids", "template_rows", "lines", "runs", "count")
+    
+    # Key tagging the compact form in cached JSON (see to_compact)
+    COMPACT_KEY = "__finding_store__"
+    
+    def __init__(self, findings: Iterable[Dict[str, Any]] = ()):
+        # (keys, values, has_line); the line's slot in values is None when has_line
+        self.templates: List[Tuple[Tuple, Tuple, bool]] = []
+        self.template_ids: Dict[Tuple, int] = {}
+        self.template_rows = array('I')
+        self.lines = array('q')
+        self.runs = array('I')
+        self.count = 0
+        self.extend(findings)
+    
+    def _template_id(self, keys: Tuple, values: Tuple, has_line: bool) -> int:
+        """Index of the template, adding it if new; unhashable values get one of their own"""
+        # Types are part of the key so True and 1, or 1 and 1.0, stay distinct
+        intern_key = (keys, values, has_line, tuple(map(type, values)))
+        try:
+            template_id = self.template_ids.get(intern_key)
+        except TypeError:
+            intern_key = None
+            template_id = None
+        if template_id is None:
+            template_id = len(self.templates)
+            self.templates.append((keys, values, has_line))
+            if intern_key is not None:
+                self.template_ids[intern_key] = template_id
+        return template_id
+    
+    def _append_row(self, template_id: int, line: int, run: int) -> None:
+        self.count += run
+        if (self.template_rows and self.template_rows[-1] == template_id and self.templates[template_id][2] and
+                self.lines[-1] + self.runs[-1] == line):
+            self.runs[-1] += run
+            return
+        self.template_rows.append(template_id)
+        self.lines.append(line)
+        self.runs.append(run)
+    
+    def append(self, finding: Dict[str, Any]) -> None:
+        line = finding.get("line")
+        has_line = type(line) is int
+        keys = tuple(finding)
+        values = tuple(None if has_line and key == "line" else value for key, value in finding.items())
+        self._append_row(self._template_id(keys, values, has_line), line if has_line else 0, 1)
+    
+    def extend(self, findings: Iterable[Dict[str, Any]]) -> None:
+        if isinstance(findings, FindingStore):
+            # Row by row, mapping each template once
+            template_map = {}
+            for template_id, line, run in zip(findings.template_rows, findings.lines, findings.runs):
+                if template_id not in template_map:
+                    template_map[template_id] = self._template_id(*findings.templates[template_id])
+                self._append_row(template_map[template_id], line, run)
+            return
+        for finding in findings:
+            self.append(finding)
+    
+    def __len__(self) -> int:
+        return self.count
+    
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return self._build(range(len(self.templates)))
+    
+    def _build(self, template_ids: Iterable[int]) -> Iterator[Dict[str, Any]]:
+        """Yield the findings of the given templates, in order"""
+        wanted = set(template_ids)
+        for template_id, first_line, run in zip(self.template_rows, self.lines, self.runs):
+            if template_id not in wanted:
+                continue
+            keys, values, has_line = self.templates[template_id]
+            for line in range(first_line, first_line + run):
+                finding = dict(zip(keys, values))
+                if has_line:
+                    finding["line"] = line
+                yield finding
+    
+    def fields(self, *keys: str) -> Iterator[Tuple]:
+        """Yield the values of keys (None where missing) for each finding, without building dicts"""
+        template_fields = {}
+        for template_id, first_line, run in zip(self.template_rows, self.lines, self.runs):
+            if template_id not in template_fields:
+                template_keys, values, has_line = self.templates[template_id]
+                fields = dict(zip(template_keys, values))
+                # Position of the line among keys, filled in per finding below
+                line_slot = keys.index("line") if has_line and "line" in keys else None
+                template_fields[template_id] = (tuple(fields.get(key) for key in keys), line_slot)
+            values, line_slot = template_fields[template_id]
+            if line_slot is None:
+                for _ in range(run):
+                    yield values
+            else:
+                for line in range(first_line, first_line + run):
+                    yield values[:line_slot] + (line,) + values[line_slot + 1:]
+    
+    def where(self, key: str, value: Any) -> Iterator[Dict[str, Any]]:
+        """Yield the findings whose key equals value, building only those"""
+        return self._build(
+            template_id for template_id, (keys, values, _) in enumerate(self.templates)
+            if dict(zip(keys, values)).get(key) == value
+        )
+    
+    def to_compact(self) -> Dict[str, Any]:
+        """JSON-serializable form that from_compact restores"""
+        return {self.COMPACT_KEY: {
+            "templates": [[list(keys), list(values), has_line] for keys, values, has_line in self.templates],
+            "rows": [self.template_rows.tolist(), self.lines.tolist(), self.runs.tolist()]
+        }}
+    
+    @classmethod
+    def from_compact(cls, compact: Dict[str, Any]) -> "FindingStore":
+        store = cls()
+        template_ids = [store._template_id(tuple(keys), tuple(values), has_line)
+                        for keys, values, has_line in compact["templates"]]
+        for template_id, line, run in zip(*compact["rows"]):
+            store._append_row(template_ids[template_id], line, run)
+        return store
+    
+    @classmethod
+    def compact_json_default(cls, value: Any) -> Any:
+        """json default= hook writing FindingStores in compact form"""
+        if isinstance(value, cls):
+            return value.to_compact()
+        raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+    
+    @classmethod
+    def restore_compact(cls, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn compact forms among document's top-level values back into FindingStores"""
+        for key, value in document.items():
+            if isinstance(value, dict) and cls.COMPACT_KEY in value:
+                document[key] = cls.from_compact(value[cls.COMPACT_KEY])
+        return document
+
+
+def report_json_default(value: Any) -> Any:
+    """json default= hook expanding FindingStores into lists of finding dicts for reports"""
+    if isinstance(value, FindingStore):
+        return list(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,212 @@
+"""
+Pattern Scanner
+AI Agent Development Framework v3.7
+
+Single-pass scanning of file content against the code quality agent's
+security and performance regex patterns.
+"""
+
+import bisect
+import logging
+import re
+import time
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from agent_common import PerformanceRecorder
+from regex_safety import LiteralChainMatcher, PatternBudgetExceeded, RegexHazardAnalyzer, regex_time_budget
+
+logger = logging.getLogger(__name__)
+
+
+class LineIndex:
+    """Maps character (or, for bytes content, byte) offsets to 1-based line numbers using a newline-offset table"""
+    
+    def __init__(self, content: Union[str, bytes]):
+        self.length = len(content)
+        self.line_starts = [0]
+        newline = '\n' if isinstance(content, str) else b'\n'
+        self.line_starts.extend(match.end() for match in re.finditer(newline, content))
+    
+    def line_of(self, offset: int) -> int:
+        """Return the line number containing offset"""
+        return bisect.bisect_right(self.line_starts, offset)
+    
+    def span_of_lines(self, start_line: int, end_line: int) -> Tuple[int, int]:
+        """Return the (start, end) character offsets covering an inclusive line range"""
+        start = self.line_starts[start_line - 1] if start_line - 1 < len(self.line_starts) else self.length
+        end = self.line_starts[end_line] if end_line < len(self.line_starts) else self.length
+        return start, end
+
+
+class PatternScanner:
+    """Scanner for a named group of regex patterns, compiled once per agent and run in a combined pass"""
+    
+    SLOW_PASS_SECONDS = 0.05
+    
+    def __init__(self, pattern_groups: Dict[str, List[str]], flags: int = re.IGNORECASE,
+                 recorder: Optional[PerformanceRecorder] = None, limits: Optional[Dict[str, Any]] = None):
+        limits = limits or {}
+        self.flags = flags
+        self.recorder = recorder
+        self.time_budget = limits.get("time_budget_ms", 250) / 1000
+        self.max_line_length = limits.get("max_line_length", 4096)
+        self.rules = []
+        # Rule index -> LiteralChainMatcher, or None for a budgeted regex
+        self.guarded = {}
+        self.overruns: List[Tuple[str, str]] = []
+        analyzer = RegexHazardAnalyzer(flags)
+        for name, patterns in pattern_groups.items():
+            for pattern in patterns:
+                try:
+                    compiled = re.compile(pattern, flags)
+                except re.error as e:
+                    logger.error(f"Ignoring invalid {name} pattern {pattern!r}: {e}")
+                    continue
+                # Patterns that can backtrack super-linearly stay out of the combined pass: literal
+                # chains run linearly, exponential ones are rejected and the rest run under a budget
+                hazard = analyzer.analyze(pattern)
+                if hazard:
+                    chain = LiteralChainMatcher.from_pattern(pattern, flags)
+                    if chain is None and hazard.startswith("exponential") and limits.get("reject_exponential", True):
+                        logger.error(f"Ignoring {name} pattern {pattern!r} with {hazard}")
+                        continue
+                    if chain is None:
+                        logger.warning(f"{name} pattern {pattern!r} is {hazard}; "
+                                       f"scanning it with a {self.time_budget * 1000:g} ms budget")
+                    self.guarded[len(self.rules)] = chain
+                self.rules.append((name, pattern, compiled))
+        self.prefiltered = tuple(i for i in range(len(self.rules)) if i not in self.guarded)
+        # Bytes twins of all-ASCII patterns let scan() take a plain file's mapping unchanged
+        self.binary_rules = None
+        if all(pattern.isascii() for _, pattern, _ in self.rules):
+            try:
+                self.binary_rules = [re.compile(pattern.encode('ascii'), flags) for _, pattern, _ in self.rules]
+            except (re.error, ValueError):
+                # Constructs bytes patterns lack, such as \u escapes
+                pass
+        self._combined_cache = {}
+    
+    @property
+    def supports_bytes(self) -> bool:
+        return self.binary_rules is not None
+    
+    def _regex(self, rule_index: int, binary: bool) -> "re.Pattern":
+        return self.binary_rules[rule_index] if binary else self.rules[rule_index][2]
+    
+    def _combined(self, rule_indices: Tuple[int, ...], binary: bool) -> Optional["re.Pattern"]:
+        """Compile (once) an alternation of the given rules with one named group per rule"""
+        if (rule_indices, binary) not in self._combined_cache:
+            alternatives = "|".join(f"(?P<r{i}>{self.rules[i][1]})" for i in rule_indices)
+            try:
+                combined = re.compile(alternatives.encode('ascii') if binary else alternatives, self.flags)
+                # Numbered backreferences would point at the wrong groups once wrapped
+                if any(self.rules[i][2].groups and re.search(r'\\[1-9]', self.rules[i][1])
+                       for i in rule_indices):
+                    combined = None
+            except re.error:
+                combined = None
+            self._combined_cache[(rule_indices, binary)] = combined
+        return self._combined_cache[(rule_indices, binary)]
+    
+    def _matching_rules(self, content: Union[str, bytes], start: int, end: int) -> Set[int]:
+        """Find the indices of all prefiltered rules that match content[start:end] at least once"""
+        # The combined alternation is an exact prefilter: a matching rule either fires or is
+        # shadowed by another rule's match, so repeating it over the unfired rules finds them all
+        remaining = self.prefiltered
+        matching = set()
+        while remaining:
+            combined = self._combined(remaining, not isinstance(content, str))
+            if combined is None:
+                # Patterns cannot be combined; fall back to checking them one by one
+                matching.update(i for i in remaining if self._timed_search(i, content, start, end))
+                break
+            pass_start = time.perf_counter()
+            cpu_start = time.process_time()
+            fired = {int(match.lastgroup[1:]) for match in combined.finditer(content, start, end)}
+            if self.recorder is not None:
+                elapsed = time.perf_counter() - pass_start
+                self.recorder.add("pattern_prefilter", elapsed, time.process_time() - cpu_start)
+                # A combined pass cannot be split by pattern; a slow one is re-run rule by rule
+                if elapsed >= self.SLOW_PASS_SECONDS:
+                    for i in remaining:
+                        self._timed_search(i, content, start, end)
+            if not fired:
+                break
+            matching |= fired
+            remaining = tuple(i for i in remaining if i not in fired)
+        return matching
+    
+    def _rule_label(self, rule_index: int) -> str:
+        name, pattern, _ = self.rules[rule_index]
+        return f"{name}:{pattern}"
+    
+    def _charge(self, rule_index: int, wall_seconds: float, cpu_seconds: float) -> None:
+        """Charge time spent on one rule to it, as a per-pattern stage and item"""
+        if self.recorder is not None:
+            label = self._rule_label(rule_index)
+            self.recorder.add(f"pattern:{label}", wall_seconds, cpu_seconds)
+            self.recorder.add_item("pattern", label, wall_seconds)
+    
+    def _timed_search(self, rule_index: int, content: Union[str, bytes], start: int, end: int) -> bool:
+        """Search with one rule, charging the time to that pattern"""
+        search_start = time.perf_counter()
+        cpu_start = time.process_time()
+        found = self._regex(rule_index, not isinstance(content, str)).search(content, start, end) is not None
+        self._charge(rule_index, time.perf_counter() - search_start, time.process_time() - cpu_start)
+        return found
+    
+    def _budgeted_offsets(self, rule_index: int, content: Union[str, bytes],
+                          start: int, end: int) -> Tuple[List[int], bool]:
+        """Match offsets of a hazardous rule in content[start:end], and whether the scan completed"""
+        compiled = self._regex(rule_index, not isinstance(content, str))
+        newline = "\n" if isinstance(content, str) else b"\n"
+        try:
+            with regex_time_budget(self.time_budget) as enforced:
+                if enforced:
+                    return [match.start() for match in compiled.finditer(content, start, end)], True
+                # Unbudgeted, overlong lines (where backtracking blows up) are skipped instead
+                offsets = []
+                complete = True
+                line_start = start
+                while line_start < end:
+                    line_end = content.find(newline, line_start, end)
+                    if line_end < 0:
+                        line_end = end
+                    if line_end - line_start > self.max_line_length:
+                        complete = False
+                    else:
+                        offsets.extend(match.start() for match in compiled.finditer(content, line_start, line_end))
+                    line_start = line_end + 1
+                return offsets, complete
+        except PatternBudgetExceeded:
+            return [], False
+    
+    def scan(self, content: Union[str, bytes], line_index: LineIndex,
+             spans: Optional[List[Tuple[int, int]]] = None) -> Iterator[Tuple[str, str, int]]:
+        """Yield (name, pattern, line) for every match in configuration order, optionally within (start, end) spans"""
+        self.overruns = []
+        spans = spans if spans is not None else [(0, len(content))]
+        matching = [self._matching_rules(content, start, end) for start, end in spans]
+        for i, (name, pattern, _) in enumerate(self.rules):
+            for (start, end), span_matching in zip(spans, matching):
+                if i not in span_matching and i not in self.guarded:
+                    continue
+                rescan_start = time.perf_counter()
+                cpu_start = time.process_time()
+                complete = True
+                chain = self.guarded.get(i)
+                if i in span_matching:
+                    compiled = self._regex(i, not isinstance(content, str))
+                    offsets = [match.start() for match in compiled.finditer(content, start, end)]
+                elif chain is not None:
+                    offsets = list(chain.match_starts(content, start, end))
+                else:
+                    offsets, complete = self._budgeted_offsets(i, content, start, end)
+                elapsed = time.perf_counter() - rescan_start
+                self._charge(i, elapsed, time.process_time() - cpu_start)
+                if not complete:
+                    self.overruns.append((name, pattern))
+                    if self.recorder is not None:
+                        self.recorder.add_item("pattern_budget_overrun", self._rule_label(i), elapsed)
+                for offset in offsets:
+                    yield name, pattern, line_index.line_of(offset)
@@ -0,0 +1,421 @@
+"""
+Regex Safety
+AI Agent Development Framework v3.7
+
+Guards for the code quality agent's configurable regex patterns: hazard
+analysis of backtracking, a linear-time matcher for literal chains and a
+time budget for scans.
+"""
+
+import re
+import signal
+import threading
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple, Union
+
+try:
+    from re import _parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
+# Parse tree opcodes added in Python 3.11 (possessive quantifiers, atomic groups)
+POSSESSIVE_REPEAT = getattr(sre_parse, "POSSESSIVE_REPEAT", None)
+ATOMIC_GROUP = getattr(sre_parse, "ATOMIC_GROUP", None)
+
+
+class PatternBudgetExceeded(Exception):
+    """Raised inside a regex scan whose time budget ran out"""
+
+
+@contextmanager
+def regex_time_budget(seconds: float):
+    """Raise PatternBudgetExceeded in the enclosed block once seconds have passed; yields whether it is enforced"""
+    # The regex engine checks for signals while it backtracks, so SIGALRM cuts a
+    # runaway match short; without setitimer, or off the main thread, nothing does
+    if not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread():
+        yield False
+        return
+    
+    def expire(signum, frame):
+        raise PatternBudgetExceeded()
+    
+    previous_handler = signal.signal(signal.SIGALRM, expire)
+    previous_timer = signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield True
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, *previous_timer)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+
+class CharClass:
+    """Approximate set of characters a regex element can consume, for hazard analysis"""
+    
+    CATEGORY_TESTS = {
+        "CATEGORY_DIGIT": str.isdigit,
+        "CATEGORY_SPACE": str.isspace,
+        "CATEGORY_WORD": lambda char: char.isalnum() or char == "_"
+    }
+    # Besides ASCII and the classes' own characters, the probes used to decide overlap
+    EXTRA_PROBES = "\u00e9\u0660\u3000\u4e00\U0001f600"
+    
+    def __init__(self, items: Optional[List[Tuple]] = None, negated: bool = False, ignore_case: bool = False):
+        # ("lit", char), ("range", low, high), ("cat", category) or ("notcat", category)
+        self.items = items or []
+        self.negated = negated
+        self.ignore_case = ignore_case
+    
+    @classmethod
+    def any_char(cls, dotall: bool = False) -> "CharClass":
+        return cls([] if dotall else [("lit", "\n")], negated=True)
+    
+    def _item_contains(self, item: Tuple, char: str) -> bool:
+        kind = item[0]
+        if kind == "lit":
+            return char == item[1] or (self.ignore_case and char.lower() == item[1].lower())
+        if kind == "range":
+            return any(item[1] <= variant <= item[2] for variant in
+                       ((char, char.lower(), char.upper()) if self.ignore_case else (char,)))
+        test = self.CATEGORY_TESTS.get(item[1])
+        if test is None:
+            return True
+        return test(char) if kind == "cat" else not test(char)
+    
+    def contains(self, char: str) -> bool:
+        matched = any(self._item_contains(item, char) for item in self.items)
+        return not matched if self.negated else matched
+    
+    def is_empty(self) -> bool:
+        return not self.negated and not self.items
+    
+    def _probes(self, other: "CharClass") -> Iterator[str]:
+        yield from (chr(code) for code in range(128))
+        yield from self.EXTRA_PROBES
+        for item in self.items + other.items:
+            if item[0] == "lit":
+                yield item[1]
+            elif item[0] == "range":
+                yield item[1]
+                yield item[2]
+    
+    def overlaps(self, other: "CharClass") -> bool:
+        if self.negated and other.negated:
+            return True
+        return any(self.contains(char) and other.contains(char) for char in self._probes(other))
+    
+    def union(self, other: "CharClass") -> "CharClass":
+        if self.is_empty():
+            return other
+        if other.is_empty():
+            return self
+        if not self.negated and not other.negated:
+            return CharClass(self.items + other.items, ignore_case=self.ignore_case or other.ignore_case)
+        # Keep only the exclusions neither side matches (literals only; others are dropped)
+        excluded = [
+            item for item in (self.items if self.negated else []) + (other.items if other.negated else [])
+            if item[0] == "lit" and not self.contains(item[1]) and not other.contains(item[1])
+        ]
+        return CharClass(excluded, negated=True, ignore_case=self.ignore_case or other.ignore_case)
+
+
+class RegexHazardAnalyzer:
+    """Finds constructs in a re parse tree that make backtracking regex matching super-linear"""
+    
+    def __init__(self, flags: int):
+        self.flags = flags
+        self.ignore_case = bool(flags & re.IGNORECASE)
+        self.dotall = bool(flags & re.DOTALL)
+        self.backtracking_repeats = 0
+    
+    def analyze(self, pattern: str) -> Optional[str]:
+        """Describe the worst hazard in pattern, or None if matching it stays linear"""
+        try:
+            parsed = sre_parse.parse(pattern, self.flags)
+        except (re.error, RecursionError):
+            return None
+        self.ignore_case = bool(parsed.state.flags & re.IGNORECASE)
+        self.dotall = bool(parsed.state.flags & re.DOTALL)
+        self.backtracking_repeats = 0
+        items = list(parsed)
+        hazard = self._walk(items, inside_unbounded=False, follow=CharClass())
+        if hazard:
+            return hazard
+        if items and items[0][0] in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+            body = list(items[0][1][2])
+            if (items[0][1][1] == sre_parse.MAXREPEAT and not self._nullable(items[1:]) and
+                    not self._consumed_class(body).overlaps(self._first_class(items[1:]))):
+                # No backtracking into what follows, but search retries from every position it spans
+                self.backtracking_repeats += 1
+        if self.backtracking_repeats:
+            return (f"polynomial: {self.backtracking_repeats} unbounded quantifier(s) can backtrack over "
+                    f"what follows them, O(n^{self.backtracking_repeats + 1}) on long lines")
+        return None
+    
+    def _element_class(self, op, av) -> CharClass:
+        if op is sre_parse.LITERAL:
+            return CharClass([("lit", chr(av))], ignore_case=self.ignore_case)
+        if op is sre_parse.NOT_LITERAL:
+            return CharClass([("lit", chr(av))], negated=True, ignore_case=self.ignore_case)
+        if op is sre_parse.ANY:
+            return CharClass.any_char(self.dotall)
+        if op is sre_parse.CATEGORY:
+            return CharClass([self._category_item(av)])
+        if op is sre_parse.IN:
+            negated = bool(av) and av[0][0] is sre_parse.NEGATE
+            items = []
+            for item_op, item_av in (av[1:] if negated else av):
+                if item_op is sre_parse.LITERAL:
+                    items.append(("lit", chr(item_av)))
+                elif item_op is sre_parse.RANGE:
+                    items.append(("range", chr(item_av[0]), chr(item_av[1])))
+                elif item_op is sre_parse.CATEGORY:
+                    items.append(self._category_item(item_av))
+            return CharClass(items, negated=negated, ignore_case=self.ignore_case)
+        if op is sre_parse.GROUPREF:
+            return CharClass.any_char(dotall=True)
+        return CharClass()
+    
+    @staticmethod
+    def _category_item(category) -> Tuple[str, str]:
+        name = str(category)
+        if name.startswith("CATEGORY_NOT_"):
+            return ("notcat", "CATEGORY_" + name[len("CATEGORY_NOT_"):])
+        return ("cat", name)
+    
+    def _subpatterns(self, op, av) -> List[List]:
+        """Child sequences of a container element"""
+        if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, POSSESSIVE_REPEAT):
+            return [list(av[2])]
+        if op is sre_parse.SUBPATTERN:
+            return [list(av[-1])]
+        if op is sre_parse.BRANCH:
+            return [list(branch) for branch in av[1]]
+        if op is ATOMIC_GROUP:
+            return [list(av)]
+        return []
+    
+    def _top_branches(self, items: List) -> List[List]:
+        """Alternatives of a sequence that is a single (possibly grouped) alternation"""
+        if len(items) != 1:
+            return []
+        op, av = items[0]
+        if op is sre_parse.BRANCH:
+            return self._subpatterns(op, av)
+        if op is sre_parse.SUBPATTERN:
+            return self._top_branches(self._subpatterns(op, av)[0])
+        return []
+    
+    def _nullable(self, items: List) -> bool:
+        for op, av in items:
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, POSSESSIVE_REPEAT):
+                if av[0] > 0 and not self._nullable(list(av[2])):
+                    return False
+            elif op in (sre_parse.SUBPATTERN, ATOMIC_GROUP):
+                if not self._nullable(self._subpatterns(op, av)[0]):
+                    return False
+            elif op is sre_parse.BRANCH:
+                if not any(self._nullable(branch) for branch in self._subpatterns(op, av)):
+                    return False
+            elif op in (sre_parse.AT, sre_parse.ASSERT, sre_parse.ASSERT_NOT, sre_parse.GROUPREF_EXISTS):
+                continue
+            else:
+                return False
+        return True
+    
+    def _first_class(self, items: List) -> CharClass:
+        """Characters a match of the sequence can start with"""
+        first = CharClass()
+        for op, av in items:
+            children = self._subpatterns(op, av)
+            if children:
+                for child in children:
+                    first = first.union(self._first_class(child))
+            else:
+                first = first.union(self._element_class(op, av))
+            if not self._nullable([(op, av)]):
+                break
+        return first
+    
+    def _consumed_class(self, items: List) -> CharClass:
+        """Characters a match of the sequence can consume anywhere"""
+        consumed = CharClass()
+        for op, av in items:
+            children = self._subpatterns(op, av)
+            if children:
+                for child in children:
+                    consumed = consumed.union(self._consumed_class(child))
+            else:
+                consumed = consumed.union(self._element_class(op, av))
+        return consumed
+    
+    def _walk(self, items: List, inside_unbounded: bool, follow: CharClass) -> Optional[str]:
+        for index, (op, av) in enumerate(items):
+            rest = items[index + 1:]
+            after = self._first_class(rest)
+            if self._nullable(rest):
+                after = after.union(follow)
+            
+            if op in (POSSESSIVE_REPEAT, ATOMIC_GROUP):
+                continue
+            if op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT):
+                body = list(av[2])
+                unbounded = av[1] == sre_parse.MAXREPEAT
+                if unbounded:
+                    # Characters the repeat could hand over to what follows it
+                    if self._consumed_class(body).overlaps(after):
+                        if inside_unbounded:
+                            return "exponential: nested unbounded quantifiers can split the input many ways"
+                        self.backtracking_repeats += 1
+                    firsts = [self._first_class(branch) for branch in self._top_branches(body)]
+                    if any(firsts[i].overlaps(firsts[j])
+                           for i in range(len(firsts)) for j in range(i + 1, len(firsts))):
+                        return "exponential: unbounded quantifier over overlapping alternatives"
+                    # Inside the loop, the body is also followed by its own next iteration
+                    after = after.union(self._first_class(body))
+                hazard = self._walk(body, inside_unbounded or unbounded, after)
+                if hazard:
+                    return hazard
+            else:
+                for child in self._subpatterns(op, av):
+                    hazard = self._walk(child, inside_unbounded, after)
+                    if hazard:
+                        return hazard
+        return None
+
+
+class LiteralChainMatcher:
+    """Linear-time matcher for literals joined by greedy .*, such as for.*in.*len\\("""
+    
+    def __init__(self, literals: List[str], leading_any: bool, tail: Optional[str], flags: int):
+        self.literals = literals
+        self.leading_any = leading_any
+        self.tail = tail
+        self.flags = flags
+        self._compiled = {}
+    
+    def _compile(self, binary: bool) -> Tuple[List["re.Pattern"], Optional["re.Pattern"]]:
+        """Regexes finding each literal, and the tail, for str or bytes content"""
+        if binary not in self._compiled:
+            def encode(text: str) -> Union[str, bytes]:
+                # Matches how a bytes regex reads the \xNN escapes that produced the literal
+                return text.encode('latin-1') if binary else text
+            finders = [re.compile(re.escape(encode(literal)), self.flags) for literal in self.literals]
+            tail = re.compile(encode(self.tail), self.flags) if self.tail is not None else None
+            self._compiled[binary] = (finders, tail)
+        return self._compiled[binary]
+    
+    @staticmethod
+    def _split_on_dot_star(pattern: str) -> List[str]:
+        """Split pattern at top-level greedy .* (outside groups and character classes)"""
+        parts = []
+        depth = 0
+        in_class = False
+        last = 0
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == '\\':
+                i += 2
+                continue
+            if in_class:
+                in_class = char != ']'
+            elif char == '[':
+                in_class = True
+                # A ']' right after '[' or '[^' is a member, not the end of the class
+                i += 1
+                if pattern[i:i + 1] == '^':
+                    i += 1
+                if pattern[i:i + 1] == ']':
+                    i += 1
+                continue
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+            elif (char == '.' and depth == 0 and pattern[i + 1:i + 2] == '*' and
+                  pattern[i + 2:i + 3] not in ('?', '+')):
+                parts.append(pattern[last:i])
+                i += 2
+                last = i
+                continue
+            i += 1
+        parts.append(pattern[last:])
+        return parts
+    
+    @classmethod
+    def from_pattern(cls, pattern: str, flags: int) -> Optional["LiteralChainMatcher"]:
+        """Build a matcher equivalent to pattern, or None if pattern does not have that shape"""
+        if "(?" in pattern or flags & (re.DOTALL | re.VERBOSE):
+            return None
+        parts = cls._split_on_dot_star(pattern)
+        if len(parts) < 2:
+            return None
+        
+        literals = []
+        tail = None
+        for index, part in enumerate(parts):
+            if not part and index in (0, len(parts) - 1):
+                continue
+            try:
+                parsed = list(sre_parse.parse(part, flags))
+            except re.error:
+                return None
+            if parsed and all(op is sre_parse.LITERAL for op, _ in parsed):
+                literals.append("".join(chr(code) for _, code in parsed))
+            elif index == len(parts) - 1 and literals and cls._is_line_local(parsed, flags):
+                if RegexHazardAnalyzer(flags).analyze(part):
+                    return None
+                tail = part
+            else:
+                return None
+        if not literals:
+            return None
+        return cls(literals, leading_any=not parts[0], tail=tail, flags=flags)
+    
+    @staticmethod
+    def _is_line_local(items: List, flags: int) -> bool:
+        """Whether a parsed regex only consumes characters and never a newline"""
+        analyzer = RegexHazardAnalyzer(flags)
+        for op, av in items:
+            children = analyzer._subpatterns(op, av)
+            if op is sre_parse.BRANCH or op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT, sre_parse.SUBPATTERN):
+                if not all(LiteralChainMatcher._is_line_local(child, flags) for child in children):
+                    return False
+            elif op in (sre_parse.LITERAL, sre_parse.NOT_LITERAL, sre_parse.ANY, sre_parse.IN, sre_parse.CATEGORY):
+                if analyzer._element_class(op, av).contains("\n"):
+                    return False
+            else:
+                return False
+        return True
+    
+    def match_starts(self, content: Union[str, bytes], start: int, end: int) -> Iterator[int]:
+        """Yield the start offset of every match in content[start:end]"""
+        finders, tail = self._compile(not isinstance(content, str))
+        newline = "\n" if isinstance(content, str) else b"\n"
+        position = start
+        while position < end:
+            found = finders[0].search(content, position, end)
+            if found is None:
+                return
+            line_end = content.find(newline, found.start(), end)
+            if line_end < 0:
+                line_end = end
+            
+            cursor = found.end()
+            matched = True
+            for finder in finders[1:]:
+                match = finder.search(content, cursor, line_end)
+                if match is None:
+                    matched = False
+                    break
+                cursor = match.end()
+            if matched and tail is not None:
+                matched = tail.search(content, cursor, line_end) is not None
+            
+            # A later start on the same line has less room, so it cannot match either
+            if matched and self.leading_any:
+                yield max(start, content.rfind(newline, start, found.start()) + 1)
+            elif matched:
+                yield found.start()
+            position = line_end + 1
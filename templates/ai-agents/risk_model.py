@@ -0,0 +1,136 @@
+"""
+Risk Model
+AI Agent Development Framework v3.7
+
+Logistic-regression model of deployment success, trained by the deployment
+strategy agent on its stored history.
+"""
+
+import logging
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+
+# numpy is imported where used, keeping it off the agent's startup path
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class RiskModel:
+    """L2-regularized logistic regression estimating the probability a deployment succeeds"""
+    
+    def __init__(self, environments: List[str], strategies: List[str],
+                 components: List[str], risk_factors: List[str]):
+        # A risk score column per strategy lets the model learn which strategy copes with risk
+        self.feature_names = (
+            ["bias"] +
+            [f"environment:{environment}" for environment in environments] +
+            [f"strategy:{strategy}" for strategy in strategies] +
+            [f"risk_score:{strategy}" for strategy in strategies] +
+            ["files_changed", "lines_changed"] +
+            [f"component:{component}" for component in components] +
+            [f"risk_factor:{risk_factor}" for risk_factor in risk_factors]
+        )
+        self._index = {name: i for i, name in enumerate(self.feature_names)}
+        self.coefficients: Optional["np.ndarray"] = None
+        self.samples = 0
+    
+    def features(self, rows: List[Tuple]) -> "np.ndarray":
+        """Build the design matrix for DeploymentHistoryStore.model_rows-shaped rows"""
+        import numpy as np
+        matrix = np.zeros((len(rows), len(self.feature_names)))
+        matrix[:, 0] = 1.0
+        if not rows:
+            return matrix
+        
+        # Categorical fields go through lookup tables of their distinct values
+        environments, strategies, _, risk_scores, files_changed, lines_changed, components, risk_factors = zip(*rows)
+        positions = np.arange(len(rows))
+        for prefix, values in (("environment", environments), ("strategy", strategies)):
+            columns = self._column_codes(prefix, values)
+            known = columns >= 0
+            matrix[positions[known], columns[known]] = 1.0
+        
+        # The risk score lands in the column of the row's own strategy
+        columns = self._column_codes("risk_score", strategies)
+        known = columns >= 0
+        scores = np.maximum(np.array(risk_scores, dtype=float), 0.0)
+        matrix[positions[known], columns[known]] = np.log1p(scores[known])
+        matrix[:, self._index["files_changed"]] = np.log1p(np.array(files_changed, dtype=float))
+        matrix[:, self._index["lines_changed"]] = np.log1p(np.array(lines_changed, dtype=float))
+        
+        # Multi-valued fields: one indicator row per distinct comma-separated value
+        for prefix, values in (("component", components), ("risk_factor", risk_factors)):
+            distinct = {value: code for code, value in enumerate(dict.fromkeys(values))}
+            codes = np.fromiter(map(distinct.__getitem__, values), dtype=np.intp, count=len(values))
+            indicators = np.zeros((len(distinct), len(self.feature_names)))
+            for value, code in distinct.items():
+                for name in filter(None, value.split(',')):
+                    column = self._index.get(f"{prefix}:{name}")
+                    if column is not None:
+                        indicators[code, column] = 1.0
+            for column in np.flatnonzero(indicators.any(axis=0)):
+                matrix[:, column] = indicators[codes, column]
+        
+        return matrix
+    
+    def _column_codes(self, prefix: str, values: Tuple) -> "np.ndarray":
+        """Map each value to the column of feature "prefix:value", or -1 if there is none"""
+        import numpy as np
+        lookup = {value: self._index.get(f"{prefix}:{value}", -1) for value in dict.fromkeys(values)}
+        return np.fromiter(map(lookup.__getitem__, values), dtype=np.intp, count=len(values))
+    
+    def fit(self, rows: List[Tuple], l2_penalty: float = 1.0,
+            max_iterations: int = 25, min_samples: int = 50) -> bool:
+        """Fit on deployment rows; returns False when there is too little signal to fit"""
+        import numpy as np
+        self.coefficients = None
+        self.samples = len(rows)
+        outcomes = np.array([1.0 if row[2] else 0.0 for row in rows])
+        if len(rows) < min_samples or outcomes.min() == outcomes.max():
+            return False
+        
+        matrix = self.features(rows)
+        penalty = np.full(len(self.feature_names), float(l2_penalty))
+        penalty[0] = 0.0  # Leave the intercept unregularized
+        coefficients = np.zeros(len(self.feature_names))
+        # Newton's method on the full design matrix
+        for _ in range(max_iterations):
+            probabilities = self._sigmoid(matrix @ coefficients)
+            gradient = matrix.T @ (probabilities - outcomes) + penalty * coefficients
+            hessian = (matrix.T * (probabilities * (1.0 - probabilities))) @ matrix + np.diag(penalty)
+            step = np.linalg.solve(hessian, gradient)
+            coefficients -= step
+            if np.max(np.abs(step)) < 1e-6:
+                break
+        
+        self.coefficients = coefficients
+        return True
+    
+    @staticmethod
+    def _sigmoid(scores: "np.ndarray") -> "np.ndarray":
+        """Logistic function, clipped to avoid overflow"""
+        import numpy as np
+        return 1.0 / (1.0 + np.exp(-np.clip(scores, -35.0, 35.0)))
+    
+    def predict(self, rows: List[Tuple]) -> "np.ndarray":
+        """Return the success probability of each row (its success field is ignored)"""
+        return self._sigmoid(self.features(rows) @ self.coefficients)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Serialize the fitted model"""
+        return {
+            "feature_names": self.feature_names,
+            "coefficients": None if self.coefficients is None else self.coefficients.tolist(),
+            "samples": self.samples
+        }
+    
+    def load_dict(self, data: Dict[str, Any]) -> bool:
+        """Load coefficients saved by to_dict; returns False if they were fitted on other features"""
+        import numpy as np
+        if data.get("feature_names") != self.feature_names:
+            return False
+        coefficients = data.get("coefficients")
+        self.coefficients = None if coefficients is None else np.array(coefficients)
+        self.samples = data.get("samples", 0)
+        return True
@@ -0,0 +1,61 @@
+"""
+Source File
+AI Agent Development Framework v3.7
+
+Read-only, memory-mapped access to the files the code quality agent analyzes.
+"""
+
+import mmap
+import os
+import re
+
+
+class SourceFile:
+    """Read-only, memory-mapped view of a file's bytes; text() decodes it once, on demand"""
+    
+    # Bytes after which byte-level regex scans could differ from str scans of the
+    # decoded text: non-ASCII, carriage returns (normalized away on decode) and the
+    # ASCII separators that only str regexes count as whitespace
+    NON_PLAIN_BYTE = re.compile(rb'[\r\x1c-\x1f\x80-\xff]')
+    
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._text = None
+        self._plain = None
+        with open(file_path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            try:
+                self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+            except (OSError, ValueError):
+                # Not mappable (a pipe or special file)
+                self.data = f.read()
+                self.size = len(self.data)
+    
+    def __enter__(self) -> "SourceFile":
+        return self
+    
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+    
+    def close(self) -> None:
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+    
+    def looks_binary(self, sniff_bytes: int = 8192) -> bool:
+        """Whether the file looks binary: a NUL byte in its first sniff_bytes, as git decides"""
+        return self.data.find(b"\0", 0, sniff_bytes) >= 0
+    
+    def is_plain(self) -> bool:
+        """Whether byte offsets equal character offsets and bytes regexes behave like str ones"""
+        if self._plain is None:
+            self._plain = self.NON_PLAIN_BYTE.search(self.data) is None
+        return self._plain
+    
+    def text(self) -> str:
+        """Decode as UTF-8 with universal newlines, matching text-mode reads"""
+        if self._text is None:
+            text = str(self.data, 'utf-8')
+            if '\r' in text:
+                text = text.replace('\r\n', '\n').replace('\r', '\n')
+            self._text = text
+        return self._text
@@ -0,0 +1,245 @@
+"""
+Strategy Backtest
+AI Agent Development Framework v3.7
+
+Vectorized replay of the deployment strategy agent's history through its
+strategy policy, for every config in a grid of overrides.
+"""
+
+import json
+import logging
+from itertools import product
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
+
+# numpy is imported where used, keeping it off the agent's startup path
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Config sections a backtest grid may vary, addressed as "section.key"
+BACKTEST_SECTIONS = ("risk_thresholds", "strategy_weights", "environment_risk_multiplier")
+
+
+def run_backtest(agent: Any, grid: Dict[str, List[Any]], deployment_strategies: List[str]) -> Dict[str, Any]:
+    """Count, per config in the grid of "section.key" values, strategies matching past successes and failures"""
+    import numpy as np
+    for name in grid:
+        section, _, key = name.partition('.')
+        if section not in BACKTEST_SECTIONS or not key:
+            raise ValueError(f"Unsupported backtest parameter: {name}")
+    names = list(grid)
+    overrides = [dict(zip(names, values)) for values in product(*(grid[name] for name in names))]
+    
+    rows = agent.history_store.backtest_rows()
+    report = {
+        "records": len(rows),
+        "configs_evaluated": len(overrides),
+        "successful_deployments": 0,
+        "failed_deployments": 0,
+        "rescored_records": 0,
+        "configs": []
+    }
+    if not rows or not overrides:
+        return report
+    
+    # Deployments recorded with category counts are re-scored under each config's weights;
+    # older ones keep their recorded score. History-based adjustments are left out, since
+    # they would be fed by the very deployments being replayed
+    environments, strategies, successes, risk_scores, components, risk_factors, category_counts, magnitudes = zip(*rows)
+    # Components are scored with the weight of the first category that produces them
+    component_weights = {}
+    for category in agent.config["change_categories"]:
+        component_weights.setdefault(category["component"], category.get("weight", 0))
+    category_components = list(component_weights)
+    strategy_names = deployment_strategies + sorted(
+        set(agent.config["forced_strategies"].values()) - set(deployment_strategies)
+    )
+    strategy_codes = {name: code for code, name in enumerate(strategy_names)}
+    environment_names = list(dict.fromkeys(environments))
+    environment_codes = {name: code for code, name in enumerate(environment_names)}
+    
+    # Per-deployment inputs that do not depend on the config
+    success = np.array(successes, dtype=bool)
+    recorded = np.array([strategy_codes.get(strategy, -1) for strategy in strategies])
+    environment_index = np.array([environment_codes[environment] for environment in environments])
+    fixed_choice = np.zeros(len(rows), dtype=int)
+    for (comps, factors, environment), positions in _group_positions(
+        tuple(zip(components, risk_factors, environments))
+    ).items():
+        fixed_choice[positions] = _fixed_strategy_code(agent, comps, factors, environment, strategy_codes)
+    
+    counts = np.zeros((len(rows), len(category_components)))
+    counts_code = np.zeros(len(rows), dtype=np.int64)
+    rescored = np.array([value is not None for value in category_counts])
+    for code, (value, positions) in enumerate(_group_positions(category_counts).items()):
+        counts_code[positions] = code
+        if value is not None:
+            parsed = json.loads(value)
+            counts[positions] = [parsed.get(component, 0) for component in category_components]
+    magnitude = np.array([value if value is not None else 1.0 for value in magnitudes], dtype=float)
+    
+    # Legacy records: undo the environment multiplier of the current config
+    base_multipliers = np.array([
+        agent.config["environment_risk_multiplier"].get(environment, 1.0) for environment in environment_names
+    ])[environment_index]
+    legacy_scores = np.divide(
+        np.array(risk_scores, dtype=float), base_multipliers,
+        out=np.zeros(len(rows)), where=(base_multipliers != 0) & ~rescored
+    )
+    
+    # Forced strategies (and prod database migrations) do not depend on the config
+    fixed = fixed_choice >= 0
+    fixed_matches = fixed & (recorded == fixed_choice)
+    matched_successes = np.full(len(overrides), float((fixed_matches & success).sum()))
+    repeated_failures = np.full(len(overrides), float((fixed_matches & ~success).sum()))
+    
+    # Collapse the rest into distinct score inputs with (strategy, outcome) tallies;
+    # deployments of strategies the ladder never picks cannot match and are dropped
+    free = np.flatnonzero(~fixed & (recorded >= 0) & (recorded < len(deployment_strategies)))
+    group_key = np.zeros(len(rows), dtype=np.int64)
+    for codes in (environment_index, counts_code,
+                  np.unique(magnitude, return_inverse=True)[1].reshape(-1),
+                  np.unique(legacy_scores, return_inverse=True)[1].reshape(-1)):
+        # Re-densify after each column so the combined key cannot overflow
+        group_key = np.unique(group_key * (int(codes.max()) + 1) + codes, return_inverse=True)[1].reshape(-1)
+    _, first_rows, group_index = np.unique(group_key[free], return_index=True, return_inverse=True)
+    group_index = group_index.reshape(-1)
+    group_rows = free[first_rows]
+    tallies = np.bincount(
+        group_index * 6 + recorded[free] * 2 + success[free], minlength=len(group_rows) * 6
+    ).reshape(-1, 3, 2)
+    group_environment = environment_index[group_rows]
+    group_rescored = rescored[group_rows]
+    group_counts = counts[group_rows]
+    group_magnitude, group_legacy = magnitude[group_rows], legacy_scores[group_rows]
+    
+    configs = [_apply_overrides(agent.config, override) for override in overrides]
+    weights = np.array([
+        [agent._resolve_weight(component_weights[component], config["strategy_weights"])
+         for component in category_components]
+        for config in configs
+    ], dtype=float).reshape(len(configs), len(category_components))
+    multipliers = np.array([
+        [config["environment_risk_multiplier"].get(environment, 1.0) for environment in environment_names]
+        for config in configs
+    ], dtype=float)
+    if (multipliers < 0).any():
+        raise ValueError("environment_risk_multiplier values must not be negative")
+    low, medium, high = (
+        np.array([config["risk_thresholds"][level] for config in configs], dtype=float)
+        for level in ("low", "medium", "high")
+    )
+    
+    # Each config's ladder splits an environment's deployments, sorted by score,
+    # into rolling / canary / blue-green ranges; prefix sums of the tallies give
+    # the matches per range. Sorting is needed once per distinct weight vector.
+    distinct_weights, weight_index = np.unique(weights, axis=0, return_inverse=True)
+    weight_index = weight_index.reshape(-1)
+    for weight_row, weight_vector in enumerate(distinct_weights):
+        config_rows = np.flatnonzero(weight_index == weight_row)
+        scores = np.where(group_rescored, (group_counts @ weight_vector) * group_magnitude, group_legacy)
+        for environment_code, environment in enumerate(environment_names):
+            members = np.flatnonzero(group_environment == environment_code)
+            if not members.size:
+                continue
+            order = members[np.argsort(scores[members], kind="stable")]
+            sorted_scores = scores[order]
+            cumulative = np.zeros((len(order) + 1, 3, 2))
+            cumulative[1:] = np.cumsum(tallies[order], axis=0)
+            
+            multiplier = multipliers[config_rows, environment_code]
+            config_low, config_medium, config_high = low[config_rows], medium[config_rows], high[config_rows]
+            # prod promotes rolling to canary above low * 0.8; dev keeps canary below high * 1.2
+            rolling_limit = np.minimum(config_low, config_low * 0.8) if environment == "prod" else config_low
+            rolling_end = _count_scores_within(sorted_scores, multiplier, rolling_limit)
+            canary_end = _count_scores_within(sorted_scores, multiplier, np.maximum(config_low, config_medium))
+            if environment == "dev":
+                canary_end = np.maximum(
+                    canary_end, _count_scores_within(sorted_scores, multiplier, config_high * 1.2, strict=True)
+                )
+            
+            range_tallies = (cumulative[rolling_end, 0] +
+                             cumulative[canary_end, 1] - cumulative[rolling_end, 1] +
+                             cumulative[-1, 2] - cumulative[canary_end, 2])
+            matched_successes[config_rows] += range_tallies[:, 1]
+            repeated_failures[config_rows] += range_tallies[:, 0]
+    
+    total_successes = int(success.sum())
+    total_failures = len(rows) - total_successes
+    for override, matched, repeated in zip(overrides, matched_successes, repeated_failures):
+        report["configs"].append({
+            "overrides": override,
+            "matched_successes": int(matched),
+            "match_rate": round(int(matched) / max(total_successes, 1), 4),
+            "repeated_failures": int(repeated),
+            "failure_repeat_rate": round(int(repeated) / max(total_failures, 1), 4)
+        })
+    
+    report["successful_deployments"] = total_successes
+    report["failed_deployments"] = total_failures
+    report["rescored_records"] = int(rescored.sum())
+    report["best"] = max(report["configs"], key=lambda entry: (entry["match_rate"], -entry["failure_repeat_rate"]))
+    return report
+
+
+def _count_scores_within(sorted_scores: "np.ndarray", multipliers: "np.ndarray", limits: "np.ndarray",
+                         strict: bool = False) -> "np.ndarray":
+    """Count leading sorted scores whose product with each multiplier is <= limit (< if strict)"""
+    import numpy as np
+    
+    def within(values, bounds):
+        return values < bounds if strict else values <= bounds
+    
+    size = len(sorted_scores)
+    positive = multipliers > 0
+    quotients = np.divide(limits, multipliers, out=np.zeros(len(limits)), where=positive)
+    # Searched on limit / multiplier, then corrected against the actual products so the
+    # counts agree exactly with the comparisons predict_deployment_strategy makes
+    counts = np.searchsorted(sorted_scores, quotients, side="left" if strict else "right")
+    # A zero multiplier makes every product zero
+    counts[~positive] = np.where(within(0.0, limits[~positive]), size, 0)
+    
+    while True:
+        last_in = np.clip(counts - 1, 0, size - 1)
+        first_out = np.clip(counts, 0, size - 1)
+        overshoot = positive & (counts > 0) & ~within(sorted_scores[last_in] * multipliers, limits)
+        undershoot = positive & (counts < size) & within(sorted_scores[first_out] * multipliers, limits)
+        if not (overshoot.any() or undershoot.any()):
+            return counts
+        # Equal scores give equal products, so step over whole runs of them
+        counts[overshoot] = np.searchsorted(sorted_scores, sorted_scores[last_in[overshoot]], side="left")
+        counts[undershoot] = np.searchsorted(sorted_scores, sorted_scores[first_out[undershoot]], side="right")
+
+
+def _group_positions(values: Tuple) -> Dict[Any, List[int]]:
+    """Map each distinct value to the positions it occurs at"""
+    positions = {}
+    for position, value in enumerate(values):
+        positions.setdefault(value, []).append(position)
+    return positions
+
+
+def _apply_overrides(config: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """Return the backtested sections of config with "section.key" overrides applied"""
+    sections = {section: dict(config[section]) for section in BACKTEST_SECTIONS}
+    for name, value in override.items():
+        section, _, key = name.partition('.')
+        sections[section][key] = value
+    return sections
+
+
+def _fixed_strategy_code(agent: Any, components: str, risk_factors: str, environment: str,
+                         strategy_codes: Dict[str, int]) -> int:
+    """Code of the strategy picked for a deployment regardless of thresholds and weights, or -1"""
+    risk_factor_list = list(filter(None, risk_factors.split(',')))
+    forced = agent._check_forced_strategies(
+        {"risk_factors": risk_factor_list, "affected_components": components.split(',')},
+        environment
+    )
+    if forced:
+        return strategy_codes[forced]
+    if environment == "prod" and "database_migration" in risk_factor_list:
+        return strategy_codes["blue-green"]
+    return -1
+
@@ -0,0 +1,38 @@
+"""Shared fixtures: the agents are scripts with hyphenated names, so they are loaded from their paths"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+AGENTS_DIR = Path(__file__).resolve().parent.parent
+
+
+def load_agent_module(name: str, filename: str):
+    """Import an agent script once as a module registered under name (so pickling by reference works)"""
+    # The agents import their shared support module from their own directory
+    if str(AGENTS_DIR) not in sys.path:
+        sys.path.insert(0, str(AGENTS_DIR))
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(name, AGENTS_DIR / filename)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        spec.loader.exec_module(module)
+    return sys.modules[name]
+
+
+@pytest.fixture(scope="session")
+def code_quality():
+    return load_agent_module("code_quality_agent", "code-quality-agent.py")
+
+
+@pytest.fixture(scope="session")
+def deployment_strategy():
+    return load_agent_module("deployment_strategy_agent", "deployment-strategy-agent.py")
+
+
+@pytest.fixture(scope="session")
+def agent_common():
+    load_agent_module("code_quality_agent", "code-quality-agent.py")
+    return sys.modules["agent_common"]
@@ -0,0 +1,67 @@
+"""Tests for the support module shared by the agents"""
+
+import subprocess
+import time
+
+import pytest
+
+
+def process_running(pid: int) -> bool:
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            # Zombies are dead, just not yet reaped by their new parent
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.fixture
+def executor(agent_common):
+    executor = agent_common.SubprocessExecutor(max_concurrency=2)
+    yield executor
+    executor.close()
+
+
+def test_subprocess_deadline_kills_the_process_group(agent_common, executor, tmp_path):
+    pid_file = tmp_path / "worker.pid"
+    # The tool forks a worker of its own, which must die with it
+    command = ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"]
+    executor.deadline = time.monotonic() + 0.5
+    started = time.monotonic()
+    
+    with pytest.raises(agent_common.SubprocessDeadlineExceeded):
+        executor.submit("tool", command, timeout=30).result()
+    assert time.monotonic() - started < 5
+    worker = int(pid_file.read_text())
+    for _ in range(50):
+        if not process_running(worker):
+            break
+        time.sleep(0.05)
+    assert not process_running(worker)
+    
+    # Past the deadline nothing new starts
+    with pytest.raises(agent_common.SubprocessDeadlineExceeded, match="not started"):
+        executor.run("tool", ["sh", "-c", f"echo started > {tmp_path / 'late'}"])
+    assert not (tmp_path / "late").exists()
+    
+    executor.deadline = None
+    assert executor.run("tool", ["echo", "ok"]).stdout == "ok\n"
+
+
+def test_subprocess_timeout_kills_the_process_group(executor, tmp_path):
+    pid_file = tmp_path / "worker.pid"
+    started = time.monotonic()
+    
+    with pytest.raises(subprocess.TimeoutExpired):
+        executor.run("tool", ["sh", "-c", f"sleep 30 & echo $! > {pid_file}; wait"], timeout=0.5)
+    assert time.monotonic() - started < 5
+    worker = int(pid_file.read_text())
+    for _ in range(50):
+        if not process_running(worker):
+            break
+        time.sleep(0.05)
+    assert not process_running(worker)
+    
+    with pytest.raises(FileNotFoundError):
+        executor.run("missing", ["definitely-not-an-installed-tool"])
+    assert executor.drain_timings()["tool"][0] == 1
@@ -0,0 +1,492 @@
+"""Tests for the code quality agent"""
+
+import json
+import os
+import random
+import re
+import time
+
+import pytest
+
+
+def sample_findings():
+    # Runs on consecutive lines, a template shared across runs, findings without a
+    # line, values that compare equal across types and an unhashable value
+    findings = [{"type": "long_line", "severity": "low", "line": line} for line in range(3, 9)]
+    findings += [{"type": "long_line", "severity": "low", "line": line} for line in (12, 13, 20)]
+    findings += [
+        {"type": "hardcoded_secret", "severity": "critical", "line": 5, "message": "Possible secret"},
+        {"type": "summary", "severity": "medium", "line": None},
+        {"type": "summary", "severity": "medium"},
+        {"type": "flag", "severity": "low", "line": 7, "value": True},
+        {"type": "flag", "severity": "low", "line": 8, "value": 1},
+        {"type": "flag", "severity": "low", "line": 9, "value": 1.0},
+        {"line": 4, "type": "tool", "severity": "high", "details": {"codes": ["E501", "W291"]}},
+    ]
+    return findings
+
+
+def test_finding_store_survives_compact_round_trip(code_quality):
+    FindingStore = code_quality.FindingStore
+    findings = sample_findings()
+    store = FindingStore(findings)
+    
+    document = json.loads(json.dumps({"findings": store, "score": 88}, default=FindingStore.compact_json_default))
+    restored = FindingStore.restore_compact(document)
+    
+    assert restored["score"] == 88
+    assert isinstance(restored["findings"], FindingStore)
+    assert len(restored["findings"]) == len(findings)
+    assert list(restored["findings"]) == findings
+    # Key order and value types survive too, not just equality
+    assert [list(finding) for finding in restored["findings"]] == [list(finding) for finding in findings]
+    assert [type(finding.get("value")) for finding in restored["findings"]] == [type(finding.get("value")) for finding in findings]
+    assert list(restored["findings"].fields("type", "line")) == [(finding.get("type"), finding.get("line")) for finding in findings]
+
+
+def test_analyze_files_streams_input_through_batch_stages(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    # Default config: external tools and the duplicate index stay on
+    agent = code_quality.CodeQualityAgent()
+    agent.config["ingestion"]["window_files"] = 2
+    paths = []
+    for index in range(8):
+        (tmp_path / f"module_{index}.py").write_text(f"value_{index} = {index}\n")
+        paths.append(f"module_{index}.py")
+    
+    yielded = []
+    
+    def discover():
+        for path in paths[:1] + ["missing.py"] + paths[1:]:
+            yielded.append(path)
+            yield path
+    
+    # Analyses reach the callback while discovery is at most two windows ahead
+    seen = []
+    results = agent.analyze_files(discover(), file_callback=lambda analysis: seen.append((analysis["file_path"], len(yielded))))
+    
+    assert [file_path for file_path, _ in seen] == paths
+    assert seen[0][1] < len(paths)
+    assert all(pulled - paths.index(file_path) <= 2 * 2 + 1 for file_path, pulled in seen)
+    assert results["summary"]["total_files_analyzed"] == 8
+
+
+def daemon_request(socket_path, request):
+    import socket
+    
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(json.dumps(request).encode() + b"\n")
+        return json.loads(client.makefile().readline())
+
+
+def test_daemon_refuses_live_socket_and_replaces_stale_one(code_quality, tmp_path, monkeypatch):
+    import concurrent.futures
+    import socket
+    import stat
+    import threading
+    import time
+    
+    pools_started = []
+    
+    class RecordingPool(concurrent.futures.ProcessPoolExecutor):
+        def __init__(self, *args, **kwargs):
+            pools_started.append(kwargs.get("max_workers"))
+            super().__init__(*args, **kwargs)
+    
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.chdir(tmp_path)
+    socket_path = str(tmp_path / "d.sock")
+    for index in range(4):
+        (tmp_path / f"module_{index}.py").write_text(f"value_{index} = {index}\n")
+    
+    # A socket file nobody listens on is left behind by a daemon that died
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path)
+    stale.close()
+    
+    # Started as from the command line, where --jobs defaults to the CPU count; the
+    # external tools are left out so the latency check measures the daemon itself
+    (tmp_path / "agent.yaml").write_text("external_tools:\n  enabled: false\n")
+    monkeypatch.setattr(os, "cpu_count", lambda: 8)
+    monkeypatch.setattr("sys.argv", ["code-quality-agent.py", "--daemon", "--socket", socket_path,
+                                     "--config", "agent.yaml"])
+    server_thread = threading.Thread(target=code_quality.main)
+    server_thread.start()
+    try:
+        for _ in range(200):
+            if code_quality.AnalysisDaemon._socket_answers(socket_path):
+                break
+            server_thread.join(0.01)
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        
+        with pytest.raises(RuntimeError, match="already listening"):
+            code_quality.AnalysisDaemon(code_quality.CodeQualityAgent, code_quality.format_results, None).serve(socket_path)
+        assert os.path.exists(socket_path)
+        
+        # After an edit to two files, a warm request re-analyzes just those, without
+        # paying for a worker pool
+        request = {"op": "analyze", "files": [f"module_{index}.py" for index in range(4)]}
+        assert "output" in daemon_request(socket_path, request)
+        for index in range(2):
+            (tmp_path / f"module_{index}.py").write_text(f"value_{index} = {index} + 1\n")
+        started = time.perf_counter()
+        assert "output" in daemon_request(socket_path, request)
+        assert time.perf_counter() - started < 0.1
+        assert pools_started == []
+        assert daemon_request(socket_path, {"op": "status"})["warm_cache"]["hits"] == 2
+    finally:
+        assert daemon_request(socket_path, {"op": "shutdown"}) == {"status": "stopping"}
+        server_thread.join(10)
+    assert not os.path.exists(socket_path)
+
+
+@pytest.mark.parametrize("payload", [
+    "{truncated",
+    "[1, 2]",
+    '{"findings": {"__finding_store__": {"templates": [], "rows": [[0], [1], [1]]}}}',
+    '{"findings": {"__finding_store__": {"rows": [[], [], []]}}}',
+])
+def test_analysis_cache_drops_undecodable_entries(code_quality, tmp_path, payload):
+    cache = code_quality.AnalysisCache(str(tmp_path / "cache.db"))
+    cache.put("key", {"quality_score": 90})
+    cache._connect().execute("UPDATE results SET value = ? WHERE key = ?", (payload, "key"))
+    
+    assert cache.get("key") is None
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert cache.stats()["entries"] == 0
+    
+    cache.put("key", {"quality_score": 90})
+    assert cache.get("key") == {"quality_score": 90}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+CHAIN_PATTERNS = [
+    r"for.*in.*len\(", r"while.*len\(.*\)", r"for.*\.get\(", r"for.*\.filter\(",
+    r"list\(\[.*\]\*\d{4,}", r"dict\(\{.*\}\*\d{4,}", r"execute\(.*%.*\)", r"query\(.*\+.*\)",
+    r".*import.*os", r"a.*b.*a.*",
+]
+
+
+def test_literal_chain_matcher_finds_the_lines_re_finds(code_quality):
+    from regex_safety import LiteralChainMatcher
+    
+    rng = random.Random(22)
+    alphabet = ["for ", "in ", "len(", "while", ")", ".get(", ".filter(", "list([", "]*", "dict({", "}*",
+                "12345", "9", "execute(", "%", "query(", "+", "import", "os", "a", "b", "FOR", "Len(", " ", "x"]
+    lines = ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12))) for _ in range(2000)]
+    # Rarer shapes, including near misses of the digit-count tail
+    lines[100:100] = ["grid = list([0]*10000)", "grid = list([0]*999)", "cache = dict({}*12345)",
+                      "cursor.execute(sql % args)", "query(base + suffix)", "import sys, os"]
+    content = "\n".join(lines) + "\n"
+    line_index = code_quality.LineIndex(content)
+    
+    for pattern in CHAIN_PATTERNS:
+        expected = [number for number, line in enumerate(lines, 1) if re.search(pattern, line, re.IGNORECASE)]
+        matcher = LiteralChainMatcher.from_pattern(pattern, re.IGNORECASE)
+        assert matcher is not None, pattern
+        assert expected, pattern
+        for text in (content, content.encode()):
+            found = [line_index.line_of(offset) for offset in matcher.match_starts(text, 0, len(text))]
+            assert found == expected, pattern
+
+
+def random_statement(rng):
+    name = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(8))
+    call = "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(6))
+    return f"{name} = {call}({rng.choice(['self', 'data', 'item'])})"
+
+
+@pytest.mark.parametrize("min_lines", [4, 6, 9])
+@pytest.mark.parametrize("seed", range(5))
+def test_duplicate_index_finds_every_copy_of_threshold_length(code_quality, tmp_path, monkeypatch, min_lines, seed):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(seed)
+    source = [random_statement(rng) for _ in range(120)]
+    target = [random_statement(rng) for _ in range(120)]
+    
+    # (length, first source line, first target line), 1-based; copies shorter than
+    # min_lines must not be reported, and the rest must be whatever their offset
+    copies = []
+    position = 1
+    for length in (min_lines - 1, min_lines, min_lines + 1, 2 * min_lines + 3):
+        source_start = rng.randint(1, len(source) - length + 1)
+        position += rng.randint(2, 6)
+        target[position - 1:position - 1 + length] = source[source_start - 1:source_start - 1 + length]
+        copies.append((length, source_start, position))
+        position += length
+    (tmp_path / "source.py").write_text("\n".join(source) + "\n")
+    (tmp_path / "target.py").write_text("\n".join(target) + "\n")
+    
+    index = code_quality.DuplicateIndex(str(tmp_path / "fingerprints.db"), min_lines=min_lines)
+    regions = index.find_duplicates(["target.py", "source.py"]).get("target.py", [])
+    
+    for length, source_start, target_start in copies:
+        covering = [
+            region for region in regions
+            if region["other_file"] == "source.py" and region["start_line"] <= target_start
+            and region["end_line"] >= target_start + length - 1
+            and region["other_start_line"] - region["start_line"] == source_start - target_start
+        ]
+        overlapping = [
+            region for region in regions
+            if region["start_line"] <= target_start + length - 1 and target_start <= region["end_line"]
+        ]
+        if length >= min_lines:
+            assert covering, (length, source_start, target_start, regions)
+        else:
+            assert not overlapping, (length, source_start, target_start, regions)
+
+
+@pytest.mark.parametrize("chunk_files", [16, 1])
+def test_parallel_report_equals_serial_report(code_quality, tmp_path, monkeypatch, chunk_files):
+    monkeypatch.chdir(tmp_path)
+    # With one file per chunk, the input outgrows up-front sizing and is submitted lazily
+    monkeypatch.setattr(code_quality.CodeQualityAgent, "ANALYSIS_CHUNK_FILES", chunk_files)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("external_tools:\n  enabled: false\n")
+    rng = random.Random(1)
+    shared = [random_statement(rng) for _ in range(8)]
+    file_paths = []
+    for index in range(12):
+        lines = [random_statement(rng) for _ in range(rng.randint(5, 40))]
+        lines.append(f"password = 'hunter{index}'")
+        lines.append("for item in range(len(items)): pass" + " " * rng.randint(0, 150))
+        if index % 3 == 0:
+            lines[2:2] = shared
+        path = tmp_path / f"module_{index}.py"
+        path.write_text("\n".join(lines) + "\n")
+        file_paths.append(path.name)
+    file_paths += ["missing.py", "module_0.py"]
+    
+    def report(jobs):
+        agent = code_quality.CodeQualityAgent(str(config_path))
+        agent.result_cache = None
+        agent.duplicate_index.path = str(tmp_path / f"fingerprints-{jobs}.db")
+        results = agent.analyze_files(file_paths, jobs=jobs)
+        for volatile in ("timestamp", "performance", "duplicate_index"):
+            del results[volatile]
+        return json.loads(json.dumps(results, default=code_quality.report_json_default))
+    
+    serial = report(1)
+    assert serial["summary"]["total_files_analyzed"] == 12
+    assert report(3) == serial
+
+
+def test_diff_mode_counts_one_cache_lookup_per_file(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("external_tools:\n  enabled: false\nduplicate_detection:\n  enabled: false\n")
+    for index in range(3):
+        (tmp_path / f"module_{index}.py").write_text("\n".join(f"value_{index}_{line} = {line}" for line in range(20)) + "\n")
+    file_paths = [f"module_{index}.py" for index in range(3)]
+    changed_lines = {file_path: [(2, 4)] for file_path in file_paths}
+    
+    agent = code_quality.CodeQualityAgent(str(config_path))
+    agent.result_cache = code_quality.AnalysisCache(str(tmp_path / "results.db"))
+    cold = agent.analyze_files(file_paths, changed_lines=changed_lines)["cache"]
+    warm = agent.analyze_files(file_paths, changed_lines=changed_lines)["cache"]
+    
+    assert (cold["hits"], cold["misses"]) == (0, 3)
+    # The full results are not cached from a diff run, so the files miss again,
+    # but their language analysis is reused without being counted
+    assert (warm["hits"], warm["misses"]) == (0, 3)
+    assert warm["entries"] == 3
+
+
+def test_batched_tool_output_splits_per_file(code_quality):
+    from concurrent.futures import Future
+    import subprocess
+    
+    def finished(stdout=None, error=None):
+        future = Future()
+        if error:
+            future.set_exception(error)
+        else:
+            future.set_result(subprocess.CompletedProcess([], 1, stdout=stdout, stderr=""))
+        return future
+    
+    agent = code_quality.CodeQualityAgent()
+    files = [os.path.normpath("pkg/a.py"), os.path.normpath("pkg/b.py")]
+    flake8_output = (
+        "pkg/a.py:3:1: F401 'os' imported but unused\n"
+        "pkg/b.py:12:80: E501 line too long (120 > 79 characters)\n"
+        "other.py:1:1: W291 trailing whitespace\n"
+        "not a flake8 line\n"
+    )
+    mypy_output = (
+        "pkg/b.py:4:5: error: Incompatible return value type (got \"int\", expected \"str\")  [return-value]\n"
+        "pkg/b.py:4: note: See https://mypy.readthedocs.io\n"
+        "pkg/a.py:7: error: Name \"undefined\" is not defined  [name-defined]\n"
+    )
+    results = code_quality.ExternalToolResults(files, agent.performance)
+    results.add_batch("flake8", files, finished(flake8_output), agent._parse_flake8_output)
+    results.add_batch("mypy", files, finished(mypy_output), agent._parse_mypy_output)
+    results.add_batch("pylint", files, finished(error=FileNotFoundError("pylint")), agent._parse_flake8_output)
+    
+    first, second = results.get(files[0]), results.get(files[1])
+    
+    assert [(finding["tool"], finding["rule"], finding["line"], finding["column"], finding["severity"])
+            for finding in first["findings"]] == [
+        ("flake8", "F401", 3, 1, "medium"),
+        ("mypy", "name-defined", 7, 0, "medium"),
+    ]
+    assert first["findings"][0]["message"] == "F401 'os' imported but unused"
+    assert [(finding["type"], finding["rule"], finding["line"], finding["column"], finding["severity"])
+            for finding in second["findings"]] == [
+        ("lint_issue", "E501", 12, 80, "low"),
+        ("type_error", "return-value", 4, 5, "medium"),
+    ]
+    # Notes are kept in the raw output but carry no finding
+    assert second["external_tool_results"]["mypy"] == "".join(mypy_output.splitlines(True)[:2])
+    assert set(second["external_tool_results"]) == {"flake8", "mypy"}
+    assert results.unavailable == {"pylint"}
+
+
+ASYNC_MODULE = '''import asyncio
+
+
+async def fetch(items: list) -> int:
+    total = 0
+    async for item in items:
+        if item and total:
+            total += 1
+    try:
+        await asyncio.sleep(0)
+    except ValueError:
+        pass
+    return total
+
+
+async def bare(x):
+    async def inner():
+        while x:
+            return x
+    return inner
+'''
+
+
+def test_async_functions_get_the_same_metrics_as_sync_ones(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("external_tools:\n  enabled: false\nduplicate_detection:\n  enabled: false\n")
+    (tmp_path / "async_module.py").write_text(ASYNC_MODULE)
+    (tmp_path / "sync_module.py").write_text(
+        ASYNC_MODULE.replace("async def", "def").replace("async for", "for").replace("await ", ""))
+    agent = code_quality.CodeQualityAgent(str(config_path))
+    agent.result_cache = None
+    
+    analyses = agent.analyze_files(["async_module.py", "sync_module.py"])["file_analyses"]
+    async_analysis, sync_analysis = analyses["async_module.py"], analyses["sync_module.py"]
+    
+    assert async_analysis["metrics"]["functions"] == 3
+    # async for, if, the and, the except handler; inner's while counts towards bare
+    assert async_analysis["complexity_metrics"]["function_fetch"]["cyclomatic_complexity"] == 5
+    assert async_analysis["complexity_metrics"]["function_bare"]["cyclomatic_complexity"] == 2
+    for key in ("metrics", "complexity_metrics", "quality_score"):
+        assert async_analysis[key] == sync_analysis[key]
+    assert list(async_analysis["findings"]) == list(sync_analysis["findings"])
+    assert "Functions without type annotations: bare, inner" in [
+        finding["message"] for finding in async_analysis["findings"]]
+
+
+def test_jsonl_stream_matches_the_json_report(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("external_tools:\n  enabled: false\nduplicate_detection:\n  enabled: false\n")
+    rng = random.Random(6)
+    file_paths = []
+    for index in range(5):
+        lines = [random_statement(rng) for _ in range(rng.randint(5, 30))]
+        lines.append(f"api_key = 'secret{index}'")
+        (tmp_path / f"module_{index}.py").write_text("\n".join(lines) + "\n")
+        file_paths.append(f"module_{index}.py")
+    
+    def run(streaming):
+        agent = code_quality.CodeQualityAgent(str(config_path))
+        agent.result_cache = None
+        agent.output_path = str(tmp_path / "out" / "results.jsonl")
+        analyze = agent.analyze_files_streaming if streaming else agent.analyze_files
+        results = analyze(file_paths + ["missing.py"])
+        return json.loads(json.dumps(results, default=code_quality.report_json_default)), agent.output_path
+    
+    report, _ = run(streaming=False)
+    streamed, output_path = run(streaming=True)
+    with open(output_path) as f:
+        records = [json.loads(line) for line in f]
+    
+    assert [record["record_type"] for record in records] == ["file"] * 5 + ["summary"]
+    assert [{key: value for key, value in record.items() if key != "record_type"} for record in records[:-1]] == [
+        report["file_analyses"][file_path] for file_path in file_paths]
+    summary = records[-1]
+    assert "file_analyses" not in summary and "findings" not in summary
+    for key in ("summary", "overall_score", "security_rating", "ai_insights"):
+        assert summary[key] == report[key] == streamed[key]
+    # Streaming reports the violation count; the violations are in the file records
+    assert summary["framework_compliance"]["violation_count"] == len(report["framework_compliance"]["violations"])
+    assert summary["framework_compliance"]["overall_score"] == report["framework_compliance"]["overall_score"]
+
+
+def test_duplicate_index_trusts_old_stats_and_reingests_changes(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    rng = random.Random(23)
+    shared = [random_statement(rng) for _ in range(10)]
+    
+    def write(name, lines, age_seconds=None, mtime_ns=None):
+        path = tmp_path / name
+        path.write_text("\n".join(lines) + "\n")
+        if age_seconds is not None:
+            mtime_ns = time.time_ns() - age_seconds * 10 ** 9
+        if mtime_ns is not None:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+        return path.stat().st_mtime_ns
+    
+    source = [random_statement(rng) for _ in range(5)] + shared
+    copy = shared + [random_statement(rng) for _ in range(5)]
+    write("source.py", source, age_seconds=60)
+    copy_mtime = write("copy.py", copy, age_seconds=60)
+    index = code_quality.DuplicateIndex(str(tmp_path / "fingerprints.db"), 6, max_bytes=4096, binary_sniff_bytes=64)
+    
+    assert set(index.find_duplicates(["source.py", "copy.py"])) == {"source.py", "copy.py"}
+    assert index.update(["source.py", "copy.py"]) == 0
+    
+    # An old, unchanged stat is trusted: same-size edits behind a restored mtime go unseen
+    write("copy.py", [line.replace("=", "-") for line in copy], mtime_ns=copy_mtime)
+    assert index.update(["copy.py"]) == 0
+    # A touch without a content change refreshes the stat without re-fingerprinting
+    write("copy.py", copy, age_seconds=30)
+    assert index.update(["copy.py"]) == 0
+    
+    # Files modified just before indexing are re-read until their mtime is old enough
+    recent_mtime = write("copy.py", copy[::-1])
+    assert index.update(["copy.py"]) == 1
+    write("copy.py", copy, mtime_ns=recent_mtime)
+    assert index.update(["copy.py"]) == 1
+    assert "copy.py" in index.find_duplicates(["copy.py"])
+    
+    # Files that become binary or too large leave the index
+    (tmp_path / "copy.py").write_bytes(b"\0" + (tmp_path / "copy.py").read_bytes())
+    assert index.update(["copy.py"]) == 1
+    assert index.find_duplicates(["source.py"]) == {}
+    write("copy.py", copy + ["# padding"] * 1000)
+    assert index.update(["copy.py"]) == 0
+    assert index.find_duplicates(["source.py"]) == {}
+
+
+def test_oversized_and_binary_files_are_skipped_with_a_finding(code_quality, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("ingestion:\n  max_file_size_mb: 0.001\n  binary_sniff_bytes: 16\n")
+    (tmp_path / "large.py").write_text("value = 1\n" * 200)
+    (tmp_path / "binary.py").write_bytes(b"value = 1\n\0\n")
+    (tmp_path / "late_nul.py").write_bytes(b"value = 1\n" * 4 + b"\0\n")
+    agent = code_quality.CodeQualityAgent(str(config_path))
+    agent.result_cache = None
+    
+    analyses = agent.analyze_files(["large.py", "binary.py", "late_nul.py"])["file_analyses"]
+    
+    assert [finding["type"] for finding in analyses["large.py"]["findings"]] == ["skipped_large_file"]
+    assert [finding["type"] for finding in analyses["binary.py"]["findings"]] == ["skipped_binary_file"]
+    assert "skipped_binary_file" not in [finding["type"] for finding in analyses["late_nul.py"]["findings"]]
+    assert "external_tool_results" not in analyses["large.py"]
+    assert agent.duplicate_index.update(["large.py", "binary.py"]) == 0
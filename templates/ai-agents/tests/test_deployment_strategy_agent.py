@@ -0,0 +1,362 @@
+"""Tests for the deployment strategy agent"""
+
+import copy
+import json
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+@pytest.fixture
+def agent(deployment_strategy, tmp_path):
+    """An agent whose history store, JSON history and risk model all live in tmp_path"""
+    agent = deployment_strategy.DeploymentStrategyAgent()
+    agent.history_store = deployment_strategy.DeploymentHistoryStore(str(tmp_path / "history.db"))
+    agent.historical_data_path = str(tmp_path / "history.json")
+    agent.config["risk_model"]["path"] = str(tmp_path / "risk-model.json")
+    return agent
+
+
+def write_history(path: str, records) -> None:
+    with open(path, 'w') as f:
+        json.dump(records, f)
+
+
+def deployment(strategy: str, success: bool, minutes_ago: int, environment: str = "dev"):
+    return {
+        "timestamp": (datetime.now() - timedelta(minutes=minutes_ago)).isoformat(),
+        "environment": environment,
+        "strategy": strategy,
+        "success": success,
+        "risk_score": 2.0,
+        "decision_factors": {"affected_components": ["application"], "risk_factors": [],
+                             "files_changed": 1, "lines_changed": 10}
+    }
+
+
+def test_history_strategy_unknown_to_risk_model_is_kept(agent):
+    # Mostly failing rolling deployments steer history towards "recreate",
+    # a strategy the risk model has no probability for
+    records = [
+        deployment("recreate", True, index) if index % 4 == 0 else deployment("rolling", index % 10 == 1, index)
+        for index in range(80)
+    ]
+    write_history(agent.historical_data_path, records)
+    
+    change_analysis = agent.analyze_changes(["src/app.py"], diff_stats={"src/app.py": {"added": 5, "removed": 1}})
+    decision = agent.predict_deployment_strategy(change_analysis, "dev")
+    
+    assert decision["strategy"] == "recreate"
+    assert set(decision["success_probabilities"]) == {"rolling", "canary", "blue-green"}
+
+
+def test_history_counters_do_not_decay_by_default(agent, deployment_strategy, tmp_path):
+    # Two-month-old outcomes still count in full unless a half-life is configured
+    records = [deployment("rolling", index % 4 != 0, 60 * 24 * 60 + index) for index in range(20)]
+    write_history(agent.historical_data_path, records)
+    agent.history_store.import_json(agent.historical_data_path)
+    
+    assert agent.config["history_store"]["counter_half_life_days"] is None
+    assert agent.history_store.strategy_performance("dev") == {"rolling": {"successes": 15.0, "total": 20.0}}
+    
+    decaying_store = deployment_strategy.DeploymentHistoryStore(str(tmp_path / "decaying.db"), half_life_days=14)
+    decaying_store.import_json(agent.historical_data_path)
+    assert decaying_store.strategy_performance("dev")["rolling"]["total"] < deployment_strategy.MIN_HISTORY_SAMPLES
+
+
+def test_backtest_matches_predict_deployment_strategy(agent, deployment_strategy):
+    pytest.importorskip("numpy")
+    rng = random.Random(7)
+    categories = agent.config["change_categories"]
+    agent.config["forced_strategies"] = {"database_migration": "blue-green"}
+    
+    def change_analysis(counts, magnitude):
+        weights = agent.config["strategy_weights"]
+        components = [category["component"] for category in categories if counts[category["component"]]]
+        return {
+            "change_score": sum(counts[category["component"]] * agent._resolve_weight(category.get("weight", 0), weights)
+                                for category in categories),
+            "risk_factors": [category["risk_factor"] for category in categories
+                             if counts[category["component"]] and category.get("risk_factor")],
+            "affected_components": components,
+            "change_types": components,
+            "file_analysis": [{}] * sum(counts.values()),
+            "category_summary": {component: {"count": count, "score": 0} for component, count in counts.items()},
+            "magnitude_multiplier": magnitude,
+            "lines_added": 1,
+            "lines_removed": 1
+        }
+    
+    # Recorded deployments used random strategies, so every ladder rung gets matches and misses
+    deployments = []
+    for _ in range(300):
+        counts = {category["component"]: 0 for category in categories}
+        for _ in range(rng.randint(0, 6)):
+            counts[rng.choice(categories)["component"]] += 1
+        magnitude = rng.choice([1.0, 1.2, 1.5])
+        environment = rng.choice(["dev", "staging", "prod", "qa"])
+        decision = agent.predict_deployment_strategy(change_analysis(counts, magnitude), environment, historical_data=[])
+        decision["strategy"] = rng.choice(deployment_strategy.DEPLOYMENT_STRATEGIES)
+        success = rng.random() < 0.7
+        agent.record_outcome(decision, success, environment)
+        deployments.append((counts, magnitude, environment, decision["strategy"], success))
+    
+    grid = {
+        "risk_thresholds.low": [-1, 0.8, 3],
+        "risk_thresholds.medium": [0.5, 4.8],
+        "risk_thresholds.high": [2.5, 15],
+        "environment_risk_multiplier.prod": [0, 1.5],
+        "strategy_weights.code_changes": [0.5, 1.1]
+    }
+    report = agent.backtest(grid)
+    assert report["configs_evaluated"] == 48
+    
+    base_config = copy.deepcopy(agent.config)
+    for entry in report["configs"]:
+        agent.config = copy.deepcopy(base_config)
+        for name, value in entry["overrides"].items():
+            section, _, key = name.partition('.')
+            agent.config[section][key] = value
+        matched_successes = repeated_failures = 0
+        for counts, magnitude, environment, strategy, success in deployments:
+            decision = agent.predict_deployment_strategy(change_analysis(counts, magnitude), environment, historical_data=[])
+            if decision["strategy"] == strategy:
+                matched_successes += success
+                repeated_failures += not success
+        assert (entry["matched_successes"], entry["repeated_failures"]) == (matched_successes, repeated_failures), entry
+
+
+def test_success_rates_come_from_the_recent_window(agent):
+    # Old failures fall outside the last recent_limit deployments; newer ones in
+    # other environments do not crowd the window out
+    records = [deployment("rolling", False, 1000 + index) for index in range(30)]
+    records += [deployment("rolling", True, index) for index in range(10)]
+    records += [deployment("rolling", False, index, environment="prod") for index in range(30)]
+    write_history(agent.historical_data_path, records)
+    
+    assert agent._load_strategy_performance("dev", {"risk_factors": []}) == {"rolling": {"successes": 10, "total": 20}}
+    window = agent.history_store.recent("dev", 20)
+    assert [record["success"] for record in window] == [False] * 10 + [True] * 10
+    
+    agent.config["history_store"]["outcome_counters"] = True
+    assert agent._load_strategy_performance("dev", {"risk_factors": []}) == {"rolling": {"successes": 10.0, "total": 40.0}}
+
+
+def test_recent_orders_mixed_timestamp_formats_chronologically(agent):
+    base = datetime(2026, 3, 1, 12, 0, 0).astimezone()
+    timestamps = [
+        (base - timedelta(minutes=3)).isoformat(timespec="seconds"),
+        (base - timedelta(minutes=2, seconds=30)).isoformat(),
+        (base - timedelta(minutes=2)).astimezone(timezone.utc).isoformat(),
+        (base - timedelta(minutes=1)).replace(tzinfo=None).isoformat(timespec="microseconds"),
+    ]
+    for order in (2, 0, 3, 1):
+        agent.history_store.record_outcome(
+            {"timestamp": timestamps[order], "environment": "dev", "strategy": f"s{order}", "success": True}
+        )
+    
+    assert [record["strategy"] for record in agent.history_store.recent("dev", 3)] == ["s1", "s2", "s3"]
+
+
+def test_partial_config_sections_keep_their_defaults(deployment_strategy, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text(
+        "history_store:\n  path: custom/history.db\n"
+        "risk_model:\n  min_samples: 10\n"
+        "risk_thresholds:\n  low: 1\n  medium: 2\n  high: 3\n"
+    )
+    agent = deployment_strategy.DeploymentStrategyAgent(str(config_path))
+    
+    assert agent.config["history_store"]["path"] == "custom/history.db"
+    assert agent.config["history_store"]["recent_limit"] == 20
+    assert agent.config["history_store"]["counter_half_life_days"] is None
+    assert agent.config["risk_model"]["min_samples"] == 10
+    assert agent.config["risk_model"]["min_success_probability"] == 0.7
+    assert agent.history_store.path == "custom/history.db"
+    
+    change_analysis = agent.analyze_changes(["src/app.py"], diff_stats={"src/app.py": {"added": 5, "removed": 1}})
+    assert agent.predict_deployment_strategy(change_analysis, "prod")["strategy"] == "canary"
+
+
+def test_service_reload_closes_the_replaced_history_stores(deployment_strategy, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("risk_model:\n  enabled: false\n")
+    opened = []
+    
+    def configure(agent):
+        default_store = agent.history_store
+        default_store.count()
+        agent.use_history_store(str(tmp_path / "service-history.db"))
+        opened.extend([default_store, agent.history_store])
+    
+    service = deployment_strategy.DecisionService(str(config_path), configure)
+    assert opened[0]._conn is None
+    assert service.handle("GET", "/health", {})[0] == 200
+    
+    os.utime(config_path, ns=(time.time_ns() + 10 ** 9,) * 2)
+    assert service.handle("GET", "/health", {})[0] == 200
+    assert len(opened) == 4
+    assert [store._conn is None for store in opened] == [True, True, True, False]
+
+
+def test_diff_stats_handle_renames_and_binary_files(agent, tmp_path, monkeypatch):
+    import subprocess
+    
+    monkeypatch.chdir(tmp_path)
+    
+    def git(*args):
+        subprocess.run(["git", "-c", "user.name=test", "-c", "user.email=test@example.com", *args],
+                       check=True, capture_output=True)
+    
+    git("init", "-q")
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "old name.py").write_text("".join(f"line_{index} = {index}\n" for index in range(40)))
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\x00\x01")
+    (tmp_path / "app.py").write_text("a = 1\nb = 2\n")
+    git("add", "-A")
+    git("commit", "-q", "-m", "base")
+    
+    git("mv", "src/old name.py", "src/new name.py")
+    (tmp_path / "src" / "new name.py").write_text(
+        "".join(f"line_{index} = {index}\n" for index in range(40) if index != 3) + "extra = 1\n")
+    (tmp_path / "logo.png").write_bytes(b"\x89PNG\x00\x02\x03")
+    (tmp_path / "app.py").write_text("a = 1\nb = 3\nc = 4\n")
+    git("add", "-A")
+    git("commit", "-q", "-m", "change")
+    
+    diff_stats = agent._collect_diff_stats("HEAD~1")
+    
+    assert diff_stats == {
+        os.path.normpath("src/new name.py"): {"added": 1, "removed": 1},
+        "logo.png": {"added": 0, "removed": 0},
+        "app.py": {"added": 2, "removed": 1},
+    }
+    change_analysis = agent.analyze_changes(["app.py", "logo.png", "src/new name.py"], diff_stats=diff_stats)
+    assert [entry["complexity_score"] for entry in change_analysis["file_analysis"]] == [3, 0, 2]
+
+
+def legacy_classification(path):
+    """The per-file if/elif chain the classifier replaced, with the default categories"""
+    lowered = path.lower()
+    if path.endswith(('.py', '.js', '.go', '.java', '.cpp', '.rs')):
+        category = "application"
+    elif path.endswith(('.tf', '.yaml', '.yml')) and any(
+            keyword in lowered for keyword in ['terraform', 'k8s', 'kubernetes', 'helm']):
+        category = "infrastructure"
+    elif path.endswith(('.sql', '.migration')) or 'migration' in lowered:
+        category = "database"
+    elif any(dep_file in lowered for dep_file in ['requirements', 'package.json', 'go.mod', 'cargo.toml', 'dockerfile']):
+        category = "dependencies"
+    elif path.endswith(('.conf', '.ini', '.env', '.properties')):
+        category = "configuration"
+    else:
+        category = None
+    indicators = []
+    if any(keyword in lowered for keyword in ['auth', 'security', 'login', 'permission', 'admin']):
+        indicators.append("security_related")
+    if any(keyword in lowered for keyword in ['payment', 'billing', 'transaction', 'order']):
+        indicators.append("business_critical")
+    return category, indicators
+
+
+def test_change_classifier_matches_the_legacy_rules(agent):
+    rng = random.Random(10)
+    parts = ["src", "Terraform", "k8s", "helm", "db", "migrations", "Auth", "billing", "İstanbul", "straße",
+             "requirements", "Dockerfile", "package.json", "go.mod", "Cargo.TOML", "ORDERS", "admin_panel", "lib"]
+    suffixes = [".py", ".PY", ".tf", ".yaml", ".yml", ".sql", ".migration", ".conf", ".ini", ".env",
+                ".properties", ".txt", ".md", ""]
+    paths = ["", "requirements.txt", "infra/Terraform/main.tf", "migration.py"]
+    for _ in range(2000):
+        directory = "/".join(rng.choice(parts) for _ in range(rng.randint(0, 3)))
+        name = rng.choice(parts) + rng.choice(suffixes)
+        paths.append(f"{directory}/{name}" if directory else name)
+    
+    components = [category["component"] for category in agent.config["change_categories"]]
+    classified = [
+        (components[index] if index is not None else None, indicators)
+        for index, indicators in agent.classifier.classify(paths)
+    ]
+    
+    assert classified == [legacy_classification(path) for path in paths]
+
+
+def test_decide_batch_matches_repeated_predictions(agent):
+    rng = random.Random(15)
+    environments = ["dev", "staging", "prod"]
+    records = [
+        deployment(rng.choice(["rolling", "canary", "blue-green"]), rng.random() < 0.8, index,
+                   environment=rng.choice(environments))
+        for index in range(120)
+    ]
+    write_history(agent.historical_data_path, records)
+    change_sets = [
+        {"name": "app", "files": ["src/app.py", "src/auth/login.py"],
+         "line_counts": {"src/app.py": {"added": 30, "removed": 4}, "src/auth/login.py": {"added": 3, "removed": 1}}},
+        {"files": ["deploy/k8s/service.yaml", "db/migrations/0042.sql", "requirements.txt"],
+         "line_counts": {"deploy/k8s/service.yaml": {"added": 12, "removed": 0},
+                         "db/migrations/0042.sql": {"added": 80, "removed": 2}}},
+        {"files": ["config/app.ini"], "line_counts": {}},
+    ]
+    
+    batch = agent.decide_batch(change_sets, environments)
+    
+    assert [result["name"] for result in batch["change_sets"]] == ["app", "change-set-2", "change-set-3"]
+    for change_set, result in zip(change_sets, batch["change_sets"]):
+        change_analysis = agent.analyze_changes(change_set["files"], diff_stats=change_set["line_counts"])
+        assert result["change_analysis"] == change_analysis
+        for environment in environments:
+            expected = agent.predict_deployment_strategy(change_analysis, environment)
+            del expected["change_analysis"]
+            decision = dict(result["decisions"][environment], timestamp=expected["timestamp"])
+            assert decision == expected
+
+
+def test_decision_service_handles_requests_and_reloads_config(deployment_strategy, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    config_path = tmp_path / "agent.yaml"
+    config_path.write_text("risk_model:\n  enabled: false\n")
+    service = deployment_strategy.DecisionService(
+        str(config_path), lambda agent: agent.use_history_store(str(tmp_path / "service-history.db")))
+    request = {"changed_files": ["src/app.py", "src/billing.py"], "environment": "prod",
+               "line_counts": {"src/app.py": {"added": 40, "removed": 5}, "src/billing.py": {"added": 3, "removed": 0}}}
+    
+    status, decision = service.handle("POST", "/decide", request)
+    assert status == 200
+    agent = service.agent
+    change_analysis = agent.analyze_changes(request["changed_files"], diff_stats=request["line_counts"])
+    expected = agent.predict_deployment_strategy(change_analysis, "prod")
+    assert dict(decision, timestamp=expected["timestamp"]) == expected
+    
+    status, batch = service.handle("POST", "/batch", {
+        "change_sets": [{"files": request["changed_files"], "line_counts": request["line_counts"]}, {"files": ["README.md"]}],
+        "environments": ["dev", "prod"]
+    })
+    assert status == 200
+    assert [sorted(result["decisions"]) for result in batch["change_sets"]] == [["dev", "prod"]] * 2
+    assert batch["change_sets"][0]["decisions"]["prod"]["strategy"] == decision["strategy"]
+    
+    revision = service.handle("GET", "/health", {})[1]["history_revision"]
+    assert service.handle("POST", "/outcome", {"decision": decision, "success": True}) == (200, {"recorded": 1})
+    assert agent.history_store.count() == 1
+    health = service.handle("GET", "/health", {})[1]
+    assert health["history_revision"] == revision + 1
+    assert health["requests_served"] == 5
+    
+    assert service.handle("POST", "/decide", {"changed_files": ["src/app.py"]})[0] == 400
+    assert service.handle("POST", "/batch", {"change_sets": None, "environments": ["dev"]})[0] == 400
+    assert service.handle("GET", "/nowhere", {})[0] == 404
+    
+    # A changed config file rebuilds the agent; the history store carries over on disk
+    config_path.write_text("risk_model:\n  enabled: false\nrisk_thresholds:\n  low: 0.1\n  medium: 0.2\n  high: 0.3\n")
+    os.utime(config_path, ns=(time.time_ns() + 10 ** 9,) * 2)
+    status, reloaded = service.handle("POST", "/decide", request)
+    assert status == 200
+    assert service.agent is not agent
+    assert service.agent.config["risk_thresholds"]["low"] == 0.1
+    assert decision["risk_level"] == "low" != reloaded["risk_level"]
+    assert service.agent.history_store.count() == 1